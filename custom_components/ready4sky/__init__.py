@@ -1,9 +1,7 @@
 from homeassistant.helpers import device_registry as dr
 import homeassistant.helpers.config_validation as cv
 import voluptuous as vol
-from datetime import timedelta
 
-from homeassistant.helpers.event import async_track_time_interval
 from .const import (
     DOMAIN,
     DEFAULT_INTERFACE,
@@ -14,6 +12,18 @@ from .const import (
     CONF_MANUFACTURER,
     CONF_NAME,
     CONF_TEMPERATURE_LIGHT,
+    CONF_FRAME_TRACE,
+    CONF_ADAPTER_LIMIT,
+    DEFAULT_ADAPTER_LIMIT,
+    CONF_LINK_POLICY,
+    CONF_LINGER,
+    DEFAULT_LINK_POLICY,
+    DEFAULT_LINGER,
+    CONF_POLL_FAST,
+    CONF_POLL_SLOW,
+    CONF_POLL_JITTER,
+    DEFAULT_POLL_FAST,
+    DEFAULT_POLL_JITTER,
     CONF_UNIQUE_ID,
     STRING_HEX_SYMBOLS
 )
@@ -27,6 +37,13 @@ from homeassistant.const import (
 
 from .const import DOMAIN, SUPPORTED_PLATFORMS
 from .lib import RedmondKettle
+from .lib.trace import TRACE_FILE, TraceRecorder
+from .lib.pool import ConnectionPool
+from .lib.reactor import Reactor
+from .lib.watchdog import Watchdog
+from .lib.schedule import PollSchedule
+from .registry import KettleRegistry
+from .coordinator import KettleCoordinator
 import logging
 _LOGGER = logging.getLogger(__name__)
 
@@ -47,8 +64,24 @@ async def async_remove_entry(hass, entry):
     except ValueError as e:
         _LOGGER.error(f"ValueError {e}")
 
+async def async_reload_entry(hass, config_entry):
+    """Options changed, set the entry up again with them"""
+    await hass.config_entries.async_reload(config_entry.entry_id)
+
+async def async_unload_entry(hass, config_entry):
+    registry = KettleRegistry.of(hass)
+    if not await registry.async_remove(config_entry.entry_id):
+        return True
+    # the file is reopened by the next frame of a kettle still tracing
+    await hass.async_add_executor_job(TraceRecorder.forPath(hass.config.path(TRACE_FILE)).close)
+    if not registry:
+        # the last kettle is gone, so are the IO and watchdog threads
+        await hass.async_add_executor_job(Watchdog.shared().stop)
+        await hass.async_add_executor_job(Reactor.shared().stop)
+    return True
+
 async def async_setup_entry(hass, config_entry):
-    hass.data[DOMAIN] = {}
+    registry = KettleRegistry.of(hass)
 
     config = config_entry.data
 
@@ -62,39 +95,64 @@ async def async_setup_entry(hass, config_entry):
     manufacturer = config.get(CONF_MANUFACTURER)
     name = config.get(CONF_NAME)
     temperatureLight = config.get(CONF_TEMPERATURE_LIGHT, True)
-    scan_delta = timedelta(seconds=config.get(CONF_SCAN_INTERVAL))
+    frameTrace = config_entry.options.get(CONF_FRAME_TRACE, config.get(CONF_FRAME_TRACE, False))
+    adapterLimit = config_entry.options.get(CONF_ADAPTER_LIMIT, config.get(CONF_ADAPTER_LIMIT, DEFAULT_ADAPTER_LIMIT))
+    linkPolicy = config_entry.options.get(CONF_LINK_POLICY, config.get(CONF_LINK_POLICY, DEFAULT_LINK_POLICY))
+    linger = config_entry.options.get(CONF_LINGER, config.get(CONF_LINGER, DEFAULT_LINGER))
+    scan_delta = config.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL)
+    pollFast = config_entry.options.get(CONF_POLL_FAST, config.get(CONF_POLL_FAST, DEFAULT_POLL_FAST))
+    pollSlow = config_entry.options.get(CONF_POLL_SLOW, config.get(CONF_POLL_SLOW, scan_delta))
+    pollJitter = config_entry.options.get(CONF_POLL_JITTER, config.get(CONF_POLL_JITTER, DEFAULT_POLL_JITTER))
 
     _LOGGER.info(f"Start ready4sky[{name}] uniqueId:{uniqueId} mac:{mac} iface_index:{iface_index} password:{password}")
 
     # hass.states.async_set("r4sky.name", "SkyKettle RK-G210S")
 
-    hass.data[DOMAIN] = {
-        mac: {
-            'name': name,
-            'model': model,
-            'manufacturer': manufacturer,
-            'iface': iface_index,
-            'mac': mac,
-            'password': password,
-            'instance': None,
-            'temperature': 0,
-            'temperatureLight': temperatureLight,
-        },
+    device = {
+        'name': name,
+        'model': model,
+        'manufacturer': manufacturer,
+        'iface': iface_index,
+        'mac': mac,
+        'password': password,
+        'instance': None,
+        'temperature': 0,
+        'temperatureLight': temperatureLight,
     }
 
-    # Data that you want to share with your platforms
-    kettle = RedmondKettle(
-        hass.data[DOMAIN][mac]['mac'],
-        hass.data[DOMAIN][mac]['password'],
-        iface=hass.data[DOMAIN][mac]['iface'],
-        hass=hass
-    )
+    # every kettle on this adapter shares its links
+    ConnectionPool.shared().setLimit(iface_index, adapterLimit)
+    # what happens to the link of this kettle between commands
+    ConnectionPool.shared().setPolicy(mac, linkPolicy, linger)
 
-    hass.data[DOMAIN][mac]['instance'] = kettle
-
-    async_track_time_interval(hass, kettle.update, scan_delta)
+    # Data that you want to share with your platforms
+    # one RedmondKettle per physical kettle, however many entries name its MAC
+    kettle = registry.acquire(mac, lambda: RedmondKettle(
+        mac,
+        password,
+        iface=iface_index,
+        hass=hass,
+        trace=hass.config.path(TRACE_FILE) if frameTrace else None
+    ))
+    if registry.entries(mac):
+        _LOGGER.warning(f"ready4sky[{name}] mac:{mac} is already set up, the entries share one connection")
+
+    # polls while an entity listens, every entry of the kettle shares it
+    schedule = PollSchedule(fast=pollFast, slow=pollSlow, jitter=pollJitter / 100)
+    coordinator = registry.coordinator(mac, lambda: KettleCoordinator(hass, kettle, schedule))
+    if coordinator.schedule != schedule:
+        # another entry of the kettle set it up with other poll options
+        _LOGGER.warning(f"ready4sky[{name}] mac:{mac} the kettle now polls with the options of this entry")
+        coordinator.schedule = schedule
+
+    device['instance'] = kettle
+    device['coordinator'] = coordinator
+    device['unsubscribe'] = config_entry.add_update_listener(async_reload_entry)
+    registry.add(config_entry.entry_id, device)
+    # first read in the background, setup does not wait for the kettle
+    hass.async_create_task(coordinator.async_refresh())
 
     for platform in SUPPORTED_PLATFORMS:
-        hass.helpers.discovery.load_platform(platform, DOMAIN, {}, hass.data[DOMAIN][mac])
+        hass.helpers.discovery.load_platform(platform, DOMAIN, {'entry_id': config_entry.entry_id}, device)
 
     return True
\ No newline at end of file
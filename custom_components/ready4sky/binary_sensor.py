@@ -8,6 +8,7 @@ from homeassistant.components.binary_sensor import (
 )
 from . import DOMAIN
 from .kettle_entity import KettleEntity
+from .registry import KettleRegistry
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -16,9 +17,10 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
     # We only want this platform to be set up via discovery.
     if discovery_info is None:
         return
-    sensors = []
-    for device in hass.data[DOMAIN]:
-        sensors.append(R4SkyKettleBinarySensor(hass.data[DOMAIN][device]))
+    device = KettleRegistry.of(hass).device(discovery_info['entry_id'])
+    if device is None:
+        return
+    sensors = [R4SkyKettleBinarySensor(device)]
     if len(sensors) > 0:
         add_entities(sensors)
 
@@ -28,7 +30,8 @@ class R4SkyKettleBinarySensor(BinarySensorEntity, KettleEntity):
 
     async def async_added_to_hass(self):
         self._handle_update()
-        self.async_on_remove(async_dispatcher_connect(self.hass, 'ready4sky_update', self._handle_update))
+        self.async_on_remove(async_dispatcher_connect(self.hass, self._connect.signal, self._handle_update))
+        self.async_on_remove(self._coordinator.async_add_listener(self._handle_update))
 
     def _handle_update(self):
         # print('R4SkyKettleBinarySensor _handle_update', self._connect._current_temperature)
@@ -40,11 +43,6 @@ class R4SkyKettleBinarySensor(BinarySensorEntity, KettleEntity):
         """Icon is a lightning bolt."""
         return "mdi:lightbulb-on"
 
-    @property
-    def should_poll(self):
-        """Return the polling state."""
-        return True
-
     @property
     def name(self):
         """Return the name of the sensor."""
@@ -54,14 +52,3 @@ class R4SkyKettleBinarySensor(BinarySensorEntity, KettleEntity):
     def state(self):
         """Return the state of the sensor."""
         return True if self._connect._state_boil or self._connect._state_heat else False
-
-    def update(self):
-        info = self._connect.mode()
-        if info:
-            self._state = True if info['status'] == 'on' else False
-
-    async def async_update(self):
-        """Fetch new state data for the sensor.
-        This is the only method that should fetch new data for Home Assistant.
-        """
-        self.update()
\ No newline at end of file
@@ -9,6 +9,7 @@ from re import search
 import voluptuous as vol
 from homeassistant.core import callback
 from .lib import RedmondKettle
+from .registry import KettleRegistry
 from .const import (
     DOMAIN,
     DEFAULT_INTERFACE,
@@ -20,6 +21,19 @@ from .const import (
     CONF_MANUFACTURER,
     CONF_NAME,
     CONF_TEMPERATURE_LIGHT,
+    CONF_FRAME_TRACE,
+    CONF_ADAPTER_LIMIT,
+    DEFAULT_ADAPTER_LIMIT,
+    CONF_LINK_POLICY,
+    CONF_LINGER,
+    DEFAULT_LINK_POLICY,
+    DEFAULT_LINGER,
+    LINK_POLICIES,
+    CONF_POLL_FAST,
+    CONF_POLL_SLOW,
+    CONF_POLL_JITTER,
+    DEFAULT_POLL_FAST,
+    DEFAULT_POLL_JITTER,
     STRING_HEX_SYMBOLS
 )
 
@@ -111,18 +125,26 @@ class R4skyConfigFlow(data_entry_flow.FlowHandler):
     async def paring_proccess(self, user_input={}, errors={}):
         '''Paring form'''
         # await self.async_set_unique_id(identifier)
-        instance = RedmondKettle(
-            mac=self._info.get(CONF_MAC),
+        # a kettle that is set up already is paired through its own connection
+        registry = KettleRegistry.of(self.hass)
+        mac = self._info.get(CONF_MAC)
+        if registry.kettle(mac) is not None:
+            # the kettle only knows the key it was paired with first
+            self._info[CONF_PASSWORD] = registry.kettle(mac)._password
+        instance = registry.acquire(mac, lambda: RedmondKettle(
+            mac=mac,
             password=self._info.get(CONF_PASSWORD),
             iface=self._info.get(CONF_BLUETOOTH_FACE_INDEX),
-        )
+        ))
         try:
-            instance.paring()
+            await instance.async_paring()
             return self.async_create_entry(
                 title=f"{self._info.get(CONF_NAME)}\n{self._info.get(CONF_MAC)}", data=self._info
             )
         except Exception as e:
             return {'base': 'wrong_pairing'}
+        finally:
+            await registry.async_release(mac)
 
     async def async_step_user(self, user_input=None):
         # Specify items in the order they are to be displayed in the UI
@@ -202,6 +224,13 @@ class R4skyOptionsFlowHandler(config_entries.OptionsFlow):
                 self._info[CONF_BLUETOOTH_FACE_NAME] = user_input.get(CONF_BLUETOOTH_FACE_NAME)
                 self._info[CONF_BLUETOOTH_FACE_INDEX] = int(match_result.group(1))
             self._info[CONF_TEMPERATURE_LIGHT] = user_input.get(CONF_TEMPERATURE_LIGHT)
+            self._info[CONF_FRAME_TRACE] = user_input.get(CONF_FRAME_TRACE, False)
+            self._info[CONF_ADAPTER_LIMIT] = user_input.get(CONF_ADAPTER_LIMIT, DEFAULT_ADAPTER_LIMIT)
+            self._info[CONF_LINK_POLICY] = user_input.get(CONF_LINK_POLICY, DEFAULT_LINK_POLICY)
+            self._info[CONF_LINGER] = user_input.get(CONF_LINGER, DEFAULT_LINGER)
+            self._info[CONF_POLL_FAST] = user_input.get(CONF_POLL_FAST, DEFAULT_POLL_FAST)
+            self._info[CONF_POLL_SLOW] = user_input.get(CONF_POLL_SLOW, self._info.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL))
+            self._info[CONF_POLL_JITTER] = user_input.get(CONF_POLL_JITTER, DEFAULT_POLL_JITTER)
             print('self._info', self._info, type(self._info))
             return self.async_create_entry(
                 title=f"{self._info.get(CONF_NAME)}\n{self._info.get(CONF_MAC)}", data=self._info
@@ -220,10 +249,24 @@ class R4skyOptionsFlowHandler(config_entries.OptionsFlow):
 
         iface_name = self._info.get(CONF_BLUETOOTH_FACE_NAME)
         temperatureLight = self._info.get(CONF_TEMPERATURE_LIGHT, True)
+        frameTrace = self._info.get(CONF_FRAME_TRACE, False)
+        adapterLimit = self._info.get(CONF_ADAPTER_LIMIT, DEFAULT_ADAPTER_LIMIT)
+        linkPolicy = self._info.get(CONF_LINK_POLICY, DEFAULT_LINK_POLICY)
+        linger = self._info.get(CONF_LINGER, DEFAULT_LINGER)
+        pollFast = self._info.get(CONF_POLL_FAST, DEFAULT_POLL_FAST)
+        pollSlow = self._info.get(CONF_POLL_SLOW, self._info.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL))
+        pollJitter = self._info.get(CONF_POLL_JITTER, DEFAULT_POLL_JITTER)
         device = user_input.get(CONF_BLUETOOTH_FACE_NAME, iface_name)
         data_schema = {
             vol.Required(CONF_BLUETOOTH_FACE_NAME, default=device): vol.In(self._hci_devices),
             vol.Optional(CONF_TEMPERATURE_LIGHT, default=temperatureLight): bool,
+            vol.Optional(CONF_FRAME_TRACE, default=frameTrace): bool,
+            vol.Optional(CONF_ADAPTER_LIMIT, default=adapterLimit): vol.All(int, vol.Range(min=1, max=10)),
+            vol.Optional(CONF_LINK_POLICY, default=linkPolicy): vol.In(LINK_POLICIES),
+            vol.Optional(CONF_LINGER, default=linger): vol.All(int, vol.Range(min=0, max=3600)),
+            vol.Optional(CONF_POLL_FAST, default=pollFast): vol.All(int, vol.Range(min=1, max=300)),
+            vol.Optional(CONF_POLL_SLOW, default=pollSlow): vol.All(int, vol.Range(min=1, max=3600)),
+            vol.Optional(CONF_POLL_JITTER, default=pollJitter): vol.All(int, vol.Range(min=0, max=50)),
         }
 
         return self.async_show_form(
@@ -9,5 +9,20 @@ CONF_MANUFACTURER = 'manufacturer'
 CONF_MODEL = 'model'
 CONF_NAME = 'name'
 CONF_TEMPERATURE_LIGHT = 'temperatureLight'
+CONF_FRAME_TRACE = 'frameTrace'
+CONF_ADAPTER_LIMIT = 'adapterLimit'
+DEFAULT_ADAPTER_LIMIT = 3
+CONF_LINK_POLICY = 'linkPolicy'
+CONF_LINGER = 'linger'
+DEFAULT_LINK_POLICY = 'linger'
+DEFAULT_LINGER = 60
+LINK_POLICIES = ['always', 'linger', 'on_demand']
+CONF_POLL_FAST = 'pollFast'
+CONF_POLL_SLOW = 'pollSlow'
+CONF_POLL_JITTER = 'pollJitter'
+DEFAULT_POLL_FAST = 5
+DEFAULT_POLL_JITTER = 10
+# seconds a command from the UI may take, retries included
+COMMAND_TIMEOUT = 20
 SUPPORTED_PLATFORMS = ["sensor", "light", "switch", "water_heater", "binary_sensor"]
 # SUPPORTED_DOMAINS = ["sensor", "light", "switch", "binary_sensor", "water_heater"]
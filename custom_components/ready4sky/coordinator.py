@@ -0,0 +1,91 @@
+"""Polling of one kettle, shared by every entity that shows it"""
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from .const import COMMAND_TIMEOUT
+from .lib.deadline import after
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class KettleCoordinator(DataUpdateCoordinator):
+    """Reads the whole state of a kettle (mode and counters) in one connect burst
+
+    Refreshes asked for while a read is in flight wait for that read instead of starting their own,
+    so every entity gets the same snapshot and a poll costs one BLE exchange whoever triggered it.
+    The read runs on the reactor thread, the loop only awaits it.
+
+    The period of the next poll follows the state the last read found, see PollSchedule; a command
+    sent to the kettle is followed by a refresh, then polls at the medium period.
+    """
+
+    def __init__(self, hass, kettle, schedule):
+        super().__init__(hass, _LOGGER, name=f"ready4sky {kettle._mac}",
+                         update_interval=timedelta(seconds=schedule.slow))
+        self._kettle = kettle
+        self._schedule = schedule
+        # the read every concurrent refresh waits for
+        self._inflight = None
+        # the last command of the kettle the period was picked for
+        self._command = kettle.lastCommand
+        # commands of the kettle end with its update signal
+        self._unsubscribe = async_dispatcher_connect(hass, kettle.signal, self._kettleChanged)
+
+    def close(self):
+        if self._unsubscribe:
+            self._unsubscribe()
+            self._unsubscribe = None
+
+    @property
+    def kettle(self):
+        return self._kettle
+
+    @property
+    def schedule(self):
+        return self._schedule
+
+    @schedule.setter
+    def schedule(self, schedule):
+        """Poll with another schedule from the next poll on, every entry of the kettle shares one"""
+        self._schedule = schedule
+        self._reschedule()
+
+    async def _async_update_data(self):
+        if self._inflight is None:
+            self._inflight = self.hass.async_create_task(self._read())
+            self._inflight.add_done_callback(self._readDone)
+        # a refresh cancelled by its caller leaves the read to the others
+        return await asyncio.shield(self._inflight)
+
+    def _readDone(self, task):
+        if self._inflight is task:
+            self._inflight = None
+
+    async def _read(self):
+        try:
+            # the entities are told through the coordinator listeners
+            return await self._kettle.async_snapshot(deadline=after(COMMAND_TIMEOUT), notify=False)
+        except Exception as e:
+            raise UpdateFailed(f"{self._kettle._mac}: {e}") from e
+        finally:
+            self._reschedule()
+
+    def _reschedule(self):
+        command = self._kettle.lastCommand
+        self._command = command
+        sinceCommand = None if command is None else time.monotonic() - command
+        self.update_interval = timedelta(seconds=self._schedule.next(self._kettle.heating, sinceCommand))
+
+    @callback
+    def _kettleChanged(self):
+        if self._kettle.lastCommand == self._command:
+            # a read or a change of availability
+            return
+        self._command = self._kettle.lastCommand
+        if self._listeners:
+            # the read reschedules the polls for the state the command left
+            self.hass.async_create_task(self.async_request_refresh())
@@ -23,7 +23,9 @@ from homeassistant.const import (
 )
 from .const import (
     DOMAIN,
+    COMMAND_TIMEOUT,
 )
+from .lib.deadline import after
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -41,8 +43,16 @@ class KettleEntity(Entity):
         self._password = self._config['password']
         self._iface = self._config['iface']
         self._connect = self._config['instance']
+        # polls the kettle, shared by every entity of it, see KettleCoordinator
+        self._coordinator = self._config['coordinator']
         self._name = self._config['name']
         self._state = None
+        # removed by async_unload_entry
+        self._config.setdefault('entities', []).append(self)
+
+    def _deadline(self):
+        ''' Command deadline, after it the kettle call gives up '''
+        return after(COMMAND_TIMEOUT)
 
     def log(self, *args, msg='', level=1, error=False, log=False, debug=False):
         if error:
@@ -54,6 +64,10 @@ class KettleEntity(Entity):
         else:
             _LOGGER.info(' '.join([str(a) for a in args]))
 
+    async def async_update(self) -> None:
+        """Update the entity on request, concurrent requests share one read of the kettle."""
+        await self._coordinator.async_request_refresh()
+
     @property
     def should_poll(self) -> bool:
         """Return True if entity has to be polled for state.
@@ -105,7 +119,7 @@ class KettleEntity(Entity):
     @property
     def available(self) -> bool:
         """Return True if entity is available."""
-        return True
+        return self._connect.available
 
     @property
     def force_update(self) -> bool:
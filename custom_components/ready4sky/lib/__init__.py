@@ -1 +1,12 @@
-from .kettle import RedmondKettle
\ No newline at end of file
+"""Ready4Sky kettle library
+
+RedmondKettle is the Home Assistant facing kettle and needs homeassistant; it is imported on first
+use, so the transport, the simulator, the benchmark and the trace dump run with bluepy alone.
+"""
+
+
+def __getattr__(name):
+    if name == 'RedmondKettle':
+        from .kettle import RedmondKettle
+        return RedmondKettle
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
@@ -0,0 +1,140 @@
+from bluepy.btle import BTLEDisconnectError
+import asyncio
+import logging
+from .bte import RESPONSE_TIMEOUT
+from .kettle_controller import RedmondKettleController
+from .exception import RedmondKettleException, RedmondKettleConnectException
+from . import protocol
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AsyncRedmondKettleController:
+    """asyncio surface of a RedmondKettleController
+
+    Shares the link, the frame counter and the frame building of the controller it wraps; replies are
+    awaited on the event loop instead of blocking a thread. RedmondKettleController stays the blocking
+    API for scripts.
+
+    Every command takes an optional deadline (see deadline.after()): past it the wait stops with
+    RedmondKettleTimeoutException and a frame not yet written is dropped. Cancelling the awaiting task
+    drops it the same way.
+
+        controller = AsyncRedmondKettleController(RedmondKettleController(mac, key))
+        await controller.auth()
+        await controller.send_mode('heat', 80)
+        await controller.on_mode()
+    """
+
+    def __init__(self, controller):
+        self._controller = controller
+        self._conn = controller._conn
+
+    @property
+    def controller(self):
+        return self._controller
+
+    @property
+    def connected(self):
+        return self._controller.connected
+
+    @property
+    def authorized(self):
+        return self._controller.authorized
+
+    async def _call(self, name, deadline=None, **fields):
+        frame, counter = self._controller._frame(name, **fields)
+        try:
+            return protocol.COMMANDS[name].decode(
+                await self._conn.async_send(frame, counter=counter, deadline=deadline))
+        except BTLEDisconnectError as e:
+            _LOGGER.error('%s %s: BTLEDisconnectError %s', self._controller._mac, name, e)
+            raise RedmondKettleConnectException(e)
+
+    async def auth(self, deadline=None):
+        self._controller._authorized = (await self._call('auth', deadline, key=self._controller._key)).ok
+        return self._controller._authorized
+
+    async def sync(self, timezone=3, deadline=None):
+        await self._call('sync', deadline, **self._controller._syncFields(timezone=timezone))
+        return True
+
+    async def snapshot(self, sync=True, timezone=3, deadline=None, fields=RedmondKettleController.SNAPSHOT_FIELDS):
+        """RedmondKettleController.snapshot(): auth, then sync, mode and the counters in one burst"""
+        if not self.authorized and not await self.auth(deadline):
+            raise RedmondKettleException('Kettle %s refused the key' % self._controller._mac)
+        commands = self._controller._snapshotCommands(sync, timezone, fields)
+        results = await self.pipeline(commands, abort_on_failure=False, deadline=deadline)
+        return self._controller._snapshot(results)
+
+    async def on(self, deadline=None):
+        await self._call('on', deadline)
+        return True
+
+    async def off(self, deadline=None):
+        await self._call('off', deadline)
+        return True
+
+    async def mode(self, deadline=None):
+        return (await self._call('mode', deadline)).asDict()
+
+    async def stat(self, deadline=None):
+        energy_kwh = (await self._call('statEnergy', deadline)).energy_wh
+        count = (await self._call('statCount', deadline)).count
+        return {
+            'energy_kwh': energy_kwh,
+            'time': round(energy_kwh / 2200, 1),
+            'count': count,
+        }
+
+    async def send_mode(self, mode='boil', temperature=40, how_much_boil=80, deadline=None):
+        fields = self._controller._sendModeFields(mode=mode, temperature=temperature, howMuchBoil=how_much_boil)
+        return (await self._call('sendMode', deadline, **fields)).asDict()
+
+    async def on_mode(self, deadline=None):
+        return (await self._call('onMode', deadline)).asDict()
+
+    async def off_mode(self, deadline=None):
+        return (await self._call('offMode', deadline)).asDict()
+
+    async def on_temperature_to_light(self, deadline=None):
+        await self._call('onTemperatureToLight', deadline)
+        return True
+
+    async def off_temperature_to_light(self, deadline=None):
+        await self._call('offTemperatureToLight', deadline)
+        return True
+
+    async def send_rgb_light(self, mode='light', rgb1='0000ff', rgb2='00ff00', rgb3='0000ff', deadline=None):
+        await self._call('sendRGBLight', deadline, **self._controller._sendRGBLightFields(mode=mode, rgb1=rgb1, rgb2=rgb2, rgb3=rgb3))
+        return True
+
+    async def rgb_light(self, mode='boil', deadline=None):
+        return (await self._call('RGBLight', deadline, palette=mode)).asDict()
+
+    async def pipeline(self, commands, abort_on_failure=True, timeout=RESPONSE_TIMEOUT, deadline=None):
+        """RedmondKettleController.pipeline() for the event loop, same commands and results"""
+        controller = self._controller
+        results, frames = controller._pipelineFrames(commands, abort_on_failure)
+        if frames is None:
+            return results
+        futures = [None] * len(frames) if abort_on_failure else controller._pipelineSubmit(frames)
+
+        disconnected = None
+        for i, frame in enumerate(frames):
+            if frame is None:
+                continue
+            if abort_on_failure:
+                futures[i], = controller._pipelineSubmit([frame])
+            try:
+                controller._pipelineResult(results[i], await self._conn.async_wait(futures[i], timeout, deadline))
+            except asyncio.CancelledError as e:
+                for pending in futures[i + 1:]:
+                    if pending is not None:
+                        self._conn.cancel(pending)
+                raise e
+            except Exception as e:
+                disconnected = controller._pipelineError(results[i], e) or disconnected
+            if abort_on_failure and results[i]['status'] != 'ok':
+                break
+        return controller._pipelineDone(results, disconnected)
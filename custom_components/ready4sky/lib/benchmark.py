@@ -0,0 +1,330 @@
+"""Transport and protocol microbenchmarks, run against the in-process kettle simulator
+
+    make bench
+    cd custom_components/ready4sky && python3 -m lib.benchmark --output benchmark.json
+
+No Bluetooth adapter is needed, only the bluepy package; homeassistant is not imported. Results are written as JSON so runs of
+different releases can be compared; every figure is a plain number, lower is better unless the key
+ends with _per_s.
+"""
+from bluepy.btle import BTLEException
+from datetime import datetime
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from . import protocol
+from .kettle_controller import RedmondKettleController
+from .reactor import Reactor
+from .watchdog import Watchdog
+from .simulator import KettleSimulator
+from .telemetry import TelemetryCache
+
+MAC = 'aa:bb:cc:dd:ee:ff'
+KEY = '0011223344556677'
+MANIFEST = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'manifest.json')
+
+
+def _timed(fn, n):
+    """Calls per second of fn, best of three runs"""
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {'n': n, 'per_s': round(n / best), 'ns_per_op': round(best / n * 1e9)}
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+
+    def at(p):
+        return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+    return {
+        'n': len(samples),
+        'mean_us': round(statistics.mean(samples) * 1e6, 1),
+        'p50_us': round(at(50) * 1e6, 1),
+        'p90_us': round(at(90) * 1e6, 1),
+        'p99_us': round(at(99) * 1e6, 1),
+        'max_us': round(samples[-1] * 1e6, 1),
+    }
+
+
+def _reply(simulator, name, **fields):
+    """Reply frame of the simulated kettle to a command"""
+    reply, _ = simulator.kettle(MAC).handle(protocol.COMMANDS[name].encode(0x01, **fields), True)
+    return reply
+
+
+def _open_fds():
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None
+
+
+def _thread_cpu(thread):
+    """CPU seconds used by one thread, falls back to the whole process"""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+    except (AttributeError, OSError):
+        return time.process_time()
+
+
+def _connect(simulator):
+    controller = RedmondKettleController(MAC, KEY, peripheral=simulator.Peripheral)
+    if not controller.auth():
+        raise BTLEException('Simulated kettle refused the key')
+    return controller
+
+
+def _drop(simulator, controller):
+    """The kettle drops the link, wait for the reactor to notice"""
+    simulator.disconnect(MAC)
+    deadline = time.monotonic() + 5
+    while controller._conn._error is None and time.monotonic() < deadline:
+        time.sleep(0.0005)
+
+
+def bench_codec(n):
+    simulator = KettleSimulator()
+    commands = protocol.COMMANDS
+    mode_reply = _reply(simulator, 'mode')
+    return {
+        'encode_mode': _timed(lambda: commands['mode'].encode(0x10), n),
+        'encode_sendMode': _timed(lambda: commands['sendMode'].encode(0x10, mode='heat', temperature=80), n),
+        'encode_sendRGBLight': _timed(lambda: commands['sendRGBLight'].encode(
+            0x10, palette='light', temperature1=0, temperature2=50, temperature3=100,
+            rgb1='27ff00', rgb2='00ffec', rgb3='000fff'), n),
+        'frame_decode': _timed(lambda: protocol.Frame.decode(mode_reply), n),
+        'frame_encode': _timed(lambda: protocol.Frame(0x10, protocol.OP_MODE, b'').encode(), n),
+    }
+
+
+def bench_parse(n):
+    simulator = KettleSimulator()
+    commands = protocol.COMMANDS
+    mode_reply = _reply(simulator, 'mode')
+    energy_reply = _reply(simulator, 'statEnergy')
+    count_reply = _reply(simulator, 'statCount')
+
+    def stat():
+        return {
+            'energy_kwh': commands['statEnergy'].decode(energy_reply).energy_wh,
+            'count': commands['statCount'].decode(count_reply).count,
+        }
+    return {
+        'mode': _timed(lambda: commands['mode'].decode(mode_reply).asDict(), n),
+        'stat': _timed(stat, n),
+    }
+
+
+def bench_rtt(n, latency):
+    """send() round trip through the reactor thread, the TX queue and the simulator"""
+    simulator = KettleSimulator(latency=latency)
+    controller = _connect(simulator)
+    conn = controller._conn
+    samples = []
+    try:
+        for _ in range(n):
+            frame, counter = controller._frame('mode')
+            start = time.perf_counter()
+            conn.send(frame, counter=counter)
+            samples.append(time.perf_counter() - start)
+    finally:
+        _drop(simulator, controller)
+    return dict(_percentiles(samples), latency_s=latency)
+
+
+def bench_cold_state(n, latency):
+    """Connect to the full kettle state: auth, sync, mode, stat one by one against snapshot()"""
+    simulator = KettleSimulator(latency=latency)
+    sequential, snapshot = [], []
+    for _ in range(n):
+        start = time.perf_counter()
+        controller = _connect(simulator)
+        controller.sync()
+        controller.mode()
+        controller.stat()
+        sequential.append(time.perf_counter() - start)
+        controller.close()
+
+        start = time.perf_counter()
+        controller = RedmondKettleController(MAC, KEY, peripheral=simulator.Peripheral)
+        controller.snapshot()
+        snapshot.append(time.perf_counter() - start)
+        controller.close()
+    return {
+        'n': n,
+        'latency_s': latency,
+        'sequential_ms': round(statistics.median(sequential) * 1e3, 3),
+        'snapshot_ms': round(statistics.median(snapshot) * 1e3, 3),
+    }
+
+
+def bench_poll(n, latency):
+    """Steady-state poll of a connected kettle: every field group against the stale ones of TelemetryCache"""
+    simulator = KettleSimulator(latency=latency)
+    controller = _connect(simulator)
+    cache = TelemetryCache()
+    full, cached = [], []
+    frames = 0
+    try:
+        for _ in range(n):
+            start = time.perf_counter()
+            controller.snapshot(sync=False)
+            full.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            groups = cache.stale()
+            fields = cache.commands(groups)
+            cache.store(groups, controller.snapshot(sync=False, fields=fields))
+            cached.append(time.perf_counter() - start)
+            frames += len(fields)
+    finally:
+        _drop(simulator, controller)
+    return {
+        'n': n,
+        'latency_s': latency,
+        'full_ms': round(statistics.median(full) * 1e3, 3),
+        'cached_ms': round(statistics.median(cached) * 1e3, 3),
+        'full_frames_per_poll': len(RedmondKettleController.SNAPSHOT_FIELDS),
+        'cached_frames_per_poll': round(frames / n, 3),
+    }
+
+
+def bench_idle(seconds):
+    """CPU used by the reactor thread while a connected kettle is silent"""
+    simulator = KettleSimulator()
+    controller = _connect(simulator)
+    thread = Reactor.shared().thread
+    try:
+        cpu = _thread_cpu(thread)
+        start = time.perf_counter()
+        time.sleep(seconds)
+        cpu = _thread_cpu(thread) - cpu
+        wall = time.perf_counter() - start
+    finally:
+        _drop(simulator, controller)
+    return {'seconds': round(wall, 3), 'cpu_s': round(cpu, 6), 'cpu_percent': round(cpu / wall * 100, 3)}
+
+
+def bench_reconnects(n):
+    """Thread, descriptor and memory growth over connect, auth, drop cycles"""
+    simulator = KettleSimulator()
+    # warm up imports and caches before the baseline
+    _drop(simulator, _connect(simulator))
+    gc.collect()
+    tracemalloc.start()
+    threads, fds, memory = threading.active_count(), _open_fds(), tracemalloc.get_traced_memory()[0]
+    completed, error = 0, None
+    start = time.perf_counter()
+    try:
+        for _ in range(n):
+            _drop(simulator, _connect(simulator))
+            completed += 1
+    except BTLEException as e:
+        # a leak that exhausts descriptors or threads stops the run, report how far we got
+        error = '%s: %s' % (type(e).__name__, e)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    memory = tracemalloc.get_traced_memory()[0] - memory
+    tracemalloc.stop()
+    fds_after = _open_fds()
+    return {
+        'n': n,
+        'completed': completed,
+        'error': error,
+        'connect_auth_ms': round(elapsed / max(completed, 1) * 1e3, 3),
+        'thread_growth': threading.active_count() - threads,
+        'fd_growth': fds_after - fds if fds is not None and fds_after is not None else None,
+        'memory_growth_bytes': memory,
+        'memory_growth_per_reconnect_bytes': round(memory / max(completed, 1)),
+        # connections the reactor still watches after their link was dropped
+        'reactor_connections': Reactor.shared().connections,
+    }
+
+
+def bench_teardown(n):
+    """What is left once n controllers were used and closed and the reactor stopped, everything should be 0"""
+    simulator = KettleSimulator()
+    threads, fds = threading.active_count(), _open_fds()
+    # the baseline is a process without the IO and watchdog threads
+    threads -= sum(1 for thread in threading.enumerate() if thread.name in ('ready4sky_reactor', 'ready4sky_watchdog'))
+    start = time.perf_counter()
+    for _ in range(n):
+        with RedmondKettleController(MAC, KEY, peripheral=simulator.Peripheral) as controller:
+            controller.auth()
+            controller.mode()
+    stopped = Watchdog.shared().stop() and Reactor.shared().stop()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    fds_after = _open_fds()
+    return {
+        'n': n,
+        'cycle_ms': round(elapsed / max(n, 1) * 1e3, 3),
+        'reactor_stopped': stopped,
+        'thread_growth': threading.active_count() - threads,
+        'fd_growth': fds_after - fds if fds is not None and fds_after is not None else None,
+        # peripherals still connected, each one is a bluepy-helper process on real hardware
+        'open_links': simulator.connections,
+    }
+
+
+def _version():
+    try:
+        with open(MANIFEST) as file:
+            return json.load(file).get('version')
+    except (OSError, ValueError):
+        return None
+
+
+def run(quick=False, reconnects=1000, latency=0.0, idle=2.0):
+    scale = 10 if quick else 1
+    return {
+        'version': _version(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'transport': 'simulator',
+        'results': {
+            'codec': bench_codec(100000 // scale),
+            'parse': bench_parse(100000 // scale),
+            'rtt': bench_rtt(5000 // scale, latency),
+            'cold_state': bench_cold_state(200 // scale, max(latency, 0.005)),
+            'poll': bench_poll(200 // scale, max(latency, 0.005)),
+            'idle': bench_idle(idle / scale),
+            'reconnects': bench_reconnects(reconnects // scale),
+            'teardown': bench_teardown(reconnects // scale),
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Ready4Sky transport and protocol benchmarks')
+    parser.add_argument('--output', '-o', help='write the JSON report here instead of stdout')
+    parser.add_argument('--quick', action='store_true', help='ten times fewer iterations')
+    parser.add_argument('--reconnects', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated radio latency, seconds')
+    parser.add_argument('--idle', type=float, default=2.0, help='seconds to watch the idle reactor thread')
+    args = parser.parse_args(argv)
+
+    report = json.dumps(run(args.quick, args.reconnects, args.latency, args.idle), indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(report + '\n')
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+from threading import Lock
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Stops talking to a kettle that keeps failing
+
+    closed    - calls go through, threshold failures in a row open the breaker
+    open      - calls fail at once; after reset_timeout the next call becomes a probe
+    half_open - one probe is in flight, other calls fail at once. Success closes the breaker,
+                failure opens it again for twice as long, up to max_reset_timeout
+    """
+
+    def __init__(self, threshold=3, reset_timeout=30.0, max_reset_timeout=300.0, name=None):
+        self._threshold = max(1, threshold)
+        self._base_timeout = reset_timeout
+        self._max_timeout = max_reset_timeout
+        self._timeout = reset_timeout
+        self._name = name
+        self._lock = Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened = 0.0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened >= self._timeout:
+                # the next allow() is a probe
+                return HALF_OPEN
+            return self._state
+
+    @property
+    def available(self):
+        with self._lock:
+            return self._state == CLOSED
+
+    @property
+    def retryIn(self):
+        """Seconds until the next probe, 0 when calls go through"""
+        with self._lock:
+            if self._state != OPEN:
+                return 0
+            return max(0.0, self._opened + self._timeout - time.monotonic())
+
+    def allow(self):
+        """May a call reach the kettle now
+        :return: False - fail the call, CLOSED - go ahead, HALF_OPEN - go ahead, the call is the probe
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return CLOSED
+            if self._state == OPEN and time.monotonic() - self._opened >= self._timeout:
+                self._state = HALF_OPEN
+                _LOGGER.info('Probe %s', self._name)
+                return HALF_OPEN
+            return False
+
+    def success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                _LOGGER.info('%s is back, close the breaker', self._name)
+            self._state = CLOSED
+            self._failures = 0
+            self._timeout = self._base_timeout
+
+    def cancel(self):
+        """The call was abandoned before it could tell anything, a probe is due again later"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._state = OPEN
+                self._opened = time.monotonic()
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN:
+                self._timeout = min(self._max_timeout, self._timeout * 2)
+            elif self._state != CLOSED or self._failures < self._threshold:
+                return
+            self._state = OPEN
+            self._opened = time.monotonic()
+            _LOGGER.warning('%s unreachable after %s failures, next probe in %.1fs',
+                            self._name, self._failures, self._timeout)
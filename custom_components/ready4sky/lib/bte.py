@@ -1,12 +1,34 @@
 from bluepy.btle import Peripheral, Scanner, DefaultDelegate, ADDR_TYPE_RANDOM, BTLEException, BTLEDisconnectError
-from queue import Queue
-from threading import Thread
+from queue import Queue, Empty
+from threading import Lock, Event, current_thread
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+from .exception import RedmondKettleConnectException, RedmondKettleTimeoutException
+from .deadline import remaining, check
+from .protocol import hexlify
+from .trace import TX, RX
+from .reactor import Reactor
+from .watchdog import Watchdog
 import binascii
+import asyncio
 import logging
+import os
 import traceback
 import time
 _LOGGER = logging.getLogger(__name__)
 
+# how long send() waits for the notification that answers a frame
+RESPONSE_TIMEOUT = 5.0
+
+# magic stuff for the Nordic UART GATT service
+UART_UUID = "6e400001-b5a3-f393-e0a9-e50e24dcca9e"
+UART_WRITE_UUID_PREFIX = "6e400002"
+# this is general magic GATT stuff
+# notify handles will have a UUID that begins with this
+UART_NOTIFY_UUID_PREFIX = "00002902"
+# these are the byte values that we need to write to subscribe/unsubscribe for notifications
+SUBSCRIBE_BYTES = binascii.a2b_hex(bytes('0100', 'utf-8'))
+UNSUBSCRIBE_BYTES = binascii.a2b_hex(bytes('0000', 'utf-8'))
+
 # create a delegate class to receive the BLE broadcast packets
 class ScanDelegate(DefaultDelegate):
     def __init__(self):
@@ -21,31 +43,109 @@ class ScanDelegate(DefaultDelegate):
         #     print("Received new data from", dev.addr)
 
 
+class _HelperOutput:
+    """Line reader over bluepy-helper's stdout that can tell whether a whole line is waiting
+
+    bluepy reads the helper through a buffered text stream: one read may pull in several notification
+    lines, and the ones after the first are invisible to select() on the descriptor.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._fd = stream.fileno()
+        self._buffer = bytearray()
+
+    def fileno(self):
+        return self._fd
+
+    @property
+    def pending(self):
+        """A line is buffered, readline() returns it without blocking"""
+        # bluepy skips comment and empty lines, they must not count as a reply
+        while True:
+            end = self._buffer.find(b'\n')
+            if end < 0:
+                return False
+            if not (self._buffer.startswith(b'#') or end == 0):
+                return True
+            del self._buffer[:end + 1]
+
+    def readline(self):
+        while True:
+            end = self._buffer.find(b'\n')
+            if end >= 0:
+                line = bytes(self._buffer[:end + 1])
+                del self._buffer[:end + 1]
+                return line.decode()
+            chunk = os.read(self._fd, 4096)
+            if not chunk:
+                line = bytes(self._buffer)
+                self._buffer.clear()
+                return line.decode()
+            self._buffer += chunk
+
+    def close(self):
+        self._stream.close()
+
+
 class BTEConnect(DefaultDelegate):
 
-    def __init__(self, addr, key, iface):
+    def __init__(self, addr, key, iface, cache=None, peripheral=None, trace=None, reactor=None, watchdog=None):
         DefaultDelegate.__init__(self)
 
         # ... initialise here
         self._mac = addr
         self._iface = iface
         self._peripheral = None
+        # factory of the peripheral, bluepy Peripheral or a stand-in such as simulator.KettleSimulator.Peripheral
+        self._peripheral_factory = peripheral or Peripheral
+        # GattHandleCache, lets a reconnect skip service discovery
+        self._cache = cache
+        self._write_handle = None
+        self._from_cache = False
+        self._confirmed = False
+        # TraceRecorder, captures every frame when frame tracing is on
+        self._trace = trace
         # self.Peripheral = None
         # self.Peripheral = Peripheral(deviceAddr=self._mac, addrType=ADDR_TYPE_RANDOM, iface=self._iface)
         # self.Peripheral.setDelegate(self)
         self._tx_queue = Queue()
-        self._nx_queue = Queue()
+        # counter byte -> Future of the caller waiting for that response
+        self._pending = {}
+        self._pending_lock = Lock()
+        self._error = None
+        # disconnect() was called, the reactor closes the link on its next wake up
+        self._closing = False
+        self._closed = Event()
+        # monotonic time of the last notification, the Watchdog tells a hung helper by it
+        self._last_rx = time.monotonic()
         self._key = key
         self._iter = 0
         self._use_backlight = True
         self.notify = None
         self.handle = None
+        self._fd = None
+        # the reactor thread serves every connection
+        self._reactor = reactor or Reactor.shared()
+        if reactor is None:
+            watchdog = watchdog or Watchdog.shared()
+            watchdog.start()
+        # kills the handshake below when it hangs, then watches the link through the reactor
+        self._watchdog = watchdog
 
-        # start the bluepy IO thread
-        self._bluepy_thread = Thread(target=self._bluepy_handler)
-        self._bluepy_thread.name = "bluepy_handler"
-        self._bluepy_thread.daemon = False
-        self._bluepy_thread.start()
+        # connect here, in the caller's thread, then hand the peripheral over to the reactor
+        if self._watchdog is not None:
+            self._watchdog.connecting(self)
+        try:
+            self._start()
+        finally:
+            if self._watchdog is not None:
+                self._watchdog.connected(self)
+        if self._closing:
+            # the Watchdog gave up on the handshake right as it finished
+            self._dropPeripheral()
+            raise self._error
+        self._reactor.register(self)
 
     def log(self, *args, msg='', level=1, error=False, log=False, debug=False):
         if error:
@@ -57,21 +157,11 @@ class BTEConnect(DefaultDelegate):
         else:
             _LOGGER.info(' '.join([str(a) for a in args]))
 
-    # def __enter__(self):
-    #     try:
-    #         self.__exit__()
-    #         self.Peripheral = Peripheral(deviceAddr=self._mac, addrType=btle.ADDR_TYPE_RANDOM)
-    #         self.Peripheral.setDelegate(self)
-    #     except:
-    #         return self.__enter__()
-    #     return self
-
-    # def __exit__(self):
-    #     try:
-    #         self.Peripheral.disconnect()
-    #     except:
-    #         pass
-    #     self._conn = None
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
     @staticmethod
     def scan():
@@ -104,108 +194,400 @@ class BTEConnect(DefaultDelegate):
     def key(self):
         return self._key
 
+    @property
+    def cached(self):
+        """Connected through the cached GATT handles, without service discovery"""
+        return self._from_cache
+
+    @property
+    def connected(self):
+        """Connected and nothing has failed the link yet"""
+        return self._error is None and not self._closing and self._peripheral is not None
+
+    def disconnect(self):
+        """Close the link: the reactor drops the peripheral and fails every waiting caller
+        Returns once the peripheral is disconnected, so the adapter slot is really free.
+        """
+        self._closing = True
+        if self._error is not None and self._peripheral is None:
+            # never connected or already closed
+            return
+        if current_thread() is self._reactor.thread:
+            # a reactor timer closing an idle link, nobody else can touch the peripheral now
+            self._close(RedmondKettleConnectException('Disconnected from %s' % self._mac))
+            return
+        self._reactor.wake(self)
+        if not self._closed.wait(RESPONSE_TIMEOUT):
+            self.log('Disconnect timeout from', self._mac)
+
+    def close(self):
+        """disconnect() for good: once it returns the bluepy-helper is gone and no caller is left waiting"""
+        self.disconnect()
+
+    def expire(self, age):
+        """Fail the requests submitted more than age seconds ago, from any thread
+        :return: (number failed, True when nothing came back from the kettle since the oldest of them)
+        """
+        now = time.monotonic()
+        with self._pending_lock:
+            stuck = [(counter, future) for counter, future in self._pending.items() if now - future.submitted > age]
+            for counter, _ in stuck:
+                del self._pending[counter]
+        if not stuck:
+            return 0, False
+        oldest = min(future.submitted for _, future in stuck)
+        for counter, future in stuck:
+            try:
+                future.set_exception(RedmondKettleConnectException('Request #%s to %s is stuck' % (counter, self._mac)))
+            except InvalidStateError:
+                pass
+        return len(stuck), self._last_rx < oldest
+
+    def abort(self, error):
+        """Fail every caller now and kill the bluepy-helper, from any thread
+        Unlike disconnect() it does not need the reactor: a hung helper may be blocking it.
+        """
+        self._closing = True
+        self._failPending(error)
+        peripheral = self._peripheral
+        helper = getattr(peripheral, '_helper', None)
+        try:
+            if helper is not None and hasattr(helper, 'kill'):
+                # bluepy-helper subprocess, the blocked read in the reactor gets EOF
+                helper.kill()
+            elif hasattr(peripheral, 'kill'):
+                # stand-in peripherals
+                peripheral.kill()
+        except Exception as e:
+            self.log('Can not kill bluepy-helper of', self._mac, e)
+        self._reactor.wake(self)
+
     def handleNotification(self, cHandle, data):
-        # print(cHandle, data)
-        self.log('Bluetooth handleNotification', cHandle, data, binascii.b2a_hex(data[0:]).decode("utf-8"), debug=True)
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug('Bluetooth handleNotification %s %s', cHandle, hexlify(data))
         self.handle = cHandle
         self.notify = data
-        self._nx_queue.put_nowait(binascii.b2a_hex(data[0:]).decode("utf-8"))
+        self._confirmed = True
+        self._last_rx = time.monotonic()
+        if self._trace:
+            self._trace.record(self._mac, RX, data[1] if len(data) > 1 else 0x00, data)
+        if len(data) < 2:
+            return
+        # the kettle echoes the counter byte of the frame it answers
+        with self._pending_lock:
+            future = self._pending.pop(data[1], None)
+        if future is None:
+            self.log('Unsolicited notification from', self.mac, hexlify(data))
+            return
+        try:
+            future.set_result(bytes(data))
+        except InvalidStateError:
+            # cancelled by its caller while the notification was on its way
+            pass
 
-    def hexToDec(self, chr):
-        return int(str(chr), 16)
+    def _failPending(self, error):
+        """The link is gone: fail every waiting caller and every later send()"""
+        with self._pending_lock:
+            if self._error is None:
+                self._error = error
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for future in pending:
+            try:
+                future.set_exception(error)
+            except InvalidStateError:
+                pass
 
-    def _bluepy_handler(self):
-        """This is the bluepy IO thread
+    def _start(self):
+        try:
+            cached = self._cache.get(self._mac) if self._cache else None
+            if cached:
+                try:
+                    self._connectCached(cached)
+                except BTLEDisconnectError as e:
+                    # the kettle is not reachable, discovery will not help
+                    raise e
+                except BTLEException as e:
+                    if self._closing:
+                        # aborted by the Watchdog, not a stale cache
+                        raise e
+                    self.log('Cached GATT handles failed for', self._mac, e)
+                    self._cache.invalidate(self._mac)
+                    self._dropPeripheral()
+                    cached = None
+            if not cached:
+                self._connectDiscover()
+            self._fd = self._notificationFileno()
+
+        except BTLEException as e:
+            self._dropPeripheral()
+            self._failPending(e)
+            raise e
+        except Exception as e:
+            self._dropPeripheral()
+            self._failPending(BTLEException('Exception %s' % e))
+            raise e
+
+    def _open(self, addrType):
+        """Connect the peripheral
+        It is created before it connects, so abort() can kill a helper that hangs in the connect itself.
+        """
+        self._peripheral = self._peripheral_factory()
+        self._peripheral.setDelegate(self)
+        self._peripheral.connect(self._mac, addrType, self._iface)
+        helper = getattr(self._peripheral, '_helper', None)
+        if helper is not None and not isinstance(helper.stdout, _HelperOutput):
+            # the helper stays silent after "stat state=conn" until asked, nothing is left in the old buffer
+            helper.stdout = _HelperOutput(helper.stdout)
+
+    def _connectCached(self, cached):
+        """Connect with the handles remembered from an earlier discovery"""
+        self.log('Connect to', self._mac, 'with cached GATT handles', cached['write_handle'], cached['subscribe_handle'])
+        self._open(cached['addr_type'])
+        # a stale subscribe handle is rejected by the kettle here, which sends us back to discovery
+        self._peripheral.writeCharacteristic(cached['subscribe_handle'], SUBSCRIBE_BYTES, withResponse=True)
+        self._write_handle = cached['write_handle']
+        self._from_cache = True
+
+    def _connectDiscover(self):
+        """Connect and walk the GATT services to find the Nordic UART handles"""
+        # Connect to the peripheral, the notification delegate is set before
+        self._open(ADDR_TYPE_RANDOM)
+
+        # get the list of services
+        services = self._peripheral.getServices()
+        write_handle = None
+        subscribe_handle = None
+
+        # dump out some info for the services that we found
+        for service in services:
+            self.log("Found service: " + str(service) + ' uuid:' + str(service.uuid).lower(), debug=True)
+            if str(service.uuid).lower() == UART_UUID:
+                # this is the Nordic UART service that we're looking for
+                chars = service.getCharacteristics()
+                for char in chars:
+                    self.log(
+                        "  char: " + str(char) + ", handle: " + str(char.handle) + ", props: " + str(char.properties),
+                        debug=True)
+                descs = service.getDescriptors()
+                # this is the important part-
+                # find the handles that we will write to and subscribe for notifications
+                for desc in descs:
+                    self.log("  desc: " + str(desc), debug=True)
+                    str_uuid = str(desc.uuid).lower()
+                    if str_uuid.startswith(UART_WRITE_UUID_PREFIX):
+                        write_handle = desc.handle
+                        self.log("*** Found write handle: " + str(write_handle), debug=True)
+                    elif str_uuid.startswith(UART_NOTIFY_UUID_PREFIX):
+                        subscribe_handle = desc.handle
+                        self.log("*** Found subscribe handle: " + str(subscribe_handle), debug=True)
+
+        if write_handle is None or subscribe_handle is None:
+            raise BTLEException('Nordic UART handles not found on %s' % self._mac)
+
+        # this call performs the subscribe for notifications
+        self._peripheral.writeCharacteristic(subscribe_handle, SUBSCRIBE_BYTES, withResponse=True)
+        self._write_handle = write_handle
+        self._from_cache = False
+
+        if self._cache:
+            self._cache.put(self._mac, {
+                'addr_type': self._peripheral.addrType,
+                'write_handle': write_handle,
+                'subscribe_handle': subscribe_handle,
+                'services': [str(service.uuid).lower() for service in services],
+            })
+
+    def _dropPeripheral(self):
+        try:
+            if self._peripheral:
+                self._peripheral.disconnect()
+        except BTLEException:
+            # bluepy only stops its helper once the helper acknowledged the disconnect
+            stop = getattr(self._peripheral, '_stopHelper', None)
+            if stop:
+                try:
+                    stop()
+                except Exception as e:
+                    self.log('Can not stop bluepy-helper of', self._mac, e)
+        self._peripheral = None
+
+    def _notificationFileno(self):
+        """File descriptor that becomes readable when bluepy-helper has data for us"""
+        helper = getattr(self._peripheral, '_helper', None)
+        if helper is not None:
+            return helper.stdout.fileno()
+        # stand-in peripherals expose their own descriptor
+        return self._peripheral.fileno()
+
+    def _buffered(self):
+        """bluepy-helper's stdout holds a whole line that select() can not see"""
+        helper = getattr(self._peripheral, '_helper', None)
+        return helper is not None and getattr(helper.stdout, 'pending', False)
+
+    def fileno(self):
+        return self._fd
+
+    def _service(self):
+        """Reactor callback: write queued frames or close the link"""
+        if self._closing:
+            self._close(RedmondKettleConnectException('Disconnected from %s' % self._mac))
+            return
+        self._flush()
+
+    def _readable(self):
+        """Reactor callback: bluepy-helper has data for us"""
+        if self._peripheral is None:
+            return
+        # unsolicited notifications are dispatched to handleNotification from here.
+        # bluepy treats a zero timeout as "block", so poll with the smallest positive one.
+        # Lines already read from the pipe are not seen by that poll, a None timeout reads them straight away
+        while self._peripheral is not None:
+            if self._buffered():
+                self._peripheral.waitForNotifications(None)
+            elif not self._peripheral.waitForNotifications(0.001):
+                break
+
+    def _fail(self, error):
+        """Reactor callback: the peripheral raised, the link is dead"""
+        self._close(error if isinstance(error, BTLEException) else BTLEException('Exception %s' % error))
+
+    def _close(self, error):
+        self._reactor.unregister(self)
+        self._dropPeripheral()
+        self._failPending(error)
+        # frames that never went out, their futures were failed with the pending ones
+        while True:
+            try:
+                self._tx_queue.get_nowait()
+            except Empty:
+                break
+        self._closed.set()
+
+    def _flush(self):
+        """Write every queued message to the UART write handle, back to back"""
+        while True:
+            try:
+                msg, counter, future = self._tx_queue.get_nowait()
+            except Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                # the caller gave up on this frame before it reached the kettle
+                continue
+            if isinstance(msg, bytearray):
+                # preallocated template, only the reactor thread patches it so reuse is safe
+                msg[1] = counter
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                # logged as written, a template carries the counter only from here on
+                _LOGGER.debug('Send message to %s %s', self.mac, hexlify(msg))
+            self._peripheral.writeCharacteristic(self._write_handle, msg)
+            if self._trace:
+                self._trace.record(self._mac, TX, counter, msg)
+
+    def submit(self, message, counter=None):
+        """Queue a BLE message without waiting for the response
+        The response is matched to the request by the counter byte (second byte of the frame),
+        so several threads may have requests in flight at the same time.
+        :param message: Frame bytes to send; a bytearray is a reusable template,
+                        its counter byte is written by the reactor thread right before the write
+        :param counter: Counter of the frame, taken from the frame itself when omitted
+        :return: Future that receives the response frame
+        """
+        if counter is None:
+            counter = message[1]
+        future = Future()
+        future.submitted = time.monotonic()
+        with self._pending_lock:
+            if self._error is not None:
+                raise self._error
+            if counter in self._pending:
+                raise BTLEException('Counter %s is already in flight on %s' % (counter, self._mac))
+            self._pending[counter] = future
+
+        # put the message in the TX queue
+        self._tx_queue.put_nowait((message, counter, future))
+        self._reactor.wake(self)
+        return future
+
+    def wait(self, future, timeout=RESPONSE_TIMEOUT, deadline=None):
+        """Wait for the response to a submitted message
+        :param future: Future returned by submit()
+        :param timeout: Seconds to wait for the response
+        :param deadline: time.monotonic() by which the caller needs an answer, see deadline.after()
         :return:
         """
-        self._start()
+        budget = remaining(deadline, timeout)
+        try:
+            msg = future.result(budget)
+        except FutureTimeoutError:
+            self._timeout(future, budget < timeout)
+        except BTLEException as e:
+            self.log('Request %s from' % type(e).__name__, self.mac, e)
+            raise e
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug('Request from %s %s', self.mac, hexlify(msg))
+        return msg
 
-    def _start(self):
+    async def async_wait(self, future, timeout=RESPONSE_TIMEOUT, deadline=None):
+        """wait() for the event loop: awaits the response without blocking the loop thread"""
+        budget = remaining(deadline, timeout)
         try:
-            # Connect to the peripheral
-            self._peripheral = Peripheral(deviceAddr=self._mac, addrType=ADDR_TYPE_RANDOM, iface=self._iface)
-            # Set the notification delegate
-            self._peripheral.setDelegate(self)
-
-            # get the list of services
-            services = self._peripheral.getServices()
-            write_handle = None
-            subscribe_handle = None
-
-            # magic stuff for the Nordic UART GATT service
-            uart_uuid = "6e400001-b5a3-f393-e0a9-e50e24dcca9e"
-            uart_write_uuid_prefix = "6e400002"
-
-            # this is general magic GATT stuff
-            # notify handles will have a UUID that begins with this
-            uart_notify_uuid_prefix = "00002902"
-            # these are the byte values that we need to write to subscribe/unsubscribe for notifications
-            subscribe_bytes = binascii.a2b_hex(bytes('0100', 'utf-8'))
-            unsubscribe_bytes = binascii.a2b_hex(bytes('0000', 'utf-8'))
-
-            # dump out some info for the services that we found
-            for service in services:
-                self.log("Found service: " + str(service) + ' uuid:' + str(service.uuid).lower(), debug=True)
-                if str(service.uuid).lower() == uart_uuid:
-                    # this is the Nordic UART service that we're looking for
-                    chars = service.getCharacteristics()
-                    for char in chars:
-                        self.log(
-                            "  char: " + str(char) + ", handle: " + str(char.handle) + ", props: " + str(char.properties),
-                            debug=True)
-                    descs = service.getDescriptors()
-                    # this is the important part-
-                    # find the handles that we will write to and subscribe for notifications
-                    for desc in descs:
-                        self.log("  desc: " + str(desc), debug=True)
-                        str_uuid = str(desc.uuid).lower()
-                        if str_uuid.startswith(uart_write_uuid_prefix):
-                            write_handle = desc.handle
-                            self.log("*** Found write handle: " + str(write_handle), debug=True)
-                        elif str_uuid.startswith(uart_notify_uuid_prefix):
-                            subscribe_handle = desc.handle
-                            self.log("*** Found subscribe handle: " + str(subscribe_handle), debug=True)
-
-            if write_handle is not None and subscribe_handle is not None:
-                # we found the handles that we need
-
-                # this call performs the subscribe for notifications
-                response = self._peripheral.writeCharacteristic(subscribe_handle, subscribe_bytes, withResponse=True)
-
-                # now that we're subscribed for notifications, waiting for TX/RX...
-                while True:
-                    while not self._tx_queue.empty():
-                        msg = self._tx_queue.get_nowait()
-                        msg_bytes = binascii.a2b_hex(bytes(msg, encoding="utf-8"))
-                        self._peripheral.writeCharacteristic(14, msg_bytes)
-
-                        self._peripheral.waitForNotifications(1.0)
-
-        except BTLEDisconnectError as e:
-            self._nx_queue.put_nowait('BTLEDisconnectError %s' % e)
+            msg = await asyncio.wait_for(asyncio.wrap_future(future), budget)
+        except asyncio.TimeoutError:
+            self._timeout(future, budget < timeout)
+        except asyncio.CancelledError as e:
+            # the caller went away, its counter is free again
+            self._forget(future)
             raise e
         except BTLEException as e:
-            self._nx_queue.put_nowait('BTLEException %s' % e)
-            raise e
-        except Exception as e:
-            self._nx_queue.put_nowait('Exception %s' % e)
+            self.log('Request %s from' % type(e).__name__, self.mac, e)
             raise e
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug('Request from %s %s', self.mac, hexlify(msg))
+        return msg
+
+    def _timeout(self, future, deadline):
+        """:param deadline: the caller's deadline cut the wait short of RESPONSE_TIMEOUT"""
+        # a frame still in the TX queue is not sent any more
+        future.cancel()
+        self._forget(future)
+        if deadline:
+            self.log('Deadline of a request to', self.mac)
+            raise RedmondKettleTimeoutException('No response from %s before the deadline' % self._mac)
+        if self._from_cache and not self._confirmed and self._cache:
+            # nothing ever came back through the cached handles, rediscover on the next connect
+            self._cache.invalidate(self._mac)
+        self.log('Request timeout from', self.mac)
+        raise RedmondKettleConnectException('No response from %s' % self._mac)
+
+    def cancel(self, future):
+        """Drop a submitted message if it has not been written yet
+        :return: True if the message will not be sent
+        """
+        if future.cancel():
+            self._forget(future)
+            return True
+        return False
+
+    def _forget(self, future):
+        with self._pending_lock:
+            for counter, pending in self._pending.items():
+                if pending is future:
+                    del self._pending[counter]
+                    break
 
-    def send(self, message):
+    def send(self, message, timeout=RESPONSE_TIMEOUT, counter=None, deadline=None):
         """Call this function to send a BLE message over the UART service
-        :param message: Message to send
-        :return:
+        :param message: Frame bytes to send
+        :param timeout: Seconds to wait for the response
+        :param counter: Counter of the frame, see submit()
+        :param deadline: time.monotonic() by which the caller needs an answer
+        :return: Response frame bytes
         """
+        check(deadline, 'Request to %s' % self._mac)
+        return self.wait(self.submit(message, counter), timeout, deadline)
 
-        # put the message in the TX queue
-        self.log('Send message to ', self.mac, message)
-        self._tx_queue.put_nowait(message)
-        msg = self._nx_queue.get()
-        if msg.split()[0] == 'BTLEDisconnectError':
-            self.log('Request BTLEDisconnectError from', self.mac, msg)
-            raise BTLEDisconnectError(msg)
-        if msg.split()[0] == 'BTLEException':
-            self.log('Request BTLEException from', self.mac , msg)
-            raise BTLEException(msg)
-        self.log('Request from', self.mac , msg)
-        return msg
\ No newline at end of file
+    async def async_send(self, message, timeout=RESPONSE_TIMEOUT, counter=None, deadline=None):
+        """send() for the event loop"""
+        check(deadline, 'Request to %s' % self._mac)
+        return await self.async_wait(self.submit(message, counter), timeout, deadline)
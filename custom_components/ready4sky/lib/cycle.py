@@ -0,0 +1,81 @@
+import time
+
+# modes whose run ends with the kettle switching itself off
+RUN_MODES = ('boil', 'heat')
+
+
+class CycleTracker:
+    """Boil and heat runs of a kettle, told apart by consecutive mode() snapshots
+
+    A run starts when boil or heat shows up as on and ends when the status goes off or another mode
+    comes on. mode() takes both the polled mode and the mode a command just left the kettle in, so
+    runs switched by commands between two polls are still told apart. The lifetime counters are read
+    once per run end; the difference to the values before the run is the energy and the number of
+    starts of that run. A run that starts before the counters of the previous one were read takes
+    those counters as its baseline.
+
+        if tracker.mode(mode):          # a run just ended
+            ...read statEnergy and statCount...
+        cycle = tracker.counters(energy_kwh, count)
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        # (clock(), time.time(), mode, energy, count, baseline from the next counters) of the run in progress
+        self._started = None
+        # (start of the run, clock() and time.time() of its end) waiting for the counters
+        self._ended = None
+        self._energy = None
+        self._count = None
+        # the last finished run, see counters()
+        self.last = None
+
+    @property
+    def running(self):
+        return self._started is not None
+
+    def mode(self, mode):
+        """Next mode() snapshot
+        :return: True when a run just ended and the counters have to be read
+        """
+        if mode.get('status') is None:
+            # nothing is known about the kettle, keep the run as it is
+            return False
+        running = mode['status'] == 'on' and mode['mode'] in RUN_MODES
+        ended = False
+        if self._started is not None and (not running or mode['mode'] != self._started[2]):
+            self._ended = (self._started, self._clock(), time.time())
+            self._started = None
+            ended = True
+        if running and self._started is None:
+            self._started = (self._clock(), time.time(), mode['mode'], self._energy, self._count,
+                             self._ended is not None)
+        return ended
+
+    def counters(self, energy=None, count=None):
+        """Lifetime counters just read, None for the one that was not
+        :return: the run that ended before them, None when no run waits for its counters
+        """
+        if count is not None:
+            self._count = count
+        if energy is None:
+            # the run is done once its energy is known
+            return None
+        self._energy = energy
+        if self._ended is None:
+            return None
+        (started, startedAt, mode, energy, count, _), ended, endedAt = self._ended
+        self._ended = None
+        if self._started is not None and self._started[5]:
+            # the next run began before these counters, they are its baseline
+            self._started = self._started[:3] + (self._energy, self._count, False)
+        self.last = {
+            'mode': mode,
+            'started': startedAt,
+            'ended': endedAt,
+            'duration_s': round(ended - started, 1),
+            # unknown when the kettle was already running at startup
+            'energy_kwh': None if energy is None else round(self._energy - energy, 3),
+            'starts': None if count is None or self._count is None else self._count - count,
+        }
+        return self.last
@@ -0,0 +1,26 @@
+"""Deadlines are absolute time.monotonic() values, None means no deadline
+
+    deadline = after(10)
+    await kettle.async_on(deadline=deadline)
+"""
+from .exception import RedmondKettleTimeoutException
+import time
+
+
+def after(seconds):
+    """Deadline seconds from now, None stays None"""
+    return None if seconds is None else time.monotonic() + seconds
+
+
+def remaining(deadline, default=None):
+    """Seconds left before the deadline, default when there is none; never more than default"""
+    if deadline is None:
+        return default
+    left = max(0.0, deadline - time.monotonic())
+    return left if default is None else min(left, default)
+
+
+def check(deadline, what='Operation'):
+    """Raise RedmondKettleTimeoutException once the deadline has passed"""
+    if deadline is not None and time.monotonic() >= deadline:
+        raise RedmondKettleTimeoutException('%s missed its deadline' % what)
@@ -2,4 +2,13 @@ class RedmondKettleException(Exception):
     pass
 
 class RedmondKettleConnectException(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class RedmondKettleProtocolException(RedmondKettleException):
+    pass
+
+class RedmondKettleUnavailableException(RedmondKettleConnectException):
+    pass
+
+class RedmondKettleTimeoutException(RedmondKettleConnectException):
+    pass
@@ -0,0 +1,97 @@
+from threading import Lock
+import json
+import logging
+import os
+
+_LOGGER = logging.getLogger(__name__)
+
+# file name of the cache inside the Home Assistant config dir
+CACHE_FILE = '.ready4sky_gatt.json'
+
+
+class GattHandleCache:
+    """Discovered GATT layout of every kettle, persisted as JSON so a reconnect can skip service discovery
+
+    Entry per MAC:
+        addr_type        - 'random' or 'public'
+        write_handle     - Nordic UART RX characteristic value handle
+        subscribe_handle - CCCD of the Nordic UART TX characteristic
+        services         - UUIDs of the services found on the device
+    """
+
+    VERSION = 1
+
+    __instances = {}
+    __instances_lock = Lock()
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = Lock()
+        self._entries = None
+
+    @classmethod
+    def forPath(cls, path):
+        """One cache object per file, shared by every kettle"""
+        with cls.__instances_lock:
+            if path not in cls.__instances:
+                cls.__instances[path] = cls(path)
+            return cls.__instances[path]
+
+    @property
+    def path(self):
+        return self._path
+
+    def get(self, mac):
+        with self._lock:
+            entry = self._load().get(mac.lower())
+        if entry is not None and not self._valid(entry):
+            _LOGGER.info('Drop malformed GATT cache entry for %s', mac)
+            self.invalidate(mac)
+            return None
+        return entry
+
+    def put(self, mac, entry):
+        entry = dict(entry, version=self.VERSION)
+        if not self._valid(entry):
+            raise ValueError('Malformed GATT cache entry for %s: %s' % (mac, entry))
+        with self._lock:
+            self._load()[mac.lower()] = entry
+            self._save()
+
+    def invalidate(self, mac):
+        with self._lock:
+            if self._load().pop(mac.lower(), None) is not None:
+                self._save()
+
+    def _valid(self, entry):
+        try:
+            return entry.get('version') == self.VERSION \
+                and entry.get('addr_type') in ('random', 'public') \
+                and isinstance(entry.get('write_handle'), int) and entry['write_handle'] > 0 \
+                and isinstance(entry.get('subscribe_handle'), int) and entry['subscribe_handle'] > 0 \
+                and isinstance(entry.get('services', []), list)
+        except AttributeError:
+            return False
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = {}
+            try:
+                with open(self._path) as file:
+                    data = json.load(file)
+                if isinstance(data, dict):
+                    self._entries = data
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                _LOGGER.error('Can not read GATT cache %s: %s', self._path, e)
+        return self._entries
+
+    def _save(self):
+        tmp = self._path + '.tmp'
+        try:
+            with open(tmp, 'w') as file:
+                json.dump(self._entries, file, indent=2, sort_keys=True)
+            os.replace(tmp, self._path)
+        except OSError as e:
+            _LOGGER.error('Can not write GATT cache %s: %s', self._path, e)
@@ -1,16 +1,27 @@
-from bluepy.btle import BTLEDisconnectError
 from homeassistant.helpers.dispatcher import async_dispatcher_send
 import traceback
 import time
 from datetime import datetime
 from .kettle_controller import RedmondKettleController
-from .exception import RedmondKettleConnectException
+from .async_kettle_controller import AsyncRedmondKettleController
+from .gatt_cache import GattHandleCache, CACHE_FILE
+from .trace import TraceRecorder
+from .pool import ConnectionPool, PATH_REUSED, PATH_WARM, PATH_COLD, ACQUIRE_TIMEOUT
+from .retry import RetryPolicy, RETRY_ON
+from .breaker import CircuitBreaker, HALF_OPEN
+from .exception import RedmondKettleException, RedmondKettleUnavailableException, RedmondKettleTimeoutException
+from .deadline import remaining, check
 from .tool import iteration_decorator
+from .telemetry import TelemetryCache
+from .cycle import CycleTracker
 import logging
 import asyncio
 
 _LOGGER = logging.getLogger(__name__)
 
+# dispatcher signal of one kettle, see RedmondKettle.signal
+SIGNAL_UPDATE = 'ready4sky_update_%s'
+
 
 class RedmondKettle():
 
@@ -18,15 +29,33 @@ class RedmondKettle():
     _mac = None
     _password = None
 
-    def __init__(self, mac=None, password=None, iface=None, hass=None):
-        self._connect = None
+    def __init__(self, mac=None, password=None, iface=None, hass=None, peripheral=None, trace=None, pool=None, retry=None, breaker=None, telemetry=None):
+        # links are shared by every kettle, see ConnectionPool
+        self._pool = pool or ConnectionPool.shared()
         self._hass = hass
         self._mac = mac
         self._password = password
         self._iface = iface
-        self._touch_time = 0
-        self._self_reconnect = 0
+        # Peripheral factory for BTEConnect, None means bluepy
+        self._peripheral = peripheral
+        self._gatt_cache = GattHandleCache.forPath(hass.config.path(CACHE_FILE)) if hass else None
+        # path of the frame trace file, None - tracing is off
+        self._trace = TraceRecorder.forPath(trace) if trace else None
+        # time.monotonic() of the last command sent to the kettle, None - none yet
+        self._command_time = None
+        # which field groups a poll reads, and what the last reads found
+        self._telemetry = telemetry or TelemetryCache()
+        # boil and heat runs told apart by the mode snapshots
+        self._cycles = CycleTracker()
+        # backoff of reconnects and of the retried operations
+        self._retry = retry or RetryPolicy()
+        # a probe of an unreachable kettle is a single connect
+        self._probe = RetryPolicy(attempts=1)
+        # fails calls at once while the kettle is unreachable, so it does not hold the adapter
+        self._breaker = breaker or CircuitBreaker(name=mac)
         self.init_activate = False
+        # close() was called, the kettle is not used any more
+        self._closed = False
 
         # The current temperature.
         self._current_temperature = 0
@@ -48,48 +77,260 @@ class RedmondKettle():
             cls.__instance[cls._mac] = RedmondKettle(mac=mac, password=password)
         return cls.__instance.get(cls._mac, None)
 
-    def disconnect(self):
+    @property
+    def available(self):
+        return self._breaker.available
+
+    @property
+    def signal(self):
+        """Dispatcher signal sent when the state or the availability of this kettle changes"""
+        return SIGNAL_UPDATE % self._mac.lower()
+
+    @property
+    def heating(self):
+        """Boil or heat mode is on"""
+        return bool(self._state_boil or self._state_heat)
+
+    @property
+    def lastCommand(self):
+        """time.monotonic() of the last command sent, None if there was none"""
+        return self._command_time
+
+    @property
+    def lastCycle(self):
+        """The last finished boil or heat run: mode, started, ended, duration_s, energy_kwh, starts"""
+        return self._cycles.last
+
+    def disconnect(self, controller=None):
+        """Close the link to the kettle
+        :param controller: the link leased by an operation, it is left alone if the pool has opened another since
+        """
         try:
             self.log('Disconnected device')
-            self._connect = None
-            self._connect.disconnect()
+            self._pool.discard(self._mac, controller)
         except:
             pass
 
+    async def async_disconnect(self, controller=None):
+        # closing waits for the reactor to drop the peripheral, keep that off the loop
+        await asyncio.get_running_loop().run_in_executor(None, self.disconnect, controller)
+
+    def close(self):
+        """Drop the link for good, every later call fails"""
+        self._closed = True
+        self.disconnect()
+
+    async def async_close(self):
+        self._closed = True
+        await self.async_disconnect()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.async_close()
+
+    def release(self, controller):
+        """Return the link leased by connect() to the pool"""
+        self._pool.release(self._mac, controller)
+
+    def _newController(self):
+        controller = RedmondKettleController(self._mac, self._password, iface=self._iface, cache=self._gatt_cache,
+                                             peripheral=self._peripheral, trace=self._trace)
+        controller.withDebug()
+        return controller
+
+    def _acquire(self, timeout=ACQUIRE_TIMEOUT):
+        """Lease of the link for one operation, the caller hands the controller back to release()"""
+        # the link may be open already, by us or by another RedmondKettle with the same MAC
+        return self._pool.acquire(self._mac, self._iface, self._newController, timeout)
+
+    def _run(self, coro):
+        """Blocking wrapper of the async_ methods, for scripts and executor threads"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            coro.close()
+            raise RuntimeError('Blocking RedmondKettle call on the event loop, await its async_ method instead')
+        if self._hass is not None and self._hass.loop.is_running():
+            return asyncio.run_coroutine_threadsafe(coro, self._hass.loop).result()
+        return asyncio.run(coro)
+
     # @iteration_decorator
     def connect(self):
-        self._self_reconnect = self._self_reconnect + 1
-        if self._self_reconnect > 10:
-            self.disconnect()
-            self.log('Maximum limit to connect to device', self._mac, self._password, self._iface)
-            self._self_reconnect = 0
-            raise Exception('Maximum limit to connect to device', self._mac, self._password, self._iface)
-
-        self.log('Connect to device with', self._mac, self._password, self._iface, self._connect)
-        if not self._connect:
-            try:
-                self._connect = RedmondKettleController(self._mac, self._password, iface=self._iface)
-                self._connect.withDebug()
+        return self._run(self.async_connect()).controller
+
+    async def async_connect(self):
+        """Connected and authorized link, retried under the retry policy
+        The link stays leased until release(bte.controller)
+        """
+        bte, state = await self._guarded('Connect %s' % self._mac, lambda attempt: self._connectOnce(), True)
+        return bte
+
+    async def _connectOnce(self, snapshot=False, deadline=None):
+        """Lease, authorize and sync the link
+        :param snapshot: read mode and counters in the same burst as sync, see RedmondKettleController.snapshot()
+        :param deadline: time.monotonic() by which the link must be ready, see deadline.after()
+        :return: (AsyncRedmondKettleController, snapshot or None)
+        """
+        if self._closed:
+            raise RedmondKettleException('Kettle %s is closed' % self._mac)
+        self.log('Connect to device with', self._mac, self._password, self._iface)
+        controller = None
+        try:
+            started = time.monotonic()
+            check(deadline, 'Connect to %s' % self._mac)
+            controller = await self._acquireBefore(deadline)
+            bte = AsyncRedmondKettleController(controller)
+            state = None
+            if bte.authorized:
+                path = PATH_REUSED
+            else:
+                path = PATH_WARM if controller.cached else PATH_COLD
                 self.log('Kettle Connected', self._mac, self._password)
-                if not self._connect.auth():
-                    raise Exception('bte.auth() error')
+            if snapshot:
+                # auth, then sync and the stale field groups queued back to back
+                groups = self._telemetry.stale()
+                fields = self._telemetry.commands(groups)
+                read = await bte.snapshot(sync=not self.init_activate, deadline=deadline, fields=fields)
+                self.init_activate = True
+                self._applySnapshot(read)
+                self._telemetry.store(groups, read)
+                # a run just ended: its counters in a second burst on the same link
+                groups = [group for group in self._telemetry.stale() if group not in groups]
+                if groups:
+                    read = await bte.snapshot(sync=False, deadline=deadline, fields=self._telemetry.commands(groups))
+                    self._applySnapshot(read)
+                    self._telemetry.store(groups, read)
+                state = self._telemetry.state()
+            else:
+                if not bte.authorized and not await bte.auth(deadline):
+                    raise RedmondKettleException('bte.auth() error')
                 if not self.init_activate:
-                    if not self._connect.sync():
-                        raise Exception('bte.sync() error')
+                    if not await bte.sync(deadline=deadline):
+                        raise RedmondKettleException('bte.sync() error')
                     self.init_activate = True
-            except RedmondKettleConnectException as e:
-                self.log('Kettle Connected RedmondKettleConnectException', e, error=True)
-                time.sleep(3)
-                self.disconnect()
-                self.connect()
-            except BTLEDisconnectError as e:
-                self.log('Kettle Connected BTLEDisconnectError', e, error=True)
-                time.sleep(3)
-                self.disconnect()
-                self.connect()
-
-        self._self_reconnect = 0
-        return self._connect
+            self._pool.recordFirstCommand(self._iface, path, time.monotonic() - started)
+        except Exception as e:
+            self.log('Kettle Connect', type(e).__name__, e)
+            if controller is not None:
+                await self.async_disconnect(controller)
+            raise e
+        return bte, state
+
+    async def _acquireBefore(self, deadline):
+        """_acquire() in an executor thread, given up at the deadline"""
+        # waiting for a free adapter slot and the bluepy connect block, keep them off the loop
+        acquiring = asyncio.get_running_loop().run_in_executor(None, self._acquire,
+                                                               remaining(deadline, ACQUIRE_TIMEOUT))
+        try:
+            done, pending = await asyncio.wait({acquiring}, timeout=remaining(deadline))
+        except asyncio.CancelledError as e:
+            acquiring.add_done_callback(self._releaseOrphan)
+            raise e
+        if pending:
+            # the thread cannot be stopped, the lease it may still take goes back to the pool
+            acquiring.add_done_callback(self._releaseOrphan)
+            raise RedmondKettleTimeoutException('Connect to %s missed its deadline' % self._mac)
+        return acquiring.result()
+
+    def _releaseOrphan(self, acquiring):
+        if not acquiring.cancelled() and acquiring.exception() is None:
+            self.release(acquiring.result())
+
+    def _applySnapshot(self, state):
+        """Take over the groups a snapshot read, the others keep their values"""
+        if 'mode' in state:
+            self._update_data_mode(state['mode'])
+        stat = state.get('stat', {})
+        if 'energy_kwh' in stat:
+            self._energy_kwh = stat['energy_kwh'] / 1000
+        if 'count' in stat:
+            self._started_count = stat['count']
+        if stat:
+            cycle = self._cycles.counters(self._energy_kwh if 'energy_kwh' in stat else None, stat.get('count'))
+            if cycle is not None:
+                self._cycleFinished(cycle)
+
+    def _cycleFinished(self, cycle):
+        self.log('Kettle cycle', cycle)
+        if self._hass:
+            self._hass.bus.async_fire('ready4sky_cycle', dict(cycle, mac=self._mac))
+
+    async def _call(self, label, action, idempotent=False, snapshot=False, deadline=None):
+        """Run action(bte) on a connected kettle under the retry policy
+        :param label: operation name for logs and errors
+        :param idempotent: action only reads, it may be repeated after its commands went out
+        :param snapshot: refresh the stale field groups while connecting; without an action the state is returned
+        :param deadline: time.monotonic() after which the caller gives up, no retry starts past it
+        """
+        async def attempt(progress):
+            bte, state = await self._connectOnce(snapshot, deadline)
+            try:
+                progress.sent()
+                if action is not None and not idempotent:
+                    self._command_time = time.monotonic()
+                if action is None:
+                    return state
+                return await action(bte)
+            except Exception as e:
+                # the link is broken or in an unknown state, the next attempt opens a new one
+                await self.async_disconnect(bte.controller)
+                raise e
+            finally:
+                self.release(bte.controller)
+
+        try:
+            return await self._guarded(label, attempt, idempotent, deadline)
+        except (RedmondKettleUnavailableException, RedmondKettleTimeoutException) as e:
+            raise e
+        except Exception as e:
+            raise Exception('%s Error' % label, e)
+
+    async def _guarded(self, label, operation, idempotent, deadline=None):
+        """operation under the retry policy, behind the circuit breaker"""
+        if self._closed:
+            # not a question of reachability, and a closed kettle must not take the half-open probe
+            raise RedmondKettleException('Kettle %s is closed' % self._mac)
+        allowed = self._breaker.allow()
+        if not allowed:
+            raise RedmondKettleUnavailableException('%s is unreachable, next try in %.0fs'
+                                                    % (self._mac, self._breaker.retryIn))
+        available = self._breaker.available
+        retry = self._probe if allowed == HALF_OPEN else self._retry
+        try:
+            result = await retry.run(operation, idempotent=idempotent, name=label, deadline=deadline)
+        except RedmondKettleTimeoutException as e:
+            # the caller's deadline or a busy adapter, it says nothing about the kettle
+            self._breaker.cancel()
+            raise e
+        except RETRY_ON as e:
+            self._breaker.failure()
+            self._availabilityChanged(available)
+            raise e
+        except Exception as e:
+            # the kettle answered, it is reachable
+            self._breaker.success()
+            self._availabilityChanged(available)
+            raise e
+        except BaseException as e:
+            self._breaker.cancel()
+            raise e
+        self._breaker.success()
+        self._availabilityChanged(available)
+        return result
+
+    def _availabilityChanged(self, available):
+        if self._breaker.available != available and self._hass:
+            async_dispatcher_send(self._hass, self.signal)
 
     def log(self, *args, msg='', level=1, error=False, log=False, debug=False):
         if error:
@@ -101,178 +342,233 @@ class RedmondKettle():
         else:
             _LOGGER.info(' '.join([str(a) for a in args]))
 
+    async def _pipeline(self, bte, commands, deadline=None):
+        results = await bte.pipeline(commands, deadline=deadline)
+        missed = [r['response'] for r in results if isinstance(r['response'], RedmondKettleTimeoutException)]
+        if missed:
+            raise missed[0]
+        failed = [(result['command'], result['status']) for result in results if result['status'] != 'ok']
+        if failed:
+            raise RedmondKettleException('Pipeline failed', failed)
+        return results
+
+    def snapshot(self, deadline=None, notify=True, full=False):
+        return self._run(self.async_snapshot(deadline=deadline, notify=notify, full=full))
+
+    async def async_snapshot(self, deadline=None, notify=True, full=False):
+        """Connect and read the state in two round trips: auth, then sync and the field groups at once
+        Only the groups TelemetryCache holds as stale are read, the state returned merges them with the rest
+        :param notify: send the update signal, off when the caller tells the entities itself
+        :param full: read every group
+        """
+        if full:
+            self._telemetry.invalidate()
+        state = await self._call('Kettle Snapshot', None, idempotent=True, snapshot=True, deadline=deadline)
+        if self._hass and notify:
+            async_dispatcher_send(self._hass, self.signal)
+        return state
+
     # @iteration_decorator
-    def paring(self):
-        try:
-            bte = self.connect()
-            mode = bte.mode()
+    def paring(self, deadline=None):
+        return self._run(self.async_paring(deadline=deadline))
+
+    async def async_paring(self, deadline=None):
+        async def action(bte):
+            mode = await bte.mode(deadline)
             self.log('Kettle Paring', mode)
             return mode
-        except Exception as e:
-            self.disconnect()
-            raise Exception('Kettle Paring Error', e)
+        return await self._call('Kettle Paring', action, idempotent=True, deadline=deadline)
 
     # @iteration_decorator
-    def mode(self):
-        try:
-            bte = self.connect()
-            mode = bte.mode()
+    def mode(self, deadline=None):
+        return self._run(self.async_mode(deadline=deadline))
+
+    async def async_mode(self, deadline=None):
+        async def action(bte):
+            mode = await bte.mode(deadline)
             self._update_data_mode(mode)
             self.log('Kettle MODE', mode)
             return mode
-        except Exception as e:
-            self.disconnect()
-            raise Exception('Kettle MODE Error', e)
+        return await self._call('Kettle MODE', action, idempotent=True, deadline=deadline)
 
     # @iteration_decorator
-    def stat(self):
-        try:
-            self.log('CHeck stat')
-            bte = self.connect()
-            stat = bte.stat()
+    def stat(self, deadline=None):
+        return self._run(self.async_stat(deadline=deadline))
+
+    async def async_stat(self, deadline=None):
+        async def action(bte):
+            stat = await bte.stat(deadline)
             self.log('Kettle STAT', stat)
             return stat
-        except Exception as e:
-            self.disconnect()
-            raise Exception('Kettle STAT Error', e)
+        self.log('CHeck stat')
+        return await self._call('Kettle STAT', action, idempotent=True, deadline=deadline)
 
     # @iteration_decorator
-    def on(self):
-        try:
-            bte = self.connect()
+    def on(self, deadline=None):
+        return self._run(self.async_on(deadline=deadline))
+
+    async def async_on(self, deadline=None):
+        async def action(bte):
             if self._light_state:
-                self.offLight()
-            bte.on()
+                await bte.off_mode(deadline)
+                self._light_state = False
+            await bte.on(deadline)
             self._state_boil = True
+            self._modeChanged({'mode': 'boil', 'status': 'on'})
             if self._hass:
-                async_dispatcher_send(self._hass, 'ready4sky_update')
+                async_dispatcher_send(self._hass, self.signal)
             self.log('Kettle ON')
-        except Exception as e:
-            self.disconnect()
-            raise Exception('Kettle ON Error', e)
+        await self._call('Kettle ON', action, deadline=deadline)
 
     # @iteration_decorator
-    def off(self):
-        try:
-            bte = self.connect()
-            bte.off()
+    def off(self, deadline=None):
+        return self._run(self.async_off(deadline=deadline))
+
+    async def async_off(self, deadline=None):
+        async def action(bte):
+            await bte.off(deadline)
             self._state_boil = False
             self._state_heat = False
+            self._modeChanged({'mode': self._mode, 'status': 'off'})
             if self._hass:
-                async_dispatcher_send(self._hass, 'ready4sky_update')
+                async_dispatcher_send(self._hass, self.signal)
             self.log('Kettle OFF')
-        except Exception as e:
-            self.disconnect()
-            raise Exception('Kettle OFF Error', e)
+        await self._call('Kettle OFF', action, deadline=deadline)
 
     # @iteration_decorator
-    def onTemperatureToLight(self):
-        try:
-            bte = self.connect()
-            bte.onTemperatureToLight()
+    def onTemperatureToLight(self, deadline=None):
+        return self._run(self.async_onTemperatureToLight(deadline=deadline))
+
+    async def async_onTemperatureToLight(self, deadline=None):
+        async def action(bte):
+            await bte.on_temperature_to_light(deadline)
             self.log('Kettle Temperature Light ON')
             self._water_temperature_light_state = True
             if self._hass:
-                async_dispatcher_send(self._hass, 'ready4sky_update')
+                async_dispatcher_send(self._hass, self.signal)
             return True
-        except Exception as e:
-            self.disconnect()
-            raise Exception('Kettle Temperature Light ON Error', e)
+        return await self._call('Kettle Temperature Light ON', action, deadline=deadline)
 
     # @iteration_decorator
-    def offTemperatureToLight(self):
-        try:
-            bte = self.connect()
-            bte.offTemperatureToLight()
+    def offTemperatureToLight(self, deadline=None):
+        return self._run(self.async_offTemperatureToLight(deadline=deadline))
+
+    async def async_offTemperatureToLight(self, deadline=None):
+        async def action(bte):
+            await bte.off_temperature_to_light(deadline)
             self.log('Kettle Temperature Light OFF')
             self._water_temperature_light_state = False
             if self._hass:
-                async_dispatcher_send(self._hass, 'ready4sky_update')
+                async_dispatcher_send(self._hass, self.signal)
             return True
-        except Exception as e:
-            self.disconnect()
-            raise Exception('Kettle Temperature Light OFF Error', e)
+        return await self._call('Kettle Temperature Light OFF', action, deadline=deadline)
 
     # @iteration_decorator
-    def onModeHeat(self, temperature=80):
-        try:
-            bte = self.connect()
+    def onModeHeat(self, temperature=80, deadline=None):
+        return self._run(self.async_onModeHeat(temperature=temperature, deadline=deadline))
+
+    async def async_onModeHeat(self, temperature=80, deadline=None):
+        async def action(bte):
+            commands = []
             if self._light_state:
-                self.offLight()
-            bte.sendMode(mode='heat', temperature=temperature, howMuchBoil=80)
-            bte.onMode()
+                commands.append(('offMode', {}))
+            commands += [
+                ('sendMode', {'mode': 'heat', 'temperature': temperature, 'howMuchBoil': 80}),
+                ('onMode', {}),
+                ('mode', {}),
+            ]
+            results = await self._pipeline(bte, commands, deadline)
             self._state_heat = True
-            mode = bte.mode()
-            self._update_data_mode(mode)
+            self._update_data_mode(results[-1]['response'])
             if self._hass:
-                async_dispatcher_send(self._hass, 'ready4sky_update')
+                async_dispatcher_send(self._hass, self.signal)
             self.log('Kettle Heat ON')
-        except Exception as e:
-            self.disconnect()
-            raise Exception('Kettle Heat ON Error', e)
+        await self._call('Kettle Heat ON', action, deadline=deadline)
 
     # @iteration_decorator
-    def offModeHeat(self):
-        try:
-            bte = self.connect()
-            bte.offMode()
+    def offModeHeat(self, deadline=None):
+        return self._run(self.async_offModeHeat(deadline=deadline))
+
+    async def async_offModeHeat(self, deadline=None):
+        async def action(bte):
+            await bte.off_mode(deadline)
             self._state_heat = False
+            self._modeChanged({'mode': self._mode, 'status': 'off'})
             if self._hass:
-                async_dispatcher_send(self._hass, 'ready4sky_update')
+                async_dispatcher_send(self._hass, self.signal)
             self.log('Kettle Heat OFF')
-        except Exception as e:
-            self.disconnect()
-            raise Exception('Kettle Heat OFF Error', e)
+        await self._call('Kettle Heat OFF', action, deadline=deadline)
 
     # @iteration_decorator
-    def onModeBoil(self):
-        try:
-            bte = self.connect()
+    def onModeBoil(self, deadline=None):
+        return self._run(self.async_onModeBoil(deadline=deadline))
+
+    async def async_onModeBoil(self, deadline=None):
+        async def action(bte):
+            commands = []
             if self._light_state:
-                self.offLight()
-            bte.sendMode(mode='boil', temperature=100, howMuchBoil=50)
-            bte.onMode()
-            bte.onTemperatureToLight()
+                commands.append(('offMode', {}))
+            commands += [
+                ('sendMode', {'mode': 'boil', 'temperature': 100, 'howMuchBoil': 50}),
+                ('onMode', {}),
+                ('onTemperatureToLight', {}),
+            ]
+            await self._pipeline(bte, commands, deadline)
+            self._light_state = False
             self._state_boil = True
+            self._modeChanged({'mode': 'boil', 'status': 'on'})
             if self._hass:
-                async_dispatcher_send(self._hass, 'ready4sky_update')
+                async_dispatcher_send(self._hass, self.signal)
             self.log('Kettle Boil ON')
-        except Exception as e:
-            self.disconnect()
-            raise Exception('Kettle Boil ON Error', e)
+        await self._call('Kettle Boil ON', action, deadline=deadline)
 
     # @iteration_decorator
-    def onLight(self, rgb1='27FF00', rgb2='00FFEC', rgb3='000FFF'):
-        try:
-            bte = self.connect()
+    def onLight(self, rgb1='27FF00', rgb2='00FFEC', rgb3='000FFF', deadline=None):
+        return self._run(self.async_onLight(rgb1=rgb1, rgb2=rgb2, rgb3=rgb3, deadline=deadline))
+
+    async def async_onLight(self, rgb1='27FF00', rgb2='00FFEC', rgb3='000FFF', deadline=None):
+        async def action(bte):
+            commands = []
             if self._state_boil or self._state_heat:
-                bte.offMode()
-            bte.sendRGBLight('light', rgb1=rgb1, rgb2=rgb2, rgb3=rgb3)
-            bte.sendMode(mode='light')
-            bte.onMode()
+                commands.append(('offMode', {}))
+            commands += [
+                ('sendRGBLight', {'mode': 'light', 'rgb1': rgb1, 'rgb2': rgb2, 'rgb3': rgb3}),
+                ('sendMode', {'mode': 'light'}),
+                ('onMode', {}),
+            ]
+            await self._pipeline(bte, commands, deadline)
+            self._state_boil = False
+            self._state_heat = False
             self._light_state = True
+            self._modeChanged({'mode': 'light', 'status': 'on'})
             if self._hass:
-                async_dispatcher_send(self._hass, 'ready4sky_update')
+                async_dispatcher_send(self._hass, self.signal)
             self.log('Kettle Light ON', rgb1, rgb2, rgb3)
-        except Exception as e:
-            self.disconnect()
-            raise Exception('Kettle Light ON Error', e)
+        await self._call('Kettle Light ON', action, deadline=deadline)
 
     # @iteration_decorator
-    def offLight(self, rgb1='eeff00', rgb2='ffbb00', rgb3='ff3c00'):
-        try:
-            bte = self.connect()
-            bte.offMode()
+    def offLight(self, rgb1='eeff00', rgb2='ffbb00', rgb3='ff3c00', deadline=None):
+        return self._run(self.async_offLight(rgb1=rgb1, rgb2=rgb2, rgb3=rgb3, deadline=deadline))
+
+    async def async_offLight(self, rgb1='eeff00', rgb2='ffbb00', rgb3='ff3c00', deadline=None):
+        async def action(bte):
+            await bte.off_mode(deadline)
             self._light_state = False
+            self._modeChanged({'mode': self._mode, 'status': 'off'})
             if self._hass:
-                async_dispatcher_send(self._hass, 'ready4sky_update')
+                async_dispatcher_send(self._hass, self.signal)
             self.log('Kettle Light OFF', rgb1, rgb2, rgb3)
-        except Exception as e:
-            self.disconnect()
-            raise Exception('Kettle Light OFF Error', e)
+        await self._call('Kettle Light OFF', action, deadline=deadline)
+
+    def _modeChanged(self, mode):
+        """Mode read from the kettle or left by a command"""
+        if self._cycles.mode(mode):
+            # the kettle finished a run, its lifetime counters moved
+            self._telemetry.invalidate('energy', 'count')
 
     def _update_data_mode(self, mode):
         if mode:
+            self._modeChanged(mode)
             self._state_boil = True if mode['mode'] == 'boil' and mode['status'] == 'on' else False
             self._state_heat = True if mode['mode'] == 'heat' and mode['status'] == 'on' else False
             self._light_state = True if mode['mode'] == 'light' and mode['status'] == 'on' else False
@@ -281,30 +577,3 @@ class RedmondKettle():
             self._mode = mode['mode']
             self._current_temperature = mode['current_temperature']
             self._target_temperature = mode['temperature']
-
-    def update(self, *args, **kwargs):
-        self.log('Time Self Update', self._touch_time, time.time())
-        if self._touch_time >= time.time():
-            return
-        try:
-            self.log('Update', args, kwargs)
-            bte = self.connect()
-            mode = bte.mode()
-            self._update_data_mode(mode)
-            stat = bte.stat()
-            if stat:
-                self._energy_kwh = stat['energy_kwh'] / 1000
-                self._started_count = stat['count']
-
-            if self._hass:
-                async_dispatcher_send(self._hass, 'ready4sky_update')
-            self._touch_time = time.time() + 25
-        except Exception as e:
-            self.disconnect()
-            self._update_data_mode({
-                'mode': None,
-                'status': None,
-                'current_temperature': None,
-                'temperature': None
-            })
-            raise Exception('Update Error', e)
\ No newline at end of file
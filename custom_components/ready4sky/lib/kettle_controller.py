@@ -1,10 +1,10 @@
-from .bte import BTEConnect
-from .exception import RedmondKettleException, RedmondKettleConnectException
-import binascii
-from textwrap import wrap
+from .bte import BTEConnect, RESPONSE_TIMEOUT
+from .exception import RedmondKettleException, RedmondKettleConnectException, RedmondKettleTimeoutException
+from . import protocol
 from datetime import datetime
 import time
 from bluepy.btle import BTLEException, BTLEDisconnectError, BTLEInternalError
+from threading import Lock
 import logging
 import traceback
 _LOGGER = logging.getLogger(__name__)
@@ -12,18 +12,47 @@ _LOGGER = logging.getLogger(__name__)
 
 class RedmondKettleController:
 
-    def __init__(self, addr, key, iface='hci0'):
+    def __init__(self, addr, key, iface='hci0', cache=None, peripheral=None, trace=None):
         self._withDebug = False
         self._mac = addr
         self._key = key
         self._iface = iface
-        self._conn = BTEConnect(self._mac, self._key, self._iface)
+        self._conn = BTEConnect(self._mac, self._key, self._iface, cache=cache, peripheral=peripheral,
+                                trace=trace)
         # self._conn = Peripheral(deviceAddr=self._mac, addrType=btle.ADDR_TYPE_RANDOM)
         # self._conn.setDelegate(NotifyDelegate())
         self._iter = 0
+        self._iter_lock = Lock()
+        # чайник принял наш ключ на этом соединении
+        self._authorized = False
+        # кадры команд без параметров собраны заранее, перед записью BTEConnect вписывает в них только номер
+        self._templates = {name: protocol.COMMANDS[name].template() for name in protocol.CONSTANT_COMMANDS}
 
     def disconnect(self):
-        self._conn.Peripheral.disconnect()
+        self._authorized = False
+        self._conn.disconnect()
+
+    def close(self):
+        self._authorized = False
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def connected(self):
+        return self._conn.connected
+
+    @property
+    def cached(self):
+        return self._conn.cached
+
+    @property
+    def authorized(self):
+        return self._authorized and self._conn.connected
 
     def withDebug(self):
         self._withDebug = True
@@ -42,21 +71,28 @@ class RedmondKettleController:
         # if self._withDebug:
         self.log(msg, *args, log=True)
 
-    def hexToDec(self, chr):
-        return int(str(chr), 16)
-
-    def decToHex(self, num):
-        char = str(hex(int(num))[2:])
-        if len(char) < 2:
-            char = '0' + char
-        return char
-
     def iterase(self): # counter
-        self._iter+=1
-        # print('iter', self._iter)
-        if self._iter >= 64: self._iter = 0
+        ''' Выдаём номер для следующего кадра (0..255), по нему BTEConnect находит ответ '''
+        with self._iter_lock:
+            counter = self._iter
+            self._iter = (self._iter + 1) % 256
+        return counter
+
+    def _frame(self, name, **fields):
+        ''' Кадр команды из таблицы протокола и его номер '''
+        counter = self.iterase()
+        if not fields and name in self._templates:
+            return self._templates[name], counter
+        return protocol.COMMANDS[name].encode(counter, **fields), counter
+
+    def _call(self, name, deadline=None, **fields):
+        ''' Отправляем команду и разбираем ответ по таблице протокола
+        deadline — time.monotonic(), после которого ответ уже не нужен, см. deadline.after()
+        '''
+        frame, counter = self._frame(name, **fields)
+        return protocol.COMMANDS[name].decode(self._conn.send(frame, counter=counter, deadline=deadline))
 
-    def auth(self):
+    def auth(self, deadline=None):
         ''' Авторизуемся в чайнике '''
         self.debug('auth:')
         try:
@@ -64,68 +100,57 @@ class RedmondKettleController:
             # str2b = binascii.a2b_hex(bytes('0100', 'utf-8'))
             # self._conn.Peripheral.writeCharacteristic(0x000c, str2b, withResponse=True)
             # авторизуенмся
-            response = self._conn.send('55' + self.decToHex(self._iter) + 'ff' + self._key + 'aa')
-            self.iterase()
-
-            # s = binascii.b2a_hex(response[0:]).decode("utf-8")
-            arr = [response[x:x + 2] for x in range(0, len(response), 2)]
-            self.log('notify arr', arr)
-
-            return True if str(arr[3]) == '01' else False
+            self._authorized = self._call('auth', deadline, key=self._key).ok
+            return self._authorized
         except BTLEDisconnectError as e:
             self.log('Error BTLEDisconnectError:', e, error=True)
             # print(traceback.format_exc())
             raise RedmondKettleConnectException(e)
+        except RedmondKettleTimeoutException as e:
+            raise e
         except BaseException as e:
             self.log('Error:', e, error=True)
         return False
 
-    def on(self):
+    def on(self, deadline=None):
         ''' Включаем чайник '''
         self.debug('on:')
         try:
-            response = self._conn.send('55' + self.decToHex(self._iter) + '03aa')
-            self.iterase()
+            self._call('on', deadline)
             return True
         except BTLEDisconnectError as e:
             self.log('Error BTLEDisconnectError:', e, error=True)
             raise RedmondKettleConnectException(e)
         except BTLEException as e:
             self.log('Error:', e, error=True)
+        except RedmondKettleTimeoutException as e:
+            raise e
         except BaseException as e:
             self.log('Error:', e, error=True)
         return False
 
-    def off(self):
+    def off(self, deadline=None):
         ''' Выключаем чайник '''
         self.debug('off:')
         try:
-            response = self._conn.send('55' + self.decToHex(self._iter) + '04aa')
-            self.iterase()
+            self._call('off', deadline)
             return True
         except BTLEDisconnectError as e:
             self.log('Error BTLEDisconnectError:', e, error=True)
             raise RedmondKettleConnectException(e)
         except BTLEException as e:
             self.log('Error:', e, error=True)
+        except RedmondKettleTimeoutException as e:
+            raise e
         except BaseException as e:
             self.log('Error:', e, error=True)
         return False
 
-    def sync(self, timezone = 3):
+    def sync(self, timezone = 3, deadline=None):
         ''' Синхронизируемся с чайником '''
         self.debug('sync:')
-        tmz_hex_list = wrap(str(self.decToHex(timezone*60*60)), 2)
-        tmz_str = ''
-        for i in reversed(tmz_hex_list):
-            tmz_str+=i
-        timeNow_list = wrap(str(self.decToHex(time.mktime(datetime.now().timetuple()))), 2)
-        timeNow_str = ''
-        for i in reversed(timeNow_list):
-            timeNow_str+=i
         try:
-            response = self._conn.send('55' + self.decToHex(self._iter) + '6e' + timeNow_str + tmz_str + '0000aa')
-            self.iterase()
+            self._call('sync', deadline, now=time.mktime(datetime.now().timetuple()), timezone=timezone*60*60)
             return True
         except BTLEDisconnectError as e:
             self.log('Error BTLEDisconnectError:', e, error=True)
@@ -139,22 +164,13 @@ class RedmondKettleController:
 
         return False
 
-    def stat(self):
+    def stat(self, deadline=None):
         ''' Отображение текущей информации о чайнике '''
         self.debug('stat:')
         try:
-            # self._conn.setDelegate(NotifyStatusDelegate())
-            response = self._conn.send('55' + self.decToHex(self._iter) + '4700aa')
-            self.iterase()
-            arr = [response[x:x + 2] for x in range(0, len(response), 2)]
-            energy_kwh = self.hexToDec(str(arr[11] + arr[10] + arr[9]))
+            energy_kwh = self._call('statEnergy', deadline).energy_wh
             time = round(energy_kwh / 2200, 1)
-
-            response = self._conn.send('55' + self.decToHex(self._iter) + '5000aa')
-            self.iterase()
-            arr = [response[x:x + 2] for x in range(0, len(response), 2)]
-            self.debug(arr)
-            count = self.hexToDec(str(arr[7] + arr[6]))
+            count = self._call('statCount', deadline).count
 
             self.debug('energy_kwh', energy_kwh, 'time', time, 'count', count)
 
@@ -168,52 +184,19 @@ class RedmondKettleController:
             raise RedmondKettleConnectException(e)
         except BTLEException as e:
             self.log('Error:', e, error=True)
+        except RedmondKettleTimeoutException as e:
+            raise e
         except BaseException as e:
             self.log('Error:', e, error=True)
         return False
 
-    def mode(self):
+    def mode(self, deadline=None):
         ''' Получаем текущий режим работы чайника '''
         self.debug('mode:')
         try:
-            response = self._conn.send('55' + self.decToHex(self._iter) + '06aa')
-            self.iterase()
-            self.debug('notify', self._conn.notify)
-
-            arr = [response[x:x + 2] for x in range(0, len(response), 2)]
-            self.debug(arr)
-            status = str(arr[11]) if len(arr) > 11 else str(arr[3])
-            current_temperature = self.hexToDec(str(arr[8])) if len(arr) > 11 else str(0)
-            temperature = self.hexToDec(str(arr[5])) if len(arr) > 11 else str(0)
-            mode = str(arr[3])
-            time = str(arr[16]) if len(arr) > 11 else str(0)
-
-            self.debug('status', status, 'temperature', temperature, 'current_temperature', current_temperature, 'mode', mode, 'time', time)
-
-            mode_statuses = {
-                '00': 'boil',
-                '01': 'heat',
-                '03': 'light',
-            }
-            statuses = {
-                '00': 'off',
-                '02': 'on',
-            }
-
-            return {
-                # возвращает статус чайника
-                'status': statuses[status] if status in statuses else status,
-                # текущая температура воды (2a=42 по Цельсию)
-                'current_temperature': current_temperature,
-                # температура, до которой нужно нагревать в режиме работы «нагрев», в режиме кипячения равен 00.
-                'temperature': temperature if temperature > 0 else 100,
-                # Режим работы
-                # 00 - boil 01 - heat to temp 03 - backlight (boil by default)    temp - in HEX
-                'mode': mode_statuses[mode] if mode in mode_statuses else mode,
-                # это продолжительность работы чайника после достижения нужной температуры, по умолчанию равна 80 в hex
-                # (видимо, это какие то относительные единицы, точно не секунды)
-                'time': time
-            }
+            mode = self._call('mode', deadline).asDict()
+            self.debug('mode', mode)
+            return mode
         except BTLEDisconnectError as e:
             self.log('Error BTLEDisconnectError:', e, error=True)
             raise RedmondKettleConnectException(e)
@@ -231,7 +214,7 @@ class RedmondKettleController:
             raise e
         return False
 
-    def sendMode(self, mode='boil', temperature='40', howMuchBoil='80'):
+    def sendMode(self, mode='boil', temperature='40', howMuchBoil='80', deadline=None):
         ''' Устанавливаем режим работы
         mode: boil — кипячение, heat — нагрев до температуры, light — ночник
         temp — hex температура, до которой нужно нагревать в режиме работы «нагрев», в режиме кипячения он равен 00
@@ -239,63 +222,7 @@ class RedmondKettleController:
         '''
         self.debug('sendMode:')
         try:
-            if mode == 'heat' and (temperature < 40 or temperature > 95):
-                raise RedmondKettleException('Temp must be > 40 and < 95')
-
-            response = self._conn.send('55' + self.decToHex(self._iter) + '06aa')
-            self.iterase()
-            self.log('sendMode -notify', response, log=True)
-
-            arr = [response[x:x + 2] for x in range(0, len(response), 2)]
-
-            modeBitesDict = {
-                'boil': '00',
-                'heat': '01',
-                'light': '03'
-            }
-
-            tempBite = self.decToHex(temperature)
-            if (mode == 'boil'):
-                tempBite = '00'
-            if (mode == 'light'):
-                tempBite = '00'
-
-            howMuchBoilBite = self.decToHex(howMuchBoil)
-
-            arr[1] = self.decToHex(self._iter)
-            arr[2] = '05'
-            arr[3] = modeBitesDict.get(mode, '00') # программа
-            arr[4] = '00' # sprog под программа программа
-            arr[5] = tempBite
-            # arr[6] = '00' # hours
-            # arr[7] = '00' # minutes
-            # arr[8] = '00' # dhours
-            # arr[9] = '00' # dminutes
-            # arr[10] = howMuchBoilBite # heat
-
-            self.debug('sendMode', ''.join(arr))
-            str2b = binascii.a2b_hex(bytes(''.join(arr), 'utf-8'))
-            response = self._conn.send('55' + self.decToHex(self._iter) + '05' + modeBitesDict.get(mode, '00') + '00' + tempBite +
-                                           '00000000000000000000' + howMuchBoilBite + '0000aa')
-            self.iterase()
-            self.debug('notify', self._conn.notify)
-
-            # s = binascii.b2a_hex(self._conn.notify[0:]).decode("utf-8")
-            arr = [response[x:x + 2] for x in range(0, len(response), 2)]
-            self.debug(arr)
-            status = str(arr[3])
-
-            self.debug('status', status)
-
-            statuses = {
-                '00': 'fail',
-                '01': 'ok',
-            }
-
-            return {
-                # возвращает статус чайника
-                'status': statuses.get(status, status)
-            }
+            return self._call('sendMode', deadline, **self._sendModeFields(mode=mode, temperature=temperature, howMuchBoil=howMuchBoil)).asDict()
         except BTLEDisconnectError as e:
             self.log('Error BTLEDisconnectError:', e, error=True)
             raise RedmondKettleConnectException(e)
@@ -310,30 +237,24 @@ class RedmondKettleController:
             raise e
         return False
 
-    def onMode(self):
+    def _sendModeFields(self, mode='boil', temperature='40', howMuchBoil='80'):
+        if mode == 'heat' and (temperature < 40 or temperature > 95):
+            raise RedmondKettleException('Temp must be > 40 and < 95')
+
+        return {
+            'mode': mode,
+            # температура передаётся только для нагрева, при кипячении и ночнике она равна 00
+            'temperature': int(temperature) if mode == 'heat' else 0,
+            'howMuchBoil': int(howMuchBoil),
+        }
+
+    def onMode(self, deadline=None):
         ''' Запустить текущий режим работы
         Перед тем как запустить следует указать режим работы sendMode. Что бы прочесть режим работы используйте mode
         '''
         self.debug('onMode:')
         try:
-            response = self._conn.send('55' + self.decToHex(self._iter) + '03aa')
-            self.iterase()
-
-            arr = [response[x:x + 2] for x in range(0, len(response), 2)]
-            self.debug(arr)
-            status = str(arr[3])
-
-            self.debug('status', status)
-
-            statuses = {
-                '00': 'fail',
-                '01': 'ok',
-            }
-
-            return {
-                # возвращает статус чайника
-                'status': statuses[status] if status in statuses else status,
-            }
+            return self._call('onMode', deadline).asDict()
         except BTLEDisconnectError as e:
             self.log('Error BTLEDisconnectError:', e, error=True)
             raise RedmondKettleConnectException(e)
@@ -345,30 +266,13 @@ class RedmondKettleController:
             raise e
         return False
 
-    def offMode(self):
+    def offMode(self, deadline=None):
         ''' Запустить текущий режим работы
         Перед тем как запустить следует указать режим работы sendMode. Что бы прочесть режим работы используйте mode
         '''
         self.debug('offMode:')
         try:
-            response = self._conn.send('55' + self.decToHex(self._iter) + '04aa')
-            self.iterase()
-
-            arr = [response[x:x + 2] for x in range(0, len(response), 2)]
-            self.debug(arr)
-            status = str(arr[3])
-
-            self.debug('status', status)
-
-            statuses = {
-                '00': 'fail',
-                '01': 'ok',
-            }
-
-            return {
-                # возвращает статус чайника
-                'status': statuses[status] if status in statuses else status,
-            }
+            return self._call('offMode', deadline).asDict()
         except BTLEDisconnectError as e:
             self.log('Error BTLEDisconnectError:', e, error=True)
             raise RedmondKettleConnectException(e)
@@ -380,12 +284,11 @@ class RedmondKettleController:
             raise e
         return False
 
-    def onTemperatureToLight(self):
+    def onTemperatureToLight(self, deadline=None):
         ''' Отображение текущей температуры цветом в простое ON '''
         self.debug('onTemperatureToLight:')
         try:
-            response = self._conn.send('55' + self.decToHex(self._iter) + '37c8c801aa')
-            self.iterase()
+            self._call('onTemperatureToLight', deadline)
             return True
         except BTLEDisconnectError as e:
             self.log('Error BTLEDisconnectError:', e, error=True)
@@ -398,12 +301,11 @@ class RedmondKettleController:
             raise e
         return False
 
-    def offTemperatureToLight(self):
+    def offTemperatureToLight(self, deadline=None):
         ''' Отображение текущей температуры цветом в простое OFF '''
         self.debug('offTemperatureToLight:')
         try:
-            response = self._conn.send('55' + self.decToHex(self._iter) + '37c8c800aa')
-            self.iterase()
+            self._call('offTemperatureToLight', deadline)
             return True
         except BTLEDisconnectError as e:
             self.log('Error BTLEDisconnectError:', e, e, error=True)
@@ -416,28 +318,14 @@ class RedmondKettleController:
             raise e
         return False
 
-    def sendRGBLight(self, mode='light', rgb1='0000ff', rgb2='00ff00', rgb3='0000ff'):
+    def sendRGBLight(self, mode='light', rgb1='0000ff', rgb2='00ff00', rgb3='0000ff', deadline=None):
         ''' Устанавливаем цвет подсветки
         boil, если мы настраиваем режим отображения текущей температуры или
         light, если мы настраиваем режим ночника
         '''
         self.debug('sendRGBLight:')
         try:
-            rand = '5e' # яркость e5, cc, 7f
-            if mode == "00":
-                scaleLight = ['28', '46', '64']
-            else:
-                scaleLight = ['00', '32', '64']
-            boilOrLightDict = {
-                'boil': '00',
-                'light': '01'
-            }
-            boilOrLightBit = boilOrLightDict.get(mode, 00)
-            response = self._conn.send('55' + self.decToHex(self._iter) + '32' + boilOrLightBit +
-                                           scaleLight[0] + rand + rgb1 +
-                                           scaleLight[1] + rand + rgb2 +
-                                           scaleLight[2] + rand + rgb3 + 'aa')
-            self.iterase()
+            self._call('sendRGBLight', deadline, **self._sendRGBLightFields(mode=mode, rgb1=rgb1, rgb2=rgb2, rgb3=rgb3))
             return True
         except BTLEDisconnectError as e:
             self.log('Error BTLEDisconnectError:', e, error=True)
@@ -450,49 +338,155 @@ class RedmondKettleController:
             raise e
         return False
 
-    def RGBLight(self, mode='boil'):
+    def _sendRGBLightFields(self, mode='light', rgb1='0000ff', rgb2='00ff00', rgb3='0000ff'):
+        scaleLight = (0, 50, 100)
+        return {
+            'palette': mode,
+            'temperature1': scaleLight[0], 'rgb1': rgb1,
+            'temperature2': scaleLight[1], 'rgb2': rgb2,
+            'temperature3': scaleLight[2], 'rgb3': rgb3,
+        }
+
+    # публичные команды, у которых параметры отличаются от полей кадра в таблице протокола
+    _FIELDS = {
+        'sendMode': '_sendModeFields',
+        'sendRGBLight': '_sendRGBLightFields',
+        'sync': '_syncFields',
+    }
+
+    def _syncFields(self, timezone=3):
+        return {'now': time.mktime(datetime.now().timetuple()), 'timezone': timezone * 60 * 60}
+
+    # команды чтения, которые можно собрать в snapshot
+    SNAPSHOT_FIELDS = ('mode', 'statEnergy', 'statCount')
+
+    def snapshot(self, sync=True, timezone=3, deadline=None, fields=SNAPSHOT_FIELDS):
+        ''' Быстрое подключение: авторизация, затем sync, mode и статистика одной пачкой
+        Два обмена с чайником вместо пяти, возвращает {'mode': ..., 'stat': ...}
+        fields — какие команды чтения отправить (mode, statEnergy, statCount), в ответе только их поля
+        '''
+        self.debug('snapshot:')
+        if not self.authorized and not self.auth(deadline):
+            raise RedmondKettleException('Kettle %s refused the key' % self._mac)
+        return self._snapshot(self.pipeline(self._snapshotCommands(sync, timezone, fields), abortOnFailure=False,
+                                            deadline=deadline))
+
+    def _snapshotCommands(self, sync, timezone, fields=SNAPSHOT_FIELDS):
+        commands = [('sync', {'timezone': timezone})] if sync else []
+        return commands + [(name, {}) for name in fields]
+
+    def _snapshot(self, results):
+        ''' Состояние из результатов pipeline() быстрого подключения '''
+        failed = [(result['command'], result['status']) for result in results if result['status'] != 'ok']
+        if failed:
+            missed = [r['response'] for r in results if isinstance(r['response'], RedmondKettleTimeoutException)]
+            if missed:
+                raise missed[0]
+            if any(status == 'timeout' for command, status in failed):
+                raise RedmondKettleConnectException('Snapshot of %s failed' % self._mac, failed)
+            raise RedmondKettleException('Snapshot of %s failed' % self._mac, failed)
+        responses = {result['command']: result['response'] for result in results}
+        state = {}
+        if 'mode' in responses:
+            state['mode'] = responses['mode']
+        stat = {}
+        if 'statEnergy' in responses:
+            stat['energy_kwh'] = responses['statEnergy'].energy_wh
+            stat['time'] = round(stat['energy_kwh'] / 2200, 1)
+        if 'statCount' in responses:
+            stat['count'] = responses['statCount'].count
+        if stat:
+            state['stat'] = stat
+        return state
+
+    def pipeline(self, commands, abortOnFailure=True, timeout=RESPONSE_TIMEOUT, deadline=None):
+        ''' Отправляем несколько команд подряд, не дожидаясь ответа на каждую
+        commands — список (имя команды из protocol.COMMANDS, параметры), например [('sendMode', {'mode': 'light'}), ('onMode', {})]
+        abortOnFailure — команды зависят друг от друга: следующая уходит только после ответа ok на предыдущую,
+                         при первой ошибке оставшиеся не отправляются. Без него все кадры уходят сразу
+        deadline — после него ждать ответы перестаём, неотправленные команды отменяются
+        Возвращает статус по каждой команде: ok, fail (чайник отказал), timeout, error, cancelled
+        '''
+        self.debug('pipeline:', [name for name, kwargs in commands])
+        results, frames = self._pipelineFrames(commands, abortOnFailure)
+        if frames is None:
+            return results
+        futures = [None] * len(frames) if abortOnFailure else self._pipelineSubmit(frames)
+
+        disconnected = None
+        for i, frame in enumerate(frames):
+            if frame is None:
+                continue
+            if abortOnFailure:
+                futures[i], = self._pipelineSubmit([frame])
+            try:
+                self._pipelineResult(results[i], self._conn.wait(futures[i], timeout, deadline))
+            except BaseException as e:
+                disconnected = self._pipelineError(results[i], e) or disconnected
+            if abortOnFailure and results[i]['status'] != 'ok':
+                break
+        return self._pipelineDone(results, disconnected)
+
+    def _pipelineFrames(self, commands, abortOnFailure):
+        ''' Собираем кадры, возвращает (результаты, кадры) или (результаты, None), если отправлять нечего '''
+        results = [{'command': name, 'status': 'cancelled', 'response': None} for name, kwargs in commands]
+
+        frames = []
+        for i, (name, kwargs) in enumerate(commands):
+            try:
+                frames.append(self._frame(name, **self._fields(name, kwargs)))
+            except BaseException as e:
+                self.log('Error:', name, e, error=True)
+                results[i]['status'] = 'error'
+                results[i]['response'] = e
+                if abortOnFailure:
+                    return results, None
+                frames.append(None)
+        return results, frames
+
+    def _pipelineSubmit(self, frames):
+        ''' Ставим кадры в очередь, возвращает их futures '''
+        try:
+            return [self._conn.submit(*frame) if frame is not None else None for frame in frames]
+        except BTLEDisconnectError as e:
+            self.log('Error BTLEDisconnectError:', e, error=True)
+            raise RedmondKettleConnectException(e)
+
+    def _pipelineResult(self, result, reply):
+        record = protocol.COMMANDS[result['command']].decode(reply)
+        result['response'] = record.asDict() if hasattr(record, 'asDict') else record
+        result['status'] = 'fail' if isinstance(record, protocol.StatusRecord) and not record.ok else 'ok'
+
+    def _pipelineError(self, result, e):
+        ''' Отмечаем ошибку команды, возвращает исключение, если соединение потеряно '''
+        result['response'] = e
+        if isinstance(e, RedmondKettleConnectException):
+            result['status'] = 'timeout'
+            return None
+        result['status'] = 'error'
+        if isinstance(e, BTLEDisconnectError):
+            return e
+        self.log('Error:', result['command'], e, error=True)
+        return None
+
+    def _pipelineDone(self, results, disconnected):
+        self.debug('pipeline', [(r['command'], r['status']) for r in results])
+        if disconnected is not None:
+            raise RedmondKettleConnectException(disconnected)
+        return results
+
+    def _fields(self, name, kwargs):
+        ''' Поля кадра из параметров публичной команды '''
+        return getattr(self, self._FIELDS[name])(**kwargs) if name in self._FIELDS else kwargs
+
+    def RGBLight(self, mode='boil', deadline=None):
         ''' Прочесть цвет подсветки
         boil, если мы настраиваем режим отображения текущей температуры или
         light, если мы настраиваем режим ночника
         '''
         self.debug('RGBLight:')
         try:
-            boilOrLightDict = {
-                'boil': '00',
-                'light': '01'
-            }
-            boilOrLightBit = boilOrLightDict[mode] if mode in boilOrLightDict else mode
-            response = self._conn.send('55' + self.decToHex(self._iter) + '33' + boilOrLightBit + 'aa')
-            self.iterase()
-            arr = [response[x:x + 2] for x in range(0, len(response), 2)]
-
-            temperatureStart = self.hexToDec(str(arr[4]))
-            randStart = str(arr[5])
-            colorStart = str(arr[6]) + str(arr[7]) + str(arr[8])
-            temperatureMid = self.hexToDec(str(arr[9]))
-            randMid = str(arr[10])
-            colorMidt = str(arr[11]) + str(arr[12]) + str(arr[13])
-            temperatureHard = self.hexToDec(str(arr[14]))
-            randHard= str(arr[15])
-            colorHard = str(arr[16]) + str(arr[17]) + str(arr[18])
-
-            return {
-                'start': {
-                    'temperature': temperatureStart, # температура
-                    'rand': randStart, # яркость
-                    'color': colorStart, # цвет
-                },
-                'mid': {
-                    'temperature': temperatureMid,
-                    'rand': randMid,
-                    'color': colorMidt,
-                },
-                'hard': {
-                    'temperature': temperatureHard,
-                    'rand': randHard,
-                    'color': colorHard,
-                },
-            }
+            return self._call('RGBLight', deadline, palette=mode).asDict()
         except BTLEDisconnectError as e:
             self.log('Error BTLEDisconnectError:', e, error=True)
             raise RedmondKettleConnectException(e)
@@ -515,7 +509,6 @@ class RedmondKettleController:
             descriptors = self._conn.Peripheral.getDescriptors()
             for i in descriptors:
                 info[i.uuid.getCommonName()] = str(i.uuid)
-            self.iterase()
 
             self.debug('info', info)
 
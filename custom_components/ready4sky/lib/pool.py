@@ -0,0 +1,338 @@
+from collections import deque
+from threading import Condition, Lock
+from .exception import RedmondKettleTimeoutException
+from .reactor import Reactor
+from .watchdog import Watchdog
+from threading import Thread
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+# links one adapter keeps open at the same time, cheap dongles fall over at 3-5
+DEFAULT_ADAPTER_LIMIT = 3
+# how long acquire() waits for a free link before giving up
+ACQUIRE_TIMEOUT = 30.0
+
+# what happens to a link once its last lease is released
+POLICY_ALWAYS = 'always'        # stays open until the kettle drops it or its slot is needed
+POLICY_LINGER = 'linger'        # closed after linger idle seconds
+POLICY_ON_DEMAND = 'on_demand'  # closed as soon as it is idle
+POLICIES = (POLICY_ALWAYS, POLICY_LINGER, POLICY_ON_DEMAND)
+DEFAULT_POLICY = POLICY_LINGER
+DEFAULT_LINGER = 60
+
+# how the link of a first command was obtained, see recordFirstCommand()
+PATH_REUSED = 'reused'  # open and authorized already
+PATH_WARM = 'warm'      # reopened through the cached GATT handles
+PATH_COLD = 'cold'      # reopened with service discovery
+
+
+def adapter_name(iface):
+    """hciN for an adapter index or name"""
+    if iface is None or iface == '':
+        return 'hci0'
+    if isinstance(iface, int) or str(iface).isdigit():
+        return 'hci%s' % iface
+    return str(iface)
+
+
+class _Link:
+    __slots__ = ('mac', 'adapter', 'controller', 'factory', 'leases', 'used', 'timer')
+
+    def __init__(self, mac, adapter, controller, factory):
+        self.mac = mac
+        self.adapter = adapter
+        self.controller = controller
+        # opens the link again after the Watchdog aborted it
+        self.factory = factory
+        self.leases = 1
+        self.used = time.monotonic()
+        # Reactor timer closing the idle link
+        self.timer = None
+
+
+class _Adapter:
+    __slots__ = ('name', 'limit', 'links', 'queue', 'closed_idle', 'first_command')
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        # open links plus links being opened
+        self.links = 0
+        # tickets of the callers waiting for a free link, served first come first served
+        self.queue = deque()
+        # links closed by their lifecycle policy
+        self.closed_idle = 0
+        # path -> [count, total seconds, max seconds] from connect() to the first command
+        self.first_command = {}
+
+
+class ConnectionPool:
+    """Links to the kettles shared by every RedmondKettle
+
+    One link per MAC, reused by every caller that targets it. Each adapter holds at most limit links;
+    when it is full a new link waits in the adapter queue until a link is released, and the least
+    recently used idle link is closed to make room for it, links with the always policy last.
+
+    A link with no lease left follows the lifecycle policy of its MAC (setPolicy): stays open, lingers
+    for a while or is closed at once. Reopening a closed link goes through the cached GATT handles,
+    so on-demand links cost a connect and an auth but no service discovery.
+
+    A caller leases the link for one operation:
+        controller = pool.acquire(mac, iface, factory)
+        try: ...
+        finally: pool.release(mac, controller)
+    and discards it when the link is broken.
+    """
+
+    __shared = None
+    __shared_lock = Lock()
+
+    def __init__(self, limit=DEFAULT_ADAPTER_LIMIT, reactor=None, watchdog=None):
+        self._limit = limit
+        # idle links are closed from reactor timers
+        self._reactor = reactor
+        # hands over the links it aborted, see _restart()
+        self._watchdog = watchdog or Watchdog.shared()
+        # mac -> (policy, linger seconds)
+        self._policies = {}
+        self._cond = Condition()
+        self._adapters = {}
+        self._links = {}
+        self._connecting = set()
+        self._watchdog.listen(self._restart)
+
+    @classmethod
+    def shared(cls):
+        """The pool of the process"""
+        with cls.__shared_lock:
+            if cls.__shared is None:
+                cls.__shared = cls()
+            return cls.__shared
+
+    def setLimit(self, iface, limit):
+        with self._cond:
+            self._adapter(adapter_name(iface)).limit = max(1, int(limit))
+            self._cond.notify_all()
+
+    def setPolicy(self, mac, policy=DEFAULT_POLICY, linger=DEFAULT_LINGER):
+        """Lifecycle of the link to mac once idle, one of POLICIES"""
+        if policy not in POLICIES:
+            raise ValueError('Unknown link policy %s' % policy)
+        mac = mac.lower()
+        with self._cond:
+            self._policies[mac] = (policy, max(0, float(linger)))
+            link = self._links.get(mac)
+            if link is not None and link.leases == 0:
+                self._schedule(link)
+
+    def recordFirstCommand(self, iface, path, seconds):
+        """Time from connect() until the link was ready for the first command, by PATH_*"""
+        with self._cond:
+            record = self._adapter(adapter_name(iface)).first_command.setdefault(path, [0, 0.0, 0.0])
+            record[0] += 1
+            record[1] += seconds
+            record[2] = max(record[2], seconds)
+
+    def acquire(self, mac, iface, factory, timeout=ACQUIRE_TIMEOUT):
+        """Lease the link to mac, opening it with factory() when there is none
+        :param factory: callable returning a new RedmondKettleController
+        :return: RedmondKettleController
+        """
+        mac = mac.lower()
+        deadline = time.monotonic() + timeout
+        # links closed to make room, disconnected outside the lock
+        closing = []
+        opening = False
+        with self._cond:
+            adapter = self._adapter(adapter_name(iface))
+            ticket = None
+            while True:
+                link = self._links.get(mac)
+                if link is not None and not link.controller.connected and link.leases == 0:
+                    # the kettle dropped an idle link, open a new one
+                    closing.append(self._remove(link))
+                    link = None
+                if link is not None:
+                    self._dequeue(adapter, ticket)
+                    self._cancel(link)
+                    link.leases += 1
+                    link.used = time.monotonic()
+                    break
+                if mac not in self._connecting:
+                    if ticket is None:
+                        ticket = object()
+                        adapter.queue.append(ticket)
+                    if adapter.queue[0] is ticket and self._reserve(adapter, closing):
+                        adapter.queue.popleft()
+                        self._connecting.add(mac)
+                        opening = True
+                        break
+                else:
+                    # somebody is opening this very link, wait for it outside the queue
+                    self._dequeue(adapter, ticket)
+                    ticket = None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._dequeue(adapter, ticket)
+                    self._cond.notify_all()
+                    link = None
+                    break
+                self._cond.wait(remaining)
+
+        # the adapter must really have dropped those links before we open another one
+        self._disconnect(closing)
+        if link is not None:
+            return link.controller
+        if not opening:
+            raise RedmondKettleTimeoutException('No free connection to %s on %s' % (mac, adapter.name))
+
+        try:
+            controller = factory()
+        except BaseException as e:
+            with self._cond:
+                adapter.links -= 1
+                self._connecting.discard(mac)
+                self._cond.notify_all()
+            raise e
+        with self._cond:
+            self._links[mac] = _Link(mac, adapter, controller, factory)
+            self._connecting.discard(mac)
+            self._cond.notify_all()
+        _LOGGER.info('Open link to %s on %s (%s/%s)', mac, adapter.name, adapter.links, adapter.limit)
+        return controller
+
+    def release(self, mac, controller):
+        """End a lease, the link stays open for the next caller"""
+        with self._cond:
+            link = self._links.get(mac.lower())
+            if link is None or link.controller is not controller or link.leases == 0:
+                return
+            link.leases -= 1
+            link.used = time.monotonic()
+            if link.leases == 0:
+                self._schedule(link)
+                self._cond.notify_all()
+
+    def discard(self, mac, controller=None):
+        """Close a broken link whatever its leases"""
+        with self._cond:
+            link = self._links.get(mac.lower())
+            if link is None or (controller is not None and link.controller is not controller):
+                return
+            controller = self._remove(link)
+            self._cond.notify_all()
+        self._disconnect([controller])
+
+    def stats(self):
+        with self._cond:
+            return {
+                adapter.name: {
+                    'limit': adapter.limit,
+                    'links': adapter.links,
+                    'waiting': len(adapter.queue),
+                    'busy': sum(1 for link in self._links.values() if link.adapter is adapter and link.leases),
+                    'closed_idle': adapter.closed_idle,
+                    'first_command_ms': {
+                        path: {
+                            'n': n,
+                            'avg': round(total / n * 1000, 3),
+                            'max': round(worst * 1000, 3),
+                        } for path, (n, total, worst) in adapter.first_command.items()
+                    },
+                } for adapter in self._adapters.values()
+            }
+
+    def _adapter(self, name):
+        if name not in self._adapters:
+            self._adapters[name] = _Adapter(name, self._limit)
+        return self._adapters[name]
+
+    def _reserve(self, adapter, closing):
+        """Take a slot on the adapter, closing the least recently used idle link when it is full"""
+        if adapter.links < adapter.limit:
+            adapter.links += 1
+            return True
+        idle = [link for link in self._links.values() if link.adapter is adapter and link.leases == 0]
+        if not idle:
+            return False
+        victim = min(idle, key=lambda link: (self._policy(link.mac)[0] == POLICY_ALWAYS, link.used))
+        _LOGGER.info('Close idle link to %s to make room on %s', victim.mac, adapter.name)
+        closing.append(self._remove(victim))
+        adapter.links += 1
+        return True
+
+    def _dequeue(self, adapter, ticket):
+        if ticket is not None:
+            try:
+                adapter.queue.remove(ticket)
+            except ValueError:
+                pass
+
+    def _restart(self, mac):
+        """Watchdog listener: a hung link was aborted, close it and reopen the always-on ones"""
+        mac = mac.lower()
+        with self._cond:
+            link = self._links.get(mac)
+            if link is None or link.leases:
+                # the callers holding it get the error and discard it themselves
+                return
+            controller = self._remove(link)
+            self._cond.notify_all()
+        self._disconnect([controller])
+        if self._policy(mac)[0] != POLICY_ALWAYS:
+            return
+        Thread(target=self._reopen, args=(link, time.monotonic()), name='ready4sky_restart', daemon=True).start()
+
+    def _reopen(self, link, detected):
+        try:
+            self.release(link.mac, self.acquire(link.mac, link.adapter.name, link.factory))
+        except Exception as e:
+            _LOGGER.error('Can not reopen link to %s: %s', link.mac, e)
+            return
+        self._watchdog.recovered(time.monotonic() - detected)
+        _LOGGER.info('Link to %s is back after %.1fs', link.mac, time.monotonic() - detected)
+
+    def _policy(self, mac):
+        return self._policies.get(mac, (DEFAULT_POLICY, DEFAULT_LINGER))
+
+    def _schedule(self, link):
+        """Arm the policy of an idle link"""
+        self._cancel(link)
+        policy, linger = self._policy(link.mac)
+        if policy == POLICY_ALWAYS:
+            return
+        if self._reactor is None:
+            self._reactor = Reactor.shared()
+        delay = linger if policy == POLICY_LINGER else 0
+        link.timer = self._reactor.call_later(delay, lambda: self._expire(link))
+
+    def _cancel(self, link):
+        if link.timer is not None:
+            link.timer.cancel()
+            link.timer = None
+
+    def _expire(self, link):
+        """Reactor timer: close the link if it is still idle"""
+        with self._cond:
+            if self._links.get(link.mac) is not link or link.leases:
+                return
+            _LOGGER.info('Close idle link to %s on %s', link.mac, link.adapter.name)
+            link.adapter.closed_idle += 1
+            controller = self._remove(link)
+            self._cond.notify_all()
+        self._disconnect([controller])
+
+    def _remove(self, link):
+        self._cancel(link)
+        del self._links[link.mac]
+        link.adapter.links -= 1
+        return link.controller
+
+    def _disconnect(self, controllers):
+        for controller in controllers:
+            try:
+                controller.disconnect()
+            except Exception as e:
+                _LOGGER.error('Can not close link %s: %s', controller, e)
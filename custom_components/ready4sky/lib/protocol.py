@@ -0,0 +1,312 @@
+"""Binary codec for the Ready For Sky UART protocol
+
+Every frame is 55 <counter> <opcode> <payload...> aa. Every command is described once in _COMMANDS
+(opcode, request layout, response layout) and compiled at import into COMMANDS: pre-bound
+encode/decode functions that build request bytes and decode replies into small typed records.
+"""
+import binascii
+import struct
+from .exception import RedmondKettleProtocolException
+
+FRAME_START = 0x55
+FRAME_END = 0xaa
+
+OP_ON = 0x03
+OP_OFF = 0x04
+OP_SEND_MODE = 0x05
+OP_MODE = 0x06
+OP_SEND_RGB = 0x32
+OP_RGB = 0x33
+OP_TEMPERATURE_LIGHT = 0x37
+OP_STAT_ENERGY = 0x47
+OP_STAT_COUNT = 0x50
+OP_SYNC = 0x6e
+OP_AUTH = 0xff
+
+MODE_CODES = {
+    'boil': 0x00,
+    'heat': 0x01,
+    'light': 0x03,
+}
+MODE_NAMES = {code: name for name, code in MODE_CODES.items()}
+STATUS_NAMES = {
+    0x00: 'off',
+    0x02: 'on',
+}
+PALETTE_CODES = {
+    'boil': 0x00,
+    'light': 0x01,
+}
+
+
+def hexlify(data):
+    """Hex string of a frame, for debug output only"""
+    return binascii.b2a_hex(bytes(data)).decode('utf-8')
+
+
+class Frame:
+    """One protocol frame"""
+
+    __slots__ = ('counter', 'opcode', 'payload')
+
+    def __init__(self, counter, opcode, payload=b''):
+        self.counter = counter
+        self.opcode = opcode
+        self.payload = payload
+
+    def encode(self):
+        return bytes((FRAME_START, self.counter, self.opcode)) + bytes(self.payload) + b'\xaa'
+
+    @classmethod
+    def decode(cls, data):
+        view = memoryview(data)
+        if len(view) < 4 or view[0] != FRAME_START or view[-1] != FRAME_END:
+            raise RedmondKettleProtocolException('Malformed frame %s' % hexlify(data))
+        return cls(view[1], view[2], view[3:-1])
+
+    def __repr__(self):
+        return 'Frame(%02x, %02x, %s)' % (self.counter, self.opcode, hexlify(self.payload))
+
+
+class StatusRecord:
+    """Reply to a control command: 01 - done, 00 - refused"""
+
+    __slots__ = ('ok', 'code')
+
+    def __init__(self, code):
+        self.code = code
+        self.ok = code == 0x01
+
+    def asDict(self):
+        return {'status': 'ok' if self.ok else 'fail' if self.code == 0x00 else '%02x' % self.code}
+
+
+class AuthRecord(StatusRecord):
+    __slots__ = ()
+
+
+class ModeRecord:
+    """Reply to the mode query (06)"""
+
+    __slots__ = ('mode', 'temperature', 'current_temperature', 'status', 'time')
+
+    def __init__(self, mode, temperature, current_temperature, status, time=0):
+        self.mode = mode
+        self.temperature = temperature
+        self.current_temperature = current_temperature
+        self.status = status
+        self.time = time
+
+    @classmethod
+    def short(cls, payload):
+        """Short reply carries only the status"""
+        return cls(payload[0], 0, 0, payload[0])
+
+    def asDict(self):
+        return {
+            # возвращает статус чайника
+            'status': STATUS_NAMES.get(self.status, '%02x' % self.status),
+            # текущая температура воды (2a=42 по Цельсию)
+            'current_temperature': self.current_temperature,
+            # температура, до которой нужно нагревать в режиме работы «нагрев», в режиме кипячения равен 00.
+            'temperature': self.temperature if self.temperature > 0 else 100,
+            # Режим работы 00 - boil 01 - heat to temp 03 - backlight
+            'mode': MODE_NAMES.get(self.mode, '%02x' % self.mode),
+            # продолжительность работы чайника после достижения нужной температуры, по умолчанию 80 в hex;
+            # строкой, как и до перехода на байтовый кодек
+            'time': '%02x' % self.time,
+        }
+
+
+class EnergyRecord:
+    """Reply to 47 00: energy used over the kettle lifetime, Wh"""
+
+    __slots__ = ('energy_wh',)
+
+    def __init__(self, energy_wh):
+        # 24 bit little endian counter
+        self.energy_wh = int.from_bytes(energy_wh, 'little') if isinstance(energy_wh, bytes) else energy_wh
+
+
+class CountRecord:
+    """Reply to 50 00: how many times the kettle was started"""
+
+    __slots__ = ('count',)
+
+    def __init__(self, count):
+        self.count = count
+
+
+class RgbPaletteRecord:
+    """Reply to 33: three (temperature, brightness, color) points of a backlight palette"""
+
+    __slots__ = ('points',)
+
+    def __init__(self, *fields):
+        # flat (temperature, brightness, color) * 3 as unpacked from the frame
+        self.points = [fields[i:i + 3] for i in range(0, len(fields), 3)]
+
+    def asDict(self):
+        return {
+            name: {
+                'temperature': temperature, # температура
+                'rand': '%02x' % brightness, # яркость
+                'color': hexlify(color), # цвет
+            } for name, (temperature, brightness, color) in zip(('start', 'mid', 'hard'), self.points)
+        }
+
+
+def _color(value):
+    return binascii.a2b_hex(value) if isinstance(value, str) else bytes(value)
+
+
+def _code(table):
+    return lambda value: table.get(value, value if isinstance(value, int) else 0x00)
+
+
+# name -> opcode, request layout and response layout
+#   payload  - constant request payload
+#   request  - struct format of the payload and its fields: name, converter, default
+#   response - struct format of the reply payload and the record it unpacks into,
+#              optional 'short' builds the record when the reply is shorter than the format;
+#              no response means only the fact of the reply matters
+_COMMANDS = {
+    'auth': {
+        'opcode': OP_AUTH,
+        'request': ('8s', [('key', binascii.a2b_hex, None)]),
+        'response': ('B', AuthRecord),
+    },
+    'on': {'opcode': OP_ON},
+    'off': {'opcode': OP_OFF},
+    'onMode': {'opcode': OP_ON, 'response': ('B', StatusRecord)},
+    'offMode': {'opcode': OP_OFF, 'response': ('B', StatusRecord)},
+    'mode': {
+        'opcode': OP_MODE,
+        # программа, -, температура, -, -, текущая температура, -, -, статус, -, -, -, -, время удержания
+        'response': ('BxB2xB2xB4xB', ModeRecord, {'short': ModeRecord.short}),
+    },
+    'sendMode': {
+        'opcode': OP_SEND_MODE,
+        # программа, под программа, температура, часы/минуты (не используем), время удержания
+        'request': ('BBB10xB2x', [
+            ('mode', _code(MODE_CODES), 'boil'),
+            ('submode', int, 0x00),
+            ('temperature', int, 0),
+            ('howMuchBoil', int, 80),
+        ]),
+        'response': ('B', StatusRecord),
+    },
+    'sync': {
+        'opcode': OP_SYNC,
+        'request': ('Ii', [('now', int, None), ('timezone', int, 0)]),
+    },
+    'statEnergy': {
+        'opcode': OP_STAT_ENERGY,
+        'payload': b'\x00',
+        'response': ('6x3s', EnergyRecord),
+    },
+    'statCount': {
+        'opcode': OP_STAT_COUNT,
+        'payload': b'\x00',
+        'response': ('3xH', CountRecord),
+    },
+    'onTemperatureToLight': {'opcode': OP_TEMPERATURE_LIGHT, 'payload': b'\xc8\xc8\x01'},
+    'offTemperatureToLight': {'opcode': OP_TEMPERATURE_LIGHT, 'payload': b'\xc8\xc8\x00'},
+    'sendRGBLight': {
+        'opcode': OP_SEND_RGB,
+        'request': ('B' + 'BB3s' * 3, [('palette', _code(PALETTE_CODES), 'light')] + [
+            field for i in (1, 2, 3) for field in (
+                ('temperature%s' % i, int, None),
+                ('brightness%s' % i, int, 0x5e),
+                ('rgb%s' % i, _color, None),
+            )
+        ]),
+    },
+    'RGBLight': {
+        'opcode': OP_RGB,
+        'request': ('B', [('palette', _code(PALETTE_CODES), 'boil')]),
+        'response': ('x' + 'BB3s' * 3, RgbPaletteRecord),
+    },
+}
+
+
+class Command:
+    """Compiled protocol command: encode(counter, **fields) -> bytes, decode(bytes) -> record"""
+
+    __slots__ = ('name', 'opcode', 'constant', 'response', 'encode', 'decode')
+
+    def __init__(self, name, spec):
+        self.name = name
+        self.opcode = spec['opcode']
+        # the frame differs only by the counter byte
+        self.constant = 'request' not in spec
+        # the reply carries data beyond the fact of its arrival
+        self.response = 'response' in spec
+        self.encode = _compile_request(name, self.opcode, spec)
+        self.decode = _compile_response(name, self.opcode, spec.get('response'))
+
+    def template(self):
+        """Preallocated frame of a constant command, the counter byte (index 1) is patched before each write"""
+        if not self.constant:
+            raise RedmondKettleProtocolException('%s has request fields, it can not be a template' % self.name)
+        return bytearray(self.encode(0x00))
+
+    def __repr__(self):
+        return 'Command(%s, %02x)' % (self.name, self.opcode)
+
+
+def _compile_request(name, opcode, spec):
+    head = bytes((FRAME_START, 0x00, opcode))
+
+    if 'request' not in spec:
+        tail = bytes(spec.get('payload', b'')) + b'\xaa'
+
+        def encode(counter):
+            return bytes((FRAME_START, counter, opcode)) + tail
+        return encode
+
+    fmt, fields = spec['request']
+    layout = struct.Struct('<' + fmt)
+    size = 3 + layout.size + 1
+
+    def encode(counter, **values):
+        frame = bytearray(size)
+        frame[0:3] = head
+        frame[1] = counter
+        args = []
+        for field, convert, default in fields:
+            value = values.pop(field, default)
+            if value is None:
+                raise RedmondKettleProtocolException('%s: %s is required' % (name, field))
+            args.append(convert(value))
+        if values:
+            raise RedmondKettleProtocolException('%s: unknown fields %s' % (name, ', '.join(values)))
+        layout.pack_into(frame, 3, *args)
+        frame[-1] = FRAME_END
+        return bytes(frame)
+    return encode
+
+
+def _compile_response(name, opcode, spec):
+    if spec is None:
+        def decode(data):
+            Frame.decode(data)
+            return True
+        return decode
+
+    fmt, record = spec[0], spec[1]
+    short = spec[2].get('short') if len(spec) > 2 else None
+    layout = struct.Struct('<' + fmt)
+
+    def decode(data):
+        payload = Frame.decode(data).payload
+        if len(payload) < layout.size:
+            if short is not None and len(payload) > 0:
+                return short(payload)
+            raise RedmondKettleProtocolException('Short %s reply %s' % (name, hexlify(data)))
+        return record(*layout.unpack_from(payload))
+    return decode
+
+
+COMMANDS = {name: Command(name, spec) for name, spec in _COMMANDS.items()}
+CONSTANT_COMMANDS = tuple(name for name, command in COMMANDS.items() if command.constant)
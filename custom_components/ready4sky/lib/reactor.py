@@ -0,0 +1,244 @@
+from threading import Thread, Lock, current_thread
+import heapq
+import itertools
+import logging
+import os
+import selectors
+import time
+from .exception import RedmondKettleConnectException
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Timer:
+    """Callback scheduled with Reactor.call_later()"""
+
+    __slots__ = ('when', 'callback', 'cancelled')
+
+    def __init__(self, when, callback):
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Reactor:
+    """One IO thread for every connected kettle
+
+    The thread sleeps in select() on the notification descriptor of every registered BTEConnect and on
+    a self-pipe. Connections never touch their peripheral outside this thread once registered: other
+    threads post work with register() and wake(), the reactor then calls the connection back.
+
+    Callbacks of a connection:
+        fileno()    - descriptor that becomes readable when the peripheral has notifications
+        _service()  - queued frames to write, or a disconnect request
+        _readable() - the descriptor is readable
+        _fail(e)    - a callback raised, the connection is dead
+
+    call_later() runs plain callbacks on the same thread, for work that has to wait for the link to idle.
+    """
+
+    __shared = None
+    __shared_lock = Lock()
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self._lock = Lock()
+        # work posted by other threads: (callback name, connection)
+        self._posted = []
+        self._signaled = False
+        self._connections = set()
+        # heap of (when, sequence, Timer)
+        self._timers = []
+        self._sequence = itertools.count()
+        self._thread = None
+        # stop() was called, the thread exits once nothing new came in
+        self._stopping = False
+        # (connection, callback name, monotonic start) of the callback running now, for the Watchdog
+        self._busy = None
+
+    @classmethod
+    def shared(cls):
+        """The reactor of the process"""
+        with cls.__shared_lock:
+            if cls.__shared is None:
+                cls.__shared = cls()
+            return cls.__shared
+
+    @property
+    def thread(self):
+        return self._thread
+
+    @property
+    def connections(self):
+        return len(self._connections)
+
+    @property
+    def busy(self):
+        """(connection, callback, started) of the callback in progress, None when idle"""
+        return self._busy
+
+    def snapshot(self):
+        """Registered connections, safe from any thread"""
+        with self._lock:
+            return list(self._connections)
+
+    def revive(self):
+        """Start a new thread when the current one died, the connections stay registered
+        :return: True when a new thread was started
+        """
+        with self._lock:
+            if self._thread is None or self._thread.is_alive():
+                return False
+            _LOGGER.error('Reactor thread died, restart it')
+            self._busy = None
+            self._thread = Thread(target=self._run, name='ready4sky_reactor', daemon=True)
+            self._thread.start()
+        os.write(self._wake_w, b'\0')
+        return True
+
+    def register(self, connection):
+        """Start watching a connected BTEConnect"""
+        self._post('_register', connection)
+
+    def wake(self, connection):
+        """Ask the reactor to call connection._service()"""
+        self._post('_wakeup', connection)
+
+    def call_later(self, delay, callback):
+        """Run callback() on the reactor thread in delay seconds
+        :return: Timer, cancel() it to drop the call
+        """
+        timer = Timer(time.monotonic() + max(0.0, delay), callback)
+        with self._lock:
+            heapq.heappush(self._timers, (timer.when, next(self._sequence), timer))
+        self._post('_schedule', None)
+        return timer
+
+    def stop(self, timeout=5.0):
+        """Close every connection and join the thread, the next register() starts a new one
+        :return: True when the thread is gone
+        """
+        with self._lock:
+            thread = self._thread
+        if thread is None:
+            return True
+        if current_thread() is thread:
+            raise RuntimeError('Reactor.stop() from the reactor thread')
+        self._post('_stop', None)
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def unregister(self, connection):
+        """Stop watching a connection, only from the reactor thread"""
+        with self._lock:
+            if connection not in self._connections:
+                return
+            self._connections.discard(connection)
+        try:
+            self._selector.unregister(connection.fileno())
+        except (KeyError, ValueError, OSError):
+            pass
+
+    def _post(self, callback, connection):
+        with self._lock:
+            self._posted.append((callback, connection))
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name='ready4sky_reactor', daemon=True)
+                self._thread.start()
+            if self._signaled:
+                # the reactor has not drained the pipe since the last wake up, one byte is enough
+                return
+            self._signaled = True
+        os.write(self._wake_w, b'\0')
+
+    def _run(self):
+        while True:
+            try:
+                for key, _ in self._selector.select(self._nextTimeout()):
+                    if key.data is None:
+                        self._drain()
+                    else:
+                        self._call(key.data, '_readable')
+                self._runTimers()
+            except Exception as e:
+                # whatever it was, the other kettles still need this thread
+                _LOGGER.error('Reactor loop failed: %s', e)
+            if self._stopping:
+                with self._lock:
+                    self._stopping = False
+                    if not self._posted and not self._connections:
+                        self._thread = None
+                        return
+                    # something was registered meanwhile, keep serving it
+
+    def _nextTimeout(self):
+        with self._lock:
+            if not self._timers:
+                return None
+            return max(0.0, self._timers[0][0] - time.monotonic())
+
+    def _runTimers(self):
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            while self._timers and self._timers[0][0] <= now:
+                due.append(heapq.heappop(self._timers)[2])
+        for timer in due:
+            if timer.cancelled:
+                continue
+            try:
+                timer.callback()
+            except Exception as e:
+                _LOGGER.error('Reactor timer %s failed: %s', timer.callback, e)
+
+    def _drain(self):
+        try:
+            os.read(self._wake_r, 4096)
+        except BlockingIOError:
+            pass
+        with self._lock:
+            posted, self._posted = self._posted, []
+            self._signaled = False
+        for callback, connection in posted:
+            getattr(self, callback)(connection)
+
+    def _register(self, connection):
+        try:
+            self._selector.register(connection.fileno(), selectors.EVENT_READ, connection)
+        except (KeyError, ValueError, OSError) as e:
+            connection._fail(e)
+            return
+        with self._lock:
+            self._connections.add(connection)
+        # frames queued while the connection was being registered
+        self._call(connection, '_service')
+
+    def _stop(self, connection):
+        for registered in list(self._connections):
+            registered._close(RedmondKettleConnectException('Reactor stopped'))
+        self._stopping = True
+
+    def _schedule(self, connection):
+        # nothing to do, waking up recomputes the select() timeout
+        pass
+
+    def _wakeup(self, connection):
+        if connection in self._connections:
+            self._call(connection, '_service')
+
+    def _call(self, connection, callback):
+        self._busy = (connection, callback, time.monotonic())
+        try:
+            getattr(connection, callback)()
+        except Exception as e:
+            _LOGGER.info('Connection %s failed in %s: %s', getattr(connection, 'mac', connection), callback, e)
+            self.unregister(connection)
+            connection._fail(e)
+        finally:
+            self._busy = None
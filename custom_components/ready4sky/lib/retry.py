@@ -0,0 +1,88 @@
+from bluepy.btle import BTLEException
+from .exception import RedmondKettleConnectException, RedmondKettleTimeoutException
+from .deadline import remaining
+import asyncio
+import logging
+import random
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+# failures a new attempt can cure: the link dropped, the kettle did not answer, no free adapter slot
+RETRY_ON = (RedmondKettleConnectException, BTLEException)
+
+
+class Attempt:
+    """One try of an operation run by RetryPolicy
+
+    The operation calls sent() right before its first write reaches the kettle. A failure after that
+    point is only retried for idempotent operations: the kettle may have executed the write already.
+    """
+
+    __slots__ = ('number', 'committed')
+
+    def __init__(self, number):
+        self.number = number
+        self.committed = False
+
+    def sent(self):
+        self.committed = True
+
+
+class RetryPolicy:
+    """Exponential backoff with jitter, bounded by attempts and by the total elapsed time
+
+    Delay before retry n (1-based) is base * factor ** (n - 1), capped at max_delay; half of it is
+    randomised so kettles failing together do not come back in lockstep.
+
+        result = await policy.run(lambda attempt: operation(attempt), idempotent=True, name='mode')
+    """
+
+    def __init__(self, attempts=5, base=1.0, factor=2.0, max_delay=8.0, max_elapsed=20.0, retry_on=RETRY_ON,
+                 rng=None):
+        self._attempts = max(1, attempts)
+        self._base = base
+        self._factor = factor
+        self._max_delay = max_delay
+        self._max_elapsed = max_elapsed
+        self._retry_on = retry_on
+        self._rng = rng or random.Random()
+
+    def delay(self, retry):
+        """Seconds to wait before the given retry"""
+        delay = min(self._max_delay, self._base * self._factor ** (retry - 1))
+        return delay / 2 + self._rng.uniform(0, delay / 2)
+
+    def retryable(self, error, attempt, idempotent):
+        if not isinstance(error, self._retry_on) or isinstance(error, RedmondKettleTimeoutException):
+            # a missed deadline is final, the caller no longer waits for the result
+            return False
+        return idempotent or not attempt.committed
+
+    async def run(self, operation, idempotent=False, name=None, deadline=None):
+        """Await operation(Attempt) until it succeeds or the policy gives up
+        :param operation: callable returning an awaitable, gets the Attempt
+        :param idempotent: repeating the operation is harmless, retry even after a write went out
+        :param deadline: time.monotonic() after which no retry is started
+        :return: the result of the successful attempt, the last error is raised otherwise
+        """
+        started = time.monotonic()
+        number = 0
+        while True:
+            number += 1
+            attempt = Attempt(number)
+            try:
+                return await operation(attempt)
+            except Exception as e:
+                if not self.retryable(e, attempt, idempotent):
+                    raise e
+                if number >= self._attempts:
+                    _LOGGER.info('%s failed after %s attempts: %s', name, number, e)
+                    raise e
+                delay = self.delay(number)
+                if time.monotonic() - started + delay > self._max_elapsed \
+                        or remaining(deadline, delay) < delay:
+                    _LOGGER.info('%s failed after %.1fs: %s', name, time.monotonic() - started, e)
+                    raise e
+                _LOGGER.info('%s attempt %s failed, retry in %.1fs: %s', name, number, delay, e)
+            await asyncio.sleep(delay)
@@ -0,0 +1,64 @@
+import random
+
+# seconds between polls while the kettle heats
+DEFAULT_FAST = 5
+# seconds between polls of an idle kettle
+DEFAULT_SLOW = 300
+# share of the period randomised, so kettles polled together drift apart
+DEFAULT_JITTER = 0.1
+# seconds after a command while the kettle is polled at medium speed
+SETTLE = 60
+
+
+class PollSchedule:
+    """Picks the period of the next poll from the last known state of the kettle
+
+    heating (boil or heat on)   - fast, the temperature changes every few seconds
+    right after a command       - medium, the kettle may still switch modes on its own
+    idle or night light         - slow, nothing changes until somebody presses a button
+
+    Every period stays within [fast, slow] and is spread by +-jitter of itself.
+
+        schedule = PollSchedule(fast=5, slow=300)
+        seconds = schedule.next(heating=True)
+    """
+
+    def __init__(self, fast=DEFAULT_FAST, slow=DEFAULT_SLOW, jitter=DEFAULT_JITTER, settle=SETTLE, rng=None):
+        self._fast = max(1, fast)
+        self._slow = max(self._fast, slow)
+        # halfway between fast and slow on a log scale
+        self._medium = min(self._slow, (self._fast * self._slow) ** 0.5)
+        self._jitter = min(max(0.0, jitter), 0.5)
+        self._settle = settle
+        self._rng = rng or random.Random()
+
+    @property
+    def fast(self):
+        return self._fast
+
+    @property
+    def slow(self):
+        return self._slow
+
+    def __eq__(self, other):
+        if not isinstance(other, PollSchedule):
+            return NotImplemented
+        return (self._fast, self._slow, self._jitter, self._settle) == \
+            (other._fast, other._slow, other._jitter, other._settle)
+
+    def period(self, heating=False, sinceCommand=None):
+        """Period before jitter
+        :param heating: boil or heat mode is on
+        :param sinceCommand: seconds since the last command to the kettle, None - no command yet
+        """
+        if heating:
+            return self._fast
+        if sinceCommand is not None and sinceCommand < self._settle:
+            return self._medium
+        return self._slow
+
+    def next(self, heating=False, sinceCommand=None):
+        """Seconds to the next poll"""
+        period = self.period(heating, sinceCommand)
+        spread = period * self._jitter
+        return min(self._slow, max(self._fast, period + self._rng.uniform(-spread, spread)))
@@ -0,0 +1,442 @@
+"""Protocol-accurate kettle simulator, a local stand-in for bluepy.btle.Peripheral
+
+    sim = KettleSimulator(latency=0.03, drop_rate=0.01)
+    kettle = RedmondKettle(mac, password, peripheral=sim.Peripheral)
+
+Every MAC gets its own SimulatedKettle with a simple thermal model. SimulatedPeripheral exposes the
+Nordic UART service with the same handles as the real kettle, answers frames after the configured
+latency and can drop notifications or the whole link on demand or at random. With helper=True the
+notifications travel as text lines through a pipe read with readline(), the way bluepy reads bluepy-helper.
+"""
+from bluepy.btle import ADDR_TYPE_RANDOM, BTLEDisconnectError, BTLEGattError
+from threading import Condition, Lock, Thread
+import heapq
+import os
+import random
+import select
+import time
+from . import protocol
+
+UART_SERVICE_UUID = '6e400001-b5a3-f393-e0a9-e50e24dcca9e'
+UART_TX_UUID = '6e400003-b5a3-f393-e0a9-e50e24dcca9e'
+UART_RX_UUID = '6e400002-b5a3-f393-e0a9-e50e24dcca9e'
+CCCD_UUID = '00002902-0000-1000-8000-00805f9b34fb'
+
+# same layout as the real kettle
+TX_HANDLE = 11
+CCCD_HANDLE = 12
+RX_HANDLE = 14
+
+
+class SimulatedKettle:
+    """Kettle state and protocol handling
+
+    Water heats at heat_rate °C/s while the heater is on and cools towards the ambient temperature
+    otherwise. Boiling switches the kettle off at 100 °C, heating holds the target temperature.
+    Time may run faster than the wall clock with speed.
+    """
+
+    POWER_W = 2200
+
+    def __init__(self, mac, key=None, ambient=22.0, heat_rate=0.5, cool_rate=0.0005, speed=1.0):
+        self.mac = mac
+        # None - the kettle is in pairing mode and accepts the first key it sees
+        self.key = key
+        self.ambient = ambient
+        self.heat_rate = heat_rate
+        self.cool_rate = cool_rate
+        self.speed = speed
+        self.temperature = ambient
+        self.mode = protocol.MODE_CODES['boil']
+        self.target = 0
+        self.howMuchBoil = 0x80
+        self.status = 0x00
+        self.energy_wh = 0.0
+        self.count = 0
+        self.temperature_light = False
+        self.palettes = {
+            protocol.PALETTE_CODES['boil']: bytes.fromhex('005e0000ff325e00ff00645eff0000'),
+            protocol.PALETTE_CODES['light']: bytes.fromhex('005e0000ff325e00ff00645e0000ff'),
+        }
+        self.clock = None
+        # opcodes the kettle answers with a refusal, e.g. a mode it does not support
+        self.refused = set()
+        self._lock = Lock()
+
+    def now(self):
+        return time.monotonic() * self.speed
+
+    def advance(self, now=None):
+        """Run the thermal model up to now"""
+        now = self.now() if now is None else now
+        if self.clock is None:
+            self.clock = now
+        dt, self.clock = now - self.clock, now
+        if dt <= 0:
+            return
+        heating = self.status == 0x02 and self.mode in (protocol.MODE_CODES['boil'], protocol.MODE_CODES['heat'])
+        goal = 100.0 if self.mode == protocol.MODE_CODES['boil'] else float(self.target)
+        if heating and self.temperature < goal:
+            rise = min(self.heat_rate * dt, goal - self.temperature)
+            self.temperature += rise
+            self.energy_wh += self.POWER_W * (rise / self.heat_rate) / 3600
+            if self.mode == protocol.MODE_CODES['boil'] and self.temperature >= 100.0:
+                # boiled, the kettle switches itself off
+                self.status = 0x00
+        elif not heating or self.temperature > goal:
+            self.temperature -= (self.temperature - self.ambient) * min(1.0, self.cool_rate * dt)
+
+    def handle(self, data, authorized):
+        """Answer one request frame
+        :return: (reply frame, authorized) or (None, authorized) when the kettle stays silent
+        """
+        try:
+            frame = protocol.Frame.decode(data)
+        except protocol.RedmondKettleProtocolException:
+            return None, authorized
+        with self._lock:
+            self.advance()
+            opcode, payload = frame.opcode, bytes(frame.payload)
+            if opcode == protocol.OP_AUTH:
+                if self.key is None:
+                    self.key = payload
+                authorized = payload == self.key
+                return self._reply(frame, 0x01 if authorized else 0x00), authorized
+            if not authorized or opcode in self.refused:
+                return self._reply(frame, 0x00), authorized
+            return self._dispatch(frame, opcode, payload), authorized
+
+    def _dispatch(self, frame, opcode, payload):
+        if opcode == protocol.OP_MODE:
+            reply = bytearray(16)
+            reply[0] = self.mode
+            reply[2] = self.target
+            reply[5] = int(round(self.temperature))
+            reply[6] = 0x01
+            reply[7] = 0x0f if self.temperature_light else 0x00
+            reply[8] = self.status
+            reply[13] = self.howMuchBoil
+            return self._reply(frame, reply)
+        if opcode == protocol.OP_SEND_MODE and len(payload) >= 14:
+            if payload[0] not in protocol.MODE_NAMES:
+                return self._reply(frame, 0x00)
+            self.mode, self.target, self.howMuchBoil = payload[0], payload[2], payload[13]
+            return self._reply(frame, 0x01)
+        if opcode == protocol.OP_ON:
+            if self.status != 0x02 and self.mode != protocol.MODE_CODES['light']:
+                self.count += 1
+            self.status = 0x02
+            return self._reply(frame, 0x01)
+        if opcode == protocol.OP_OFF:
+            self.status = 0x00
+            return self._reply(frame, 0x01)
+        if opcode == protocol.OP_TEMPERATURE_LIGHT and len(payload) >= 3:
+            self.temperature_light = payload[2] == 0x01
+            return self._reply(frame, 0x01)
+        if opcode == protocol.OP_SEND_RGB and len(payload) >= 16:
+            self.palettes[payload[0]] = payload[1:16]
+            return self._reply(frame, 0x01)
+        if opcode == protocol.OP_RGB and len(payload) >= 1:
+            return self._reply(frame, payload[:1] + self.palettes.get(payload[0], bytes(15)))
+        if opcode == protocol.OP_STAT_ENERGY:
+            reply = bytearray(16)
+            reply[6:9] = int(self.energy_wh).to_bytes(3, 'little')
+            return self._reply(frame, reply)
+        if opcode == protocol.OP_STAT_COUNT:
+            reply = bytearray(16)
+            reply[3:5] = self.count.to_bytes(2, 'little')
+            return self._reply(frame, reply)
+        if opcode == protocol.OP_SYNC:
+            return self._reply(frame, 0x00)
+        return self._reply(frame, 0x00)
+
+    def _reply(self, frame, payload):
+        if isinstance(payload, int):
+            payload = bytes((payload,))
+        return protocol.Frame(frame.counter, frame.opcode, payload).encode()
+
+
+class _Attribute:
+    def __init__(self, uuid, handle, properties=0):
+        self.uuid = uuid
+        self.handle = handle
+        self.properties = properties
+
+    def __str__(self):
+        return 'Attribute <%s> %s' % (self.uuid, self.handle)
+
+
+class _Service:
+    def __init__(self):
+        self.uuid = UART_SERVICE_UUID
+        self._characteristics = [_Attribute(UART_TX_UUID, TX_HANDLE, 0x10), _Attribute(UART_RX_UUID, RX_HANDLE, 0x04)]
+        self._descriptors = [
+            _Attribute(UART_TX_UUID, TX_HANDLE),
+            _Attribute(CCCD_UUID, CCCD_HANDLE),
+            _Attribute(UART_RX_UUID, RX_HANDLE),
+        ]
+
+    def getCharacteristics(self):
+        return self._characteristics
+
+    def getDescriptors(self):
+        return self._descriptors
+
+    def __str__(self):
+        return 'Service <uuid=%s>' % self.uuid
+
+
+class _Helper:
+    """Stands for the bluepy-helper subprocess, bluepy reads its stdout as buffered text"""
+
+    def __init__(self, stdout):
+        self.stdout = stdout
+
+
+class SimulatedPeripheral:
+    """The part of bluepy.btle.Peripheral that BTEConnect uses, backed by a SimulatedKettle"""
+
+    def __init__(self, simulator, deviceAddr=None, addrType=ADDR_TYPE_RANDOM, iface=None):
+        self._simulator = simulator
+        self._kettle = None
+        self.deviceAddr = None
+        self.addrType = addrType
+        self.iface = iface
+        self._delegate = None
+        self._subscribed = False
+        self._authorized = False
+        self._connected = False
+        # notifications ready for delivery, the pipe holds one byte per entry
+        self._ready = []
+        self._ready_r = self._ready_w = None
+        # notifications still "in the air": heap of (due, sequence, frame)
+        self._air = []
+        self._sequence = 0
+        self._cond = Condition()
+        self._thread = None
+        self._helper = None
+        if deviceAddr is not None:
+            self.connect(deviceAddr, addrType, iface)
+
+    def connect(self, deviceAddr, addrType=ADDR_TYPE_RANDOM, iface=None):
+        simulator = self._simulator
+        if deviceAddr.lower() in simulator._unreachable or simulator._roll(simulator.connect_failure_rate):
+            raise BTLEDisconnectError('Failed to connect to peripheral %s, addr type: %s' % (deviceAddr, addrType),
+                                      {'rsp': ['stat'], 'state': ['disc']})
+        self._kettle = simulator.kettle(deviceAddr)
+        self.deviceAddr = deviceAddr
+        self.addrType = addrType
+        self.iface = iface
+        self._connected = True
+        self._ready_r, self._ready_w = os.pipe()
+        if simulator.helper:
+            self._helper = _Helper(open(self._ready_r, 'r', closefd=False))
+        self._thread = Thread(target=self._deliver, name='simulated_peripheral', daemon=True)
+        self._thread.start()
+        simulator._remember(self)
+
+    def setDelegate(self, delegate):
+        self._delegate = delegate
+        return self
+
+    def withDelegate(self, delegate):
+        return self.setDelegate(delegate)
+
+    def fileno(self):
+        return self._ready_r
+
+    def getServices(self):
+        self._checkConnected()
+        return [_Service()]
+
+    def writeCharacteristic(self, handle, val, withResponse=False):
+        self._checkConnected()
+        if self.deviceAddr.lower() in self._simulator._hung:
+            with self._cond:
+                while self._connected:
+                    self._cond.wait()
+            self._checkConnected()
+        if self._simulator._roll(self._simulator.disconnect_rate):
+            self._simulator.disconnect(self.deviceAddr)
+            self._checkConnected()
+        if handle == CCCD_HANDLE:
+            self._subscribed = bytes(val) == b'\x01\x00'
+            return {'rsp': ['wr']}
+        if handle != RX_HANDLE:
+            raise BTLEGattError('Invalid handle %s' % handle, {'code': [1]})
+        reply, self._authorized = self._kettle.handle(bytes(val), self._authorized)
+        if reply is not None and self._subscribed and not self._simulator._roll(self._simulator.drop_rate):
+            with self._cond:
+                self._sequence += 1
+                heapq.heappush(self._air, (time.monotonic() + self._simulator.latency, self._sequence, reply))
+                self._cond.notify()
+        return {'rsp': ['wr']} if withResponse else None
+
+    def waitForNotifications(self, timeout):
+        if self._helper is not None:
+            return self._waitHelper(timeout)
+        readable, _, _ = select.select([self._ready_r], [], [], timeout)
+        if not readable:
+            self._checkConnected()
+            return False
+        os.read(self._ready_r, 1)
+        with self._cond:
+            frame = self._ready.pop(0) if self._ready else None
+        if frame is None:
+            # the wake-up byte of a dropped link
+            self._checkConnected()
+            return False
+        if self._delegate is not None:
+            self._delegate.handleNotification(TX_HANDLE, frame)
+        return True
+
+    def _waitHelper(self, timeout):
+        """bluepy's way: poll the descriptor unless the timeout is None, then readline() the text stream"""
+        if timeout:
+            readable, _, _ = select.select([self._ready_r], [], [], timeout)
+            if not readable:
+                self._checkConnected()
+                return False
+        line = self._helper.stdout.readline()
+        if not line.startswith('ntfy '):
+            # the disconnect line of a dropped link
+            self._checkConnected()
+            return False
+        if self._delegate is not None:
+            self._delegate.handleNotification(TX_HANDLE, bytes.fromhex(line[5:].strip()))
+        return True
+
+    def disconnect(self):
+        with self._cond:
+            if self._ready_w is None:
+                # never connected or already closed
+                return
+            self._connected = False
+            self._cond.notify_all()
+        self._thread.join()
+        os.close(self._ready_w)
+        os.close(self._ready_r)
+        self._ready_w = None
+        self._simulator._forget(self)
+
+    def kill(self):
+        """The helper process was killed"""
+        self._drop()
+
+    def _drop(self):
+        """The kettle went away: wake any waiter so it sees the disconnect"""
+        with self._cond:
+            if not self._connected:
+                return
+            self._connected = False
+            self._cond.notify_all()
+            os.write(self._ready_w, b'disc\n' if self._helper is not None else b'\0')
+
+    def _checkConnected(self):
+        if not self._connected:
+            raise BTLEDisconnectError('Device disconnected', {'rsp': ['stat'], 'state': ['disc']})
+
+    def _deliver(self):
+        with self._cond:
+            while self._connected:
+                if not self._air:
+                    self._cond.wait()
+                    continue
+                due = self._air[0][0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                # everything due within the batch window reaches the host in one write
+                frames = []
+                while self._air and self._air[0][0] <= due + self._simulator.batch:
+                    frames.append(heapq.heappop(self._air)[2])
+                if self._helper is not None:
+                    os.write(self._ready_w, b''.join(b'ntfy %s\n' % frame.hex().encode() for frame in frames))
+                else:
+                    self._ready.extend(frames)
+                    os.write(self._ready_w, b'\0' * len(frames))
+
+
+class KettleSimulator:
+    """A set of simulated kettles and the fault model of the radio between them and us
+
+    latency             - seconds between a write and its notification
+    drop_rate           - probability that a notification is lost
+    disconnect_rate     - probability that a write drops the link
+    connect_failure_rate - probability that a connect attempt fails
+    batch               - seconds within which due notifications are written to the host together
+    helper              - deliver notifications as text lines like bluepy-helper instead of one byte per frame
+    """
+
+    def __init__(self, latency=0.0, drop_rate=0.0, disconnect_rate=0.0, connect_failure_rate=0.0,
+                 speed=1.0, seed=None, batch=0.0, helper=False, **kettle):
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.disconnect_rate = disconnect_rate
+        self.connect_failure_rate = connect_failure_rate
+        self.speed = speed
+        self.batch = batch
+        self.helper = helper
+        self._kettle_options = kettle
+        self._random = random.Random(seed)
+        self._lock = Lock()
+        self._kettles = {}
+        self._peripherals = []
+        # MACs that are out of range: connects fail until reachable() is called
+        self._unreachable = set()
+        # MACs whose bluepy-helper hangs: writes block until the peripheral is killed
+        self._hung = set()
+
+    def kettle(self, mac):
+        with self._lock:
+            mac = mac.lower()
+            if mac not in self._kettles:
+                self._kettles[mac] = SimulatedKettle(mac, speed=self.speed, **self._kettle_options)
+            return self._kettles[mac]
+
+    def Peripheral(self, deviceAddr=None, addrType=ADDR_TYPE_RANDOM, iface=None):
+        """Drop-in replacement for bluepy.btle.Peripheral, without deviceAddr connect() it later"""
+        return SimulatedPeripheral(self, deviceAddr, addrType, iface)
+
+    def disconnect(self, mac):
+        """Drop every open link to the kettle"""
+        with self._lock:
+            peripherals = [p for p in self._peripherals if p.deviceAddr.lower() == mac.lower()]
+        for peripheral in peripherals:
+            peripheral._drop()
+
+    def unreachable(self, mac):
+        """Take the kettle off its base: drop its links and refuse new ones"""
+        self._unreachable.add(mac.lower())
+        self.disconnect(mac)
+
+    def reachable(self, mac):
+        self._unreachable.discard(mac.lower())
+
+    def hang(self, mac, hung=True):
+        """Make the next writes to the kettle block like a hung bluepy-helper, until kill()"""
+        if hung:
+            self._hung.add(mac.lower())
+        else:
+            self._hung.discard(mac.lower())
+
+    @property
+    def connections(self):
+        with self._lock:
+            return len(self._peripherals)
+
+    def _remember(self, peripheral):
+        with self._lock:
+            self._peripherals.append(peripheral)
+
+    def _forget(self, peripheral):
+        with self._lock:
+            if peripheral in self._peripherals:
+                self._peripherals.remove(peripheral)
+
+    def _roll(self, probability):
+        if probability <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < probability
@@ -0,0 +1,75 @@
+from threading import Lock
+import time
+
+# field group -> command of the snapshot burst that reads it
+GROUPS = {
+    'mode': 'mode',
+    'energy': 'statEnergy',
+    'count': 'statCount',
+}
+# seconds a group stays fresh: 0 - read on every poll, None - read once, then only after invalidate()
+DEFAULT_TTL = {
+    'mode': 0,
+    # lifetime counters only move while the kettle runs, the end of a run invalidates them
+    'energy': None,
+    'count': None,
+}
+
+
+class TelemetryCache:
+    """Last known kettle state by field group, and which groups the next poll has to read
+
+        groups = cache.stale()
+        state = controller.snapshot(fields=cache.commands(groups))
+        cache.store(groups, state)
+        cache.state()   # merged {'mode': ..., 'stat': {...}}
+    """
+
+    def __init__(self, ttl=None, clock=time.monotonic):
+        self._ttl = dict(DEFAULT_TTL, **(ttl or {}))
+        self._clock = clock
+        self._lock = Lock()
+        # group -> clock() of its last read
+        self._read = {}
+        self._state = {}
+
+    def stale(self):
+        """Groups the next poll has to read, in snapshot order"""
+        now = self._clock()
+        with self._lock:
+            return [group for group in GROUPS if self._stale(group, now)]
+
+    def _stale(self, group, now):
+        ttl = self._ttl.get(group)
+        if group not in self._read:
+            return True
+        if ttl is None:
+            return False
+        return now - self._read[group] >= ttl
+
+    def commands(self, groups):
+        return tuple(GROUPS[group] for group in groups)
+
+    def store(self, groups, state):
+        """Merge what a snapshot of these groups returned"""
+        now = self._clock()
+        with self._lock:
+            for group in groups:
+                self._read[group] = now
+            if 'mode' in state:
+                self._state['mode'] = state['mode']
+            if 'stat' in state:
+                self._state['stat'] = dict(self._state.get('stat', {}), **state['stat'])
+
+    def invalidate(self, *groups):
+        """Read these groups, every group when none is given, on the next poll"""
+        with self._lock:
+            for group in groups or list(self._read):
+                self._read.pop(group, None)
+
+    def state(self):
+        with self._lock:
+            state = dict(self._state)
+            if 'stat' in state:
+                state['stat'] = dict(state['stat'])
+            return state
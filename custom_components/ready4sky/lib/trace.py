@@ -0,0 +1,298 @@
+"""Binary capture of every frame sent to and received from the kettles, and its replay
+
+Trace file: 8 byte header (b'R4SKYTR' + format version) followed by records
+    timestamp  - float64, seconds since the epoch
+    mac        - 6 bytes
+    direction  - 0 sent to the kettle, 1 received from it
+    counter    - counter byte of the frame
+    length     - uint16, length of the frame
+    frame      - the frame itself, 55 .. aa
+
+Records are only appended, a record cut short by a crash is ignored by the reader. The key in auth
+requests is written as zeros. A file that grows past MAX_SIZE is moved to <path>.1, replacing the
+previous one, and a new file is started.
+
+    cd custom_components/ready4sky && python3 -m lib.trace ready4sky_trace.bin --timing recorded
+
+--dump only needs the standard library; a replay runs the frames through RedmondKettle, which needs
+homeassistant installed.
+"""
+from threading import Lock
+import argparse
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+from . import protocol
+
+_LOGGER = logging.getLogger(__name__)
+
+# file name of the trace inside the Home Assistant config dir
+TRACE_FILE = 'ready4sky_trace.bin'
+
+MAGIC = b'R4SKYTR'
+VERSION = 1
+HEADER = MAGIC + bytes((VERSION,))
+RECORD = struct.Struct('<d6sBBH')
+
+# bytes a trace file grows to before it is rotated
+MAX_SIZE = 8 * 1024 * 1024
+
+TX = 0
+RX = 1
+DIRECTIONS = {TX: 'tx', RX: 'rx'}
+
+# command that explains the reply to an opcode, when several commands share one
+REPLY_COMMANDS = {}
+for _name, _command in protocol.COMMANDS.items():
+    if _command.opcode not in REPLY_COMMANDS or _command.response:
+        REPLY_COMMANDS[_command.opcode] = _name
+
+
+def _macBytes(mac):
+    return bytes.fromhex(mac.replace(':', '').replace('-', ''))
+
+
+def _macString(data):
+    return ':'.join('%02x' % b for b in data)
+
+
+class TraceRecord:
+    """One captured frame"""
+
+    __slots__ = ('timestamp', 'mac', 'direction', 'counter', 'frame')
+
+    def __init__(self, timestamp, mac, direction, counter, frame):
+        self.timestamp = timestamp
+        self.mac = mac
+        self.direction = direction
+        self.counter = counter
+        self.frame = frame
+
+    def __repr__(self):
+        return 'TraceRecord(%.6f, %s, %s, %02x, %s)' % (
+            self.timestamp, self.mac, DIRECTIONS.get(self.direction, self.direction), self.counter,
+            protocol.hexlify(self.frame))
+
+
+class TraceRecorder:
+    """Appends frames to a trace file, shared by every kettle writing to the same path"""
+
+    __instances = {}
+    __instances_lock = Lock()
+
+    def __init__(self, path, maxSize=MAX_SIZE):
+        self._path = path
+        self._maxSize = maxSize
+        self._lock = Lock()
+        self._file = None
+        self._macs = {}
+
+    @classmethod
+    def forPath(cls, path):
+        """One recorder per file"""
+        with cls.__instances_lock:
+            if path not in cls.__instances:
+                cls.__instances[path] = cls(path)
+            return cls.__instances[path]
+
+    @property
+    def path(self):
+        return self._path
+
+    def record(self, mac, direction, counter, frame):
+        mac_bytes = self._macs.get(mac)
+        if mac_bytes is None:
+            mac_bytes = self._macs[mac] = _macBytes(mac)
+        if direction == TX and len(frame) > 4 and frame[2] == protocol.OP_AUTH:
+            # the pairing key does not belong in a file users attach to bug reports
+            frame = bytes(frame[:3]) + bytes(len(frame) - 4) + bytes(frame[-1:])
+        entry = RECORD.pack(time.time(), mac_bytes, direction, counter, len(frame)) + bytes(frame)
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._open()
+                self._file.write(entry)
+                # a record is worth most right before a crash, do not keep it in the buffer
+                self._file.flush()
+                if self._file.tell() >= self._maxSize:
+                    self._rotate()
+            except OSError as e:
+                _LOGGER.error('Can not write frame trace %s: %s', self._path, e)
+
+    def _open(self):
+        self._file = open(self._path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(HEADER)
+            return
+        with open(self._path, 'rb') as file:
+            header = file.read(len(HEADER))
+        if header != HEADER:
+            self._file.close()
+            self._file = None
+            raise OSError('%s is not a version %s frame trace' % (self._path, VERSION))
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        os.replace(self._path, self._path + '.1')
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class TraceReader:
+    """Memory-mapped view of a trace file, iterating yields TraceRecord"""
+
+    def __init__(self, path):
+        self._path = path
+
+    def __iter__(self):
+        with open(self._path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size <= len(HEADER):
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data[:len(HEADER)] != HEADER:
+                    raise protocol.RedmondKettleProtocolException('%s is not a version %s frame trace' % (self._path, VERSION))
+                view = memoryview(data)
+                try:
+                    yield from self._records(view, len(data))
+                finally:
+                    view.release()
+
+    @staticmethod
+    def _records(view, size):
+        macs = {}
+        offset = len(HEADER)
+        while offset + RECORD.size <= size:
+            timestamp, mac, direction, counter, length = RECORD.unpack_from(view, offset)
+            offset += RECORD.size
+            if offset + length > size:
+                # torn tail of a recorder that died mid write
+                return
+            if mac not in macs:
+                macs[mac] = _macString(mac)
+            yield TraceRecord(timestamp, macs[mac], direction, counter, bytes(view[offset:offset + length]))
+            offset += length
+
+
+class TraceReplay:
+    """Feeds captured replies through the protocol decoders and the RedmondKettle state model
+
+    Replies are matched to their request by MAC and counter, the same way BTEConnect does it.
+    """
+
+    def __init__(self, kettle_factory=None):
+        self._kettle_factory = kettle_factory
+        self.kettles = {}
+        self._requests = {}
+        self.stats = {
+            'records': 0, 'tx': 0, 'rx': 0, 'decoded': 0, 'unmatched': 0, 'errors': 0,
+            'commands': {},
+        }
+
+    def kettle(self, mac):
+        if mac not in self.kettles:
+            if self._kettle_factory is None:
+                from .kettle import RedmondKettle
+                self._kettle_factory = RedmondKettle
+            self.kettles[mac] = self._kettle_factory(mac=mac)
+        return self.kettles[mac]
+
+    def feed(self, record):
+        """Replay one record, returns the decoded reply or None"""
+        self.stats['records'] += 1
+        if record.direction == TX:
+            self.stats['tx'] += 1
+            try:
+                opcode = protocol.Frame.decode(record.frame).opcode
+            except protocol.RedmondKettleProtocolException:
+                self.stats['errors'] += 1
+                return None
+            self._requests[(record.mac, record.counter)] = opcode
+            return None
+
+        self.stats['rx'] += 1
+        opcode = self._requests.pop((record.mac, record.counter), None)
+        if opcode is None:
+            self.stats['unmatched'] += 1
+            return None
+        name = REPLY_COMMANDS.get(opcode)
+        try:
+            decoded = protocol.COMMANDS[name].decode(record.frame)
+        except (KeyError, protocol.RedmondKettleProtocolException):
+            self.stats['errors'] += 1
+            return None
+        self.stats['decoded'] += 1
+        self.stats['commands'][name] = self.stats['commands'].get(name, 0) + 1
+        self._apply(self.kettle(record.mac), name, decoded)
+        return decoded
+
+    def _apply(self, kettle, name, decoded):
+        if name == 'mode':
+            kettle._update_data_mode(decoded.asDict())
+        elif name == 'statEnergy':
+            kettle._energy_kwh = decoded.energy_wh / 1000
+        elif name == 'statCount':
+            kettle._started_count = decoded.count
+
+    def run(self, records, timing='fast', speed=1.0):
+        """Replay every record
+        :param timing: fast - as quick as possible, recorded - keep the gaps between records
+        :param speed: how many times faster than recorded
+        """
+        start = time.perf_counter()
+        first = None
+        for record in records:
+            if timing == 'recorded':
+                if first is None:
+                    first = record.timestamp
+                delay = (record.timestamp - first) / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            self.feed(record)
+        elapsed = time.perf_counter() - start
+        self.stats['seconds'] = round(elapsed, 6)
+        self.stats['records_per_s'] = round(self.stats['records'] / elapsed) if elapsed > 0 else None
+        return self.stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a Ready4Sky frame trace')
+    parser.add_argument('path')
+    parser.add_argument('--timing', choices=('fast', 'recorded'), default='fast')
+    parser.add_argument('--speed', type=float, default=1.0, help='speed-up of recorded timing')
+    parser.add_argument('--mac', help='replay only this kettle')
+    parser.add_argument('--dump', action='store_true', help='print every record instead of replaying')
+    args = parser.parse_args(argv)
+
+    records = TraceReader(args.path)
+    if args.mac:
+        records = (record for record in records if record.mac == args.mac.lower())
+    if args.dump:
+        for record in records:
+            print(record)
+        return 0
+
+    try:
+        from .kettle import RedmondKettle
+    except ImportError as e:
+        parser.error('replay needs homeassistant for the kettle state model (%s), --dump does not' % e)
+    replay = TraceReplay(RedmondKettle)
+    stats = replay.run(records, args.timing, args.speed)
+    for key, value in stats.items():
+        print('%s: %s' % (key, value))
+    for mac, kettle in replay.kettles.items():
+        print('%s: mode=%s state=%s temperature=%s/%s energy=%s count=%s' % (
+            mac, kettle._mode, kettle._state, kettle._current_temperature, kettle._target_temperature,
+            kettle._energy_kwh, kettle._started_count))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+from threading import Thread, Lock, Event
+from .exception import RedmondKettleConnectException
+from .reactor import Reactor
+import logging
+import time
+import weakref
+
+_LOGGER = logging.getLogger(__name__)
+
+# seconds between two checks
+INTERVAL = 1.0
+# a reactor callback running this long is blocked on a hung bluepy-helper
+HANG_TIMEOUT = 10.0
+# a request nobody answered or collected for this long is stuck
+STUCK_TIMEOUT = 15.0
+# a connect handshake (connect, service discovery, subscribe) running this long is hung
+CONNECT_TIMEOUT = 20.0
+
+
+class Watchdog:
+    """Supervisor of the reactor thread and of every link it serves
+
+    Every INTERVAL seconds it checks that
+        - the reactor thread is alive, a dead one is replaced;
+        - no link has been in its connect handshake for CONNECT_TIMEOUT, the handshake runs on the
+          caller's thread and its bluepy-helper is killed, so the connect fails instead of blocking;
+        - no reactor callback has been blocked for HANG_TIMEOUT, the bluepy-helper it waits on is
+          killed, which fails the link and frees the thread for the other kettles;
+        - no request has been pending for STUCK_TIMEOUT, its caller is failed; when the kettle sent
+          nothing since, the helper is hung and the link is aborted.
+    Aborted links are handed to the listeners, ConnectionPool reopens them in the background.
+    A hung link is counted once, however many checks find it still blocked.
+    """
+
+    __shared = None
+    __shared_lock = Lock()
+
+    def __init__(self, reactor=None, interval=INTERVAL, hang_timeout=HANG_TIMEOUT, stuck_timeout=STUCK_TIMEOUT,
+                 connect_timeout=CONNECT_TIMEOUT):
+        self._reactor = reactor or Reactor.shared()
+        self._interval = interval
+        self._hang_timeout = hang_timeout
+        self._stuck_timeout = stuck_timeout
+        self._connect_timeout = connect_timeout
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+        # weak callables listener(mac) called with the MAC of every aborted link
+        self._listeners = []
+        # BTEConnect in its connect handshake -> monotonic start
+        self._connecting = {}
+        # links aborted already, they are not counted again while the reactor is still stuck in them
+        self._hung = weakref.WeakSet()
+        self._counts = {
+            'reactor_restarts': 0,
+            'hung_connects': 0,
+            'hung_links': 0,
+            'stuck_requests': 0,
+            'link_restarts': 0,
+        }
+        # [count, total seconds, max seconds] from detection to a usable link
+        self._recovery = [0, 0.0, 0.0]
+
+    @classmethod
+    def shared(cls):
+        """The watchdog of the shared reactor"""
+        with cls.__shared_lock:
+            if cls.__shared is None:
+                cls.__shared = cls()
+            return cls.__shared
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = Thread(target=self._run, name='ready4sky_watchdog', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return True
+        self._stop.set()
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def listen(self, method):
+        """Call the bound method with the MAC of every aborted link"""
+        with self._lock:
+            self._listeners.append(weakref.WeakMethod(method))
+
+    def connecting(self, connection):
+        """connection starts its connect handshake on the caller's thread"""
+        with self._lock:
+            self._connecting[connection] = time.monotonic()
+
+    def connected(self, connection):
+        """The handshake is over, connected or failed"""
+        with self._lock:
+            self._connecting.pop(connection, None)
+
+    def recovered(self, seconds):
+        """A listener brought an aborted link back"""
+        with self._lock:
+            self._counts['link_restarts'] += 1
+            self._recovery[0] += 1
+            self._recovery[1] += seconds
+            self._recovery[2] = max(self._recovery[2], seconds)
+
+    def stats(self):
+        with self._lock:
+            count, total, worst = self._recovery
+            return dict(self._counts, recovery_ms={
+                'n': count,
+                'avg': round(total / count * 1000, 3) if count else None,
+                'max': round(worst * 1000, 3),
+            })
+
+    def check(self):
+        """One round of checks, the thread calls it every interval"""
+        if self._reactor.revive():
+            self._count('reactor_restarts')
+
+        now = time.monotonic()
+        with self._lock:
+            stalled = [(connection, started) for connection, started in self._connecting.items()
+                       if now - started > self._connect_timeout]
+            for connection, _ in stalled:
+                del self._connecting[connection]
+        for connection, started in stalled:
+            # nothing to reopen, the caller gets the error from its connect
+            self._count('hung_connects')
+            self._kill(connection, 'connecting for %.0fs' % (now - started))
+
+        busy = self._reactor.busy
+        if busy is not None:
+            connection, callback, started = busy
+            if time.monotonic() - started > self._hang_timeout and connection not in self._hung:
+                self._hung.add(connection)
+                self._count('hung_links')
+                self._abort(connection, 'blocked in %s for %.0fs' % (callback, time.monotonic() - started))
+
+        for connection in self._reactor.snapshot():
+            expired, silent = connection.expire(self._stuck_timeout)
+            if not expired:
+                continue
+            _LOGGER.warning('Failed %s stuck requests to %s', expired, connection.mac)
+            self._count('stuck_requests', expired)
+            if silent and connection.connected and connection not in self._hung:
+                self._hung.add(connection)
+                self._count('hung_links')
+                self._abort(connection, 'no notification for %.0fs' % self._stuck_timeout)
+
+    def _kill(self, connection, reason):
+        _LOGGER.error('Link to %s is hung (%s), abort it', connection.mac, reason)
+        connection.abort(RedmondKettleConnectException('Link to %s is hung: %s' % (connection.mac, reason)))
+
+    def _abort(self, connection, reason):
+        self._kill(connection, reason)
+        with self._lock:
+            listeners = [ref() for ref in self._listeners]
+            self._listeners = [ref for ref in self._listeners if ref() is not None]
+        for listener in listeners:
+            if listener is None:
+                continue
+            try:
+                listener(connection.mac)
+            except Exception as e:
+                _LOGGER.error('Watchdog listener %s failed: %s', listener, e)
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            try:
+                self.check()
+            except Exception as e:
+                _LOGGER.error('Watchdog check failed: %s', e)
@@ -11,6 +11,7 @@ from homeassistant.components.light import (
     LightEntity
 )
 from .kettle_entity import KettleEntity
+from .registry import KettleRegistry
 from . import DOMAIN
 
 _LOGGER = logging.getLogger(__name__)
@@ -21,11 +22,12 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
     # We only want this platform to be set up via discovery.
     if discovery_info is None:
         return
-    illuminators = []
-    for device in hass.data[DOMAIN]:
-        illuminators.append(R4SkyKettleLight(hass.data[DOMAIN][device]))
-        if hass.data[DOMAIN][device]['temperatureLight']:
-            illuminators.append(R4SkyKettleWaterTemperatureLight(hass.data[DOMAIN][device]))
+    device = KettleRegistry.of(hass).device(discovery_info['entry_id'])
+    if device is None:
+        return
+    illuminators = [R4SkyKettleLight(device)]
+    if device['temperatureLight']:
+        illuminators.append(R4SkyKettleWaterTemperatureLight(device))
     if len(illuminators) > 0:
         add_entities(illuminators)
 
@@ -38,7 +40,8 @@ class R4SkyKettleLight(LightEntity, KettleEntity):
     async def async_added_to_hass(self):
         await super().async_added_to_hass()
         self._handle_update()
-        self.async_on_remove(async_dispatcher_connect(self.hass, 'ready4sky_update', self._handle_update))
+        self.async_on_remove(async_dispatcher_connect(self.hass, self._connect.signal, self._handle_update))
+        self.async_on_remove(self._coordinator.async_add_listener(self._handle_update))
 
     def _handle_update(self):
         self._state = self._connect._light_state
@@ -59,7 +62,7 @@ class R4SkyKettleLight(LightEntity, KettleEntity):
 
     @property
     def available(self):
-        return True
+        return self._connect.available
 
     @property
     def supported_features(self):
@@ -92,7 +95,7 @@ class R4SkyKettleLight(LightEntity, KettleEntity):
         if ATTR_HS_COLOR in kwargs:
             _hs = kwargs[ATTR_HS_COLOR]
             color = self.hs_to_rgbhex(_hs)
-        self._connect.onLight(rgb1=color, rgb2=color, rgb3=color)
+        self._connect.onLight(rgb1=color, rgb2=color, rgb3=color, deadline=self._deadline())
 
     def turn_off(self, **kwargs):
         """Instruct the light to turn off."""
@@ -100,7 +103,23 @@ class R4SkyKettleLight(LightEntity, KettleEntity):
         if ATTR_HS_COLOR in kwargs:
             _hs = kwargs[ATTR_HS_COLOR]
             color = self.hs_to_rgbhex(_hs)
-        self._connect.offLight(rgb1=color, rgb2=color, rgb3=color)
+        self._connect.offLight(rgb1=color, rgb2=color, rgb3=color, deadline=self._deadline())
+
+    async def async_turn_on(self, **kwargs):
+        """Instruct the light to turn on."""
+        color = '27FF00'
+        if ATTR_HS_COLOR in kwargs:
+            _hs = kwargs[ATTR_HS_COLOR]
+            color = self.hs_to_rgbhex(_hs)
+        await self._connect.async_onLight(rgb1=color, rgb2=color, rgb3=color, deadline=self._deadline())
+
+    async def async_turn_off(self, **kwargs):
+        """Instruct the light to turn off."""
+        color = '27FF00'
+        if ATTR_HS_COLOR in kwargs:
+            _hs = kwargs[ATTR_HS_COLOR]
+            color = self.hs_to_rgbhex(_hs)
+        await self._connect.async_offLight(rgb1=color, rgb2=color, rgb3=color, deadline=self._deadline())
 
 
 class R4SkyKettleWaterTemperatureLight(LightEntity, KettleEntity):
@@ -110,7 +129,8 @@ class R4SkyKettleWaterTemperatureLight(LightEntity, KettleEntity):
 
     async def async_added_to_hass(self):
         self._handle_update()
-        self.async_on_remove(async_dispatcher_connect(self.hass, 'ready4sky_update', self._handle_update))
+        self.async_on_remove(async_dispatcher_connect(self.hass, self._connect.signal, self._handle_update))
+        self.async_on_remove(self._coordinator.async_add_listener(self._handle_update))
 
     def _handle_update(self):
         self._state = self._connect._water_temperature_light_state
@@ -131,7 +151,7 @@ class R4SkyKettleWaterTemperatureLight(LightEntity, KettleEntity):
 
     @property
     def available(self):
-        return True
+        return self._connect.available
 
     @property
     def supported_features(self):
@@ -160,10 +180,20 @@ class R4SkyKettleWaterTemperatureLight(LightEntity, KettleEntity):
         You can skip the brightness part if your light does not support
         brightness control.
         """
-        if self._connect.onTemperatureToLight():
+        if self._connect.onTemperatureToLight(deadline=self._deadline()):
             self._state = True
 
     def turn_off(self, **kwargs):
         """Instruct the light to turn off."""
-        if self._connect.offTemperatureToLight():
+        if self._connect.offTemperatureToLight(deadline=self._deadline()):
+            self._state = False
+
+    async def async_turn_on(self, **kwargs):
+        """Instruct the light to turn on."""
+        if await self._connect.async_onTemperatureToLight(deadline=self._deadline()):
+            self._state = True
+
+    async def async_turn_off(self, **kwargs):
+        """Instruct the light to turn off."""
+        if await self._connect.async_offTemperatureToLight(deadline=self._deadline()):
             self._state = False
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""Kettles of every config entry, kept in hass.data[DOMAIN]"""
+import logging
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class KettleRegistry:
+    """Devices by config entry id and RedmondKettle instances by MAC
+
+    A physical kettle gets one RedmondKettle whatever refers to it: every config entry with its MAC
+    and the pairing flow share the instance, and it is closed when the last of them lets it go.
+
+        registry = KettleRegistry.of(hass)
+        kettle = registry.acquire(mac, lambda: RedmondKettle(mac, password, hass=hass))
+        ...
+        await registry.async_release(mac)
+    """
+
+    def __init__(self):
+        # entry id -> device dict handed to the platforms
+        self._entries = {}
+        # MAC -> [RedmondKettle, number of holders]
+        self._kettles = {}
+        # MAC -> KettleCoordinator polling the kettle for all its entries
+        self._coordinators = {}
+
+    @classmethod
+    def of(cls, hass):
+        return hass.data.setdefault(DOMAIN, cls())
+
+    def __bool__(self):
+        return bool(self._entries) or bool(self._kettles)
+
+    @staticmethod
+    def _key(mac):
+        return mac.upper()
+
+    def acquire(self, mac, factory):
+        """The kettle with this MAC, created by factory() for the first holder"""
+        key = self._key(mac)
+        record = self._kettles.get(key)
+        if record is None:
+            record = self._kettles[key] = [factory(), 0]
+        record[1] += 1
+        return record[0]
+
+    def coordinator(self, mac, factory):
+        """The coordinator of the kettle with this MAC, created by factory() on the first call"""
+        key = self._key(mac)
+        if key not in self._coordinators:
+            self._coordinators[key] = factory()
+        return self._coordinators[key]
+
+    def kettle(self, mac):
+        record = self._kettles.get(self._key(mac))
+        return record[0] if record else None
+
+    async def async_release(self, mac):
+        """Drop one hold of the kettle, the last one closes it"""
+        key = self._key(mac)
+        record = self._kettles.get(key)
+        if record is None:
+            return
+        record[1] -= 1
+        if record[1] > 0:
+            return
+        del self._kettles[key]
+        coordinator = self._coordinators.pop(key, None)
+        if coordinator is not None:
+            coordinator.close()
+        await record[0].async_close()
+
+    def add(self, entry_id, device):
+        self._entries[entry_id] = device
+
+    def device(self, entry_id):
+        return self._entries.get(entry_id)
+
+    def devices(self):
+        return list(self._entries.values())
+
+    def entries(self, mac):
+        """Ids of the entries of the kettle"""
+        key = self._key(mac)
+        return [entry_id for entry_id, device in self._entries.items() if self._key(device['mac']) == key]
+
+    async def async_remove(self, entry_id):
+        """Tear the entry down: remove its entities, which stops their polling, let go of its kettle
+        :return: False if the entry was not set up
+        """
+        device = self._entries.pop(entry_id, None)
+        if device is None:
+            return False
+        if device.get('unsubscribe'):
+            # the options listener of the entry
+            device['unsubscribe']()
+        # platforms were loaded through discovery, remove the entities of this entry by hand
+        for entity in device.get('entities', []):
+            await entity.async_remove()
+        if device.get('instance'):
+            await self.async_release(device['mac'])
+        return True
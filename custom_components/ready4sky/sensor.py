@@ -1,10 +1,13 @@
 """Platform for sensor integration."""
 import logging
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
-from homeassistant.const import TEMP_CELSIUS
+from homeassistant.const import TEMP_CELSIUS, ENERGY_KILO_WATT_HOUR
 from homeassistant.helpers.entity import Entity
 from . import DOMAIN
 from .kettle_entity import KettleEntity
+from .registry import KettleRegistry
+from .lib.watchdog import Watchdog
+from .lib.pool import ConnectionPool, adapter_name
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -13,9 +16,10 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
     # We only want this platform to be set up via discovery.
     if discovery_info is None:
         return
-    sensors = []
-    for device in hass.data[DOMAIN]:
-        sensors.append(R4SkyKettleSensor(hass.data[DOMAIN][device]))
+    device = KettleRegistry.of(hass).device(discovery_info['entry_id'])
+    if device is None:
+        return
+    sensors = [R4SkyKettleSensor(device), R4SkyKettleCycleSensor(device), R4SkyKettleLinkSensor(device)]
     if len(sensors) > 0:
         add_entities(sensors)
 
@@ -27,7 +31,8 @@ class R4SkyKettleSensor(KettleEntity):
 
     async def async_added_to_hass(self):
         self._handle_update()
-        self.async_on_remove(async_dispatcher_connect(self.hass, 'ready4sky_update', self._handle_update))
+        self.async_on_remove(async_dispatcher_connect(self.hass, self._connect.signal, self._handle_update))
+        self.async_on_remove(self._coordinator.async_add_listener(self._handle_update))
 
     def _handle_update(self):
         self._state = self._connect._current_temperature
@@ -51,4 +56,84 @@ class R4SkyKettleSensor(KettleEntity):
     @property
     def unit_of_measurement(self):
         """Return the unit of measurement."""
-        return TEMP_CELSIUS
\ No newline at end of file
+        return TEMP_CELSIUS
+
+
+class R4SkyKettleCycleSensor(KettleEntity):
+    """Energy of the last boil or heat run, the run itself is fired as a ready4sky_cycle event."""
+
+    async def async_added_to_hass(self):
+        self._handle_update()
+        self.async_on_remove(async_dispatcher_connect(self.hass, self._connect.signal, self._handle_update))
+        self.async_on_remove(self._coordinator.async_add_listener(self._handle_update))
+
+    def _handle_update(self):
+        self._cycle = self._connect.lastCycle
+        self._state = self._cycle['energy_kwh'] if self._cycle else None
+        self.schedule_update_ha_state()
+
+    @property
+    def icon(self):
+        """Icon is a lightning bolt."""
+        return "mdi:lightning-bolt"
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return f"{self._name} last cycle"
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+        return self._state
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement."""
+        return ENERGY_KILO_WATT_HOUR
+
+    @property
+    def device_state_attributes(self):
+        """Mode, start, end, duration and number of starts of the last run."""
+        if not self._cycle:
+            return None
+        return {key: value for key, value in self._cycle.items() if key != 'energy_kwh'}
+
+
+class R4SkyKettleLinkSensor(KettleEntity):
+    """Hung links the watchdog killed, its counters and the link pool of the adapter as attributes."""
+
+    async def async_added_to_hass(self):
+        self._handle_update()
+        self.async_on_remove(self._coordinator.async_add_listener(self._handle_update))
+
+    def _handle_update(self):
+        self._watchdog = Watchdog.shared().stats()
+        self._adapter = ConnectionPool.shared().stats().get(adapter_name(self._iface))
+        self._state = self._watchdog['hung_links'] + self._watchdog['hung_connects']
+        self.schedule_update_ha_state()
+
+    @property
+    def icon(self):
+        """Icon is a bluetooth link."""
+        return "mdi:bluetooth-connect"
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return f"{self._name} link"
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+        return self._state
+
+    @property
+    def available(self) -> bool:
+        """The counters are there whether the kettle is reachable or not."""
+        return True
+
+    @property
+    def device_state_attributes(self):
+        """Watchdog counters, and links, waiters and first command times of the adapter."""
+        return {'watchdog': self._watchdog, 'adapter': self._adapter}
@@ -7,6 +7,7 @@ from homeassistant.components.switch import (
 )
 from . import DOMAIN
 from .kettle_entity import KettleEntity
+from .registry import KettleRegistry
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -16,9 +17,10 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
     # We only want this platform to be set up via discovery.
     if discovery_info is None:
         return
-    switches = []
-    for device in hass.data[DOMAIN]:
-        switches.append(R4SkyKettleSwitch(hass.data[DOMAIN][device]))
+    device = KettleRegistry.of(hass).device(discovery_info['entry_id'])
+    if device is None:
+        return
+    switches = [R4SkyKettleSwitch(device)]
     if len(switches) > 0:
         add_entities(switches)
 
@@ -31,7 +33,8 @@ class R4SkyKettleSwitch(SwitchEntity, KettleEntity):
 
     async def async_added_to_hass(self):
         self._handle_update()
-        self.async_on_remove(async_dispatcher_connect(self.hass, 'ready4sky_update', self._handle_update))
+        self.async_on_remove(async_dispatcher_connect(self.hass, self._connect.signal, self._handle_update))
+        self.async_on_remove(self._coordinator.async_add_listener(self._handle_update))
 
     def _handle_update(self):
         self._state = self._connect._state_boil
@@ -53,7 +56,7 @@ class R4SkyKettleSwitch(SwitchEntity, KettleEntity):
 
     @property
     def available(self):
-        return True
+        return self._connect.available
 
     @property
     def name(self):
@@ -91,20 +94,22 @@ class R4SkyKettleSwitch(SwitchEntity, KettleEntity):
     def turn_on(self, **kwargs) -> None:
         """Turn the entity on."""
         self.log('R4SkyKettleSwitch.turn_on')
-        self._connect.onModeBoil()
+        self._connect.onModeBoil(deadline=self._deadline())
 
     async def async_turn_on(self, **kwargs):
         """Turn the entity on."""
-        self.turn_on()
+        self.log('R4SkyKettleSwitch.turn_on')
+        await self._connect.async_onModeBoil(deadline=self._deadline())
 
     def turn_off(self, **kwargs):
         """Turn the entity off."""
         self.log('R4SkyKettleSwitch.turn_off')
-        self._connect.off()
+        self._connect.off(deadline=self._deadline())
 
     async def async_turn_off(self, **kwargs):
         """Turn the entity off."""
-        self.turn_off()
+        self.log('R4SkyKettleSwitch.turn_off')
+        await self._connect.async_off(deadline=self._deadline())
 
     def toggle(self, **kwargs):
         """Toggle the entity."""
@@ -115,4 +120,7 @@ class R4SkyKettleSwitch(SwitchEntity, KettleEntity):
 
     async def async_toggle(self, **kwargs):
         """Toggle the entity."""
-        self.toggle()
\ No newline at end of file
+        if self._state:
+            await self.async_turn_off()
+        else:
+            await self.async_turn_on()
\ No newline at end of file
@@ -15,6 +15,7 @@ from homeassistant.components.water_heater import (
 )
 from . import DOMAIN
 from .kettle_entity import KettleEntity
+from .registry import KettleRegistry
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -24,9 +25,10 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
     # We only want this platform to be set up via discovery.
     if discovery_info is None:
         return
-    water_heateres = []
-    for device in hass.data[DOMAIN]:
-        water_heateres.append(R4SkyKettleWaterHeater(hass.data[DOMAIN][device]))
+    device = KettleRegistry.of(hass).device(discovery_info['entry_id'])
+    if device is None:
+        return
+    water_heateres = [R4SkyKettleWaterHeater(device)]
     if len(water_heateres) > 0:
         add_entities(water_heateres)
 
@@ -45,7 +47,8 @@ class R4SkyKettleWaterHeater(WaterHeaterEntity, KettleEntity):
 
     async def async_added_to_hass(self):
         self._handle_update()
-        self.async_on_remove(async_dispatcher_connect(self.hass, 'ready4sky_update', self._handle_update))
+        self.async_on_remove(async_dispatcher_connect(self.hass, self._connect.signal, self._handle_update))
+        self.async_on_remove(self._coordinator.async_add_listener(self._handle_update))
 
     def _handle_update(self):
         self._state = self._connect._state_heat
@@ -60,7 +63,7 @@ class R4SkyKettleWaterHeater(WaterHeaterEntity, KettleEntity):
 
     @property
     def available(self):
-        return True
+        return self._connect.available
 
     @property
     def name(self):
@@ -118,41 +121,56 @@ class R4SkyKettleWaterHeater(WaterHeaterEntity, KettleEntity):
         _state = kwargs.get(ATTR_OPERATION_MODE)
         if _state == STATE_ELECTRIC:
             self._state = True
-            self._connect.onModeHeat(temperature=self._target_temperature)
+            self._connect.onModeHeat(temperature=self._target_temperature, deadline=self._deadline())
         elif _state == STATE_OFF:
             self._state = False
-            self._connect.offModeHeat()
+            self._connect.offModeHeat(deadline=self._deadline())
 
-    def async_set_operation_mode(self, **kwargs):
-        self.set_operation_modeor(**kwargs)
+    async def async_set_operation_mode(self, **kwargs):
+        _state = kwargs.get(ATTR_OPERATION_MODE)
+        if _state == STATE_ELECTRIC:
+            self._state = True
+            await self._connect.async_onModeHeat(temperature=self._target_temperature, deadline=self._deadline())
+        elif _state == STATE_OFF:
+            self._state = False
+            await self._connect.async_offModeHeat(deadline=self._deadline())
 
     def set_temperature(self, **kwargs):
         '''Sets the temperature the water heater should heat water to.'''
         self._target_temperature = kwargs.get(ATTR_TEMPERATURE)
         if self._state:
-            self._connect.offModeHeat()
-            self._connect.onModeHeat(temperature=self._target_temperature)
+            deadline = self._deadline()
+            self._connect.offModeHeat(deadline=deadline)
+            self._connect.onModeHeat(temperature=self._target_temperature, deadline=deadline)
 
     async def async_set_temperature(self, **kwargs):
-        self.set_temperature(**kwargs)
+        self._target_temperature = kwargs.get(ATTR_TEMPERATURE)
+        if self._state:
+            deadline = self._deadline()
+            await self._connect.async_offModeHeat(deadline=deadline)
+            await self._connect.async_onModeHeat(temperature=self._target_temperature, deadline=deadline)
 
     def turn_away_mode_on(self):
         '''Set the water heater to away mode'''
         if not self._target_temperature:
             self._target_temperature = 95
-        self._connect.onModeHeat(temperature=self._target_temperature)
+        self._connect.onModeHeat(temperature=self._target_temperature, deadline=self._deadline())
 
     async def async_turn_away_mode_on(self):
-        self.turn_away_mode_on()
+        if not self._target_temperature:
+            self._target_temperature = 95
+        await self._connect.async_onModeHeat(temperature=self._target_temperature, deadline=self._deadline())
 
     def turn_away_mode_off(self):
         '''Set the water heater back to the previous operation mode. Turn off away mode'''
         if not self._target_temperature:
             self._target_temperature = 95
-        self._connect.offModeHeat()
+        self._connect.offModeHeat(deadline=self._deadline())
 
     async def async_turn_away_mode_off(self):
-        self.turn_away_mode_off()
+        if not self._target_temperature:
+            self._target_temperature = 95
+        await self._connect.async_offModeHeat(deadline=self._deadline())
 
     def turn_on(self, **kwargs) -> None:
         """Turn the entity on."""
@@ -160,7 +178,7 @@ class R4SkyKettleWaterHeater(WaterHeaterEntity, KettleEntity):
 
     async def async_turn_on(self, **kwargs):
         """Turn the entity on."""
-        self.turn_on()
+        await self.async_turn_away_mode_on()
 
     def turn_off(self, **kwargs):
         """Turn the entity off."""
@@ -168,7 +186,7 @@ class R4SkyKettleWaterHeater(WaterHeaterEntity, KettleEntity):
 
     async def async_turn_off(self, **kwargs):
         """Turn the entity off."""
-        self.turn_off()
+        await self.async_turn_away_mode_off()
 
     def toggle(self, **kwargs):
         """Toggle the entity."""
@@ -179,4 +197,7 @@ class R4SkyKettleWaterHeater(WaterHeaterEntity, KettleEntity):
 
     async def async_toggle(self, **kwargs):
         """Toggle the entity."""
-        self.toggle()
+        if self._state:
+            await self.async_turn_off()
+        else:
+            await self.async_turn_on()
@@ -0,0 +1,36 @@
+"""The kettle library is tested as the top level package lib, the way python3 -m lib.benchmark runs it
+
+Only bluepy is needed; tests of RedmondKettle are skipped without homeassistant.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'custom_components', 'ready4sky'))
+
+MAC = 'aa:bb:cc:dd:ee:ff'
+KEY = '0011223344556677'
+
+
+@pytest.fixture
+def simulator():
+    from lib.simulator import KettleSimulator
+    return KettleSimulator(latency=0.005)
+
+
+@pytest.fixture
+def reactor():
+    from lib.reactor import Reactor
+    reactor = Reactor()
+    yield reactor
+    reactor.stop()
+
+
+@pytest.fixture
+def watchdog(reactor):
+    from lib.watchdog import Watchdog
+    watchdog = Watchdog(reactor=reactor, interval=0.05, hang_timeout=0.3, stuck_timeout=0.5, connect_timeout=0.3)
+    watchdog.start()
+    yield watchdog
+    watchdog.stop()
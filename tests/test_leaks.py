@@ -0,0 +1,71 @@
+"""Nothing is left behind by connect, use, drop and close cycles against the kettle simulator"""
+import gc
+import os
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('bluepy.btle')
+
+from lib.kettle_controller import RedmondKettleController
+from lib.pool import ConnectionPool, POLICY_ON_DEMAND
+from lib.reactor import Reactor
+from lib.simulator import KettleSimulator
+from lib.watchdog import Watchdog
+
+from conftest import MAC, KEY
+
+CYCLES = 50
+
+
+def _threads():
+    # the IO and watchdog threads of earlier tests are stopped at the end, they are not part of the baseline
+    return sum(1 for thread in threading.enumerate() if thread.name not in ('ready4sky_reactor', 'ready4sky_watchdog'))
+
+
+def _fds():
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None
+
+
+def _wait(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_connect_drop_loop_leaks_nothing():
+    simulator = KettleSimulator()
+    pool = ConnectionPool()
+    pool.setPolicy(MAC, POLICY_ON_DEMAND)
+    factory = lambda: RedmondKettleController(MAC, KEY, peripheral=simulator.Peripheral)
+    # the selector and the wake-up pipe of the shared reactor live as long as the process
+    Reactor.shared()
+    gc.collect()
+    threads, fds = _threads(), _fds()
+
+    for cycle in range(CYCLES):
+        controller = pool.acquire(MAC, None, factory, timeout=5)
+        assert controller.auth()
+        assert controller.mode()['status'] == 'off'
+        if cycle % 2:
+            # the kettle drops the link, the pool finds it dead on the next acquire
+            simulator.disconnect(MAC)
+            assert _wait(lambda: not controller.connected)
+        pool.release(MAC, controller)
+
+    # on-demand links close from a reactor timer once released
+    assert _wait(lambda: pool.stats()['hci0']['links'] == 0)
+    assert _wait(lambda: Reactor.shared().connections == 0)
+    assert simulator.connections == 0
+
+    assert Watchdog.shared().stop()
+    assert Reactor.shared().stop()
+    gc.collect()
+    assert _threads() == threads
+    if fds is not None:
+        assert _fds() == fds
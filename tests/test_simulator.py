@@ -0,0 +1,246 @@
+"""Transport, pipeline, breaker and watchdog behaviour against the kettle simulator"""
+import random
+import time
+
+import pytest
+
+pytest.importorskip('bluepy.btle')
+
+from bluepy.btle import BTLEException, BTLEDisconnectError
+from lib import protocol
+from lib.bte import BTEConnect, RESPONSE_TIMEOUT
+from lib.breaker import CircuitBreaker, CLOSED, HALF_OPEN, OPEN
+from lib.exception import RedmondKettleConnectException
+from lib.kettle_controller import RedmondKettleController
+from lib.pool import ConnectionPool
+from lib.simulator import KettleSimulator, RX_HANDLE
+
+from conftest import MAC, KEY
+
+
+def _connect(simulator, reactor, watchdog=None):
+    return BTEConnect(MAC, KEY, None, peripheral=simulator.Peripheral, reactor=reactor, watchdog=watchdog)
+
+
+def _auth(conn, counter=0):
+    reply = conn.send(protocol.COMMANDS['auth'].encode(counter, key=KEY), timeout=2)
+    return protocol.COMMANDS['auth'].decode(reply)
+
+
+def test_frame_round_trip():
+    frame = protocol.COMMANDS['sendMode'].encode(0x21, mode='heat', temperature=70, howMuchBoil=80)
+    decoded = protocol.Frame.decode(frame)
+    assert decoded.counter == 0x21
+    assert decoded.opcode == protocol.OP_SEND_MODE
+    assert protocol.Frame(decoded.counter, decoded.opcode, decoded.payload).encode() == frame
+
+
+def test_replies_echo_the_counter(simulator, reactor):
+    conn = _connect(simulator, reactor)
+    try:
+        assert _auth(conn).ok
+        # in flight at the same time, each reply finds its caller by the counter byte
+        counters = [0x05, 0x06, 0x07, 0xfe]
+        futures = [conn.submit(protocol.COMMANDS['mode'].encode(counter)) for counter in counters]
+        replies = [conn.wait(future, timeout=2) for future in futures]
+        assert [reply[1] for reply in replies] == counters
+        for reply in replies:
+            assert protocol.COMMANDS['mode'].decode(reply).asDict()['mode'] == 'boil'
+    finally:
+        conn.close()
+    assert simulator.connections == 0
+
+
+def test_replies_written_together_are_all_read(reactor):
+    # like bluepy-helper, the three replies reach the host in one write to a buffered text pipe
+    simulator = KettleSimulator(latency=0.01, batch=0.05, helper=True)
+    conn = _connect(simulator, reactor)
+    try:
+        assert _auth(conn).ok
+        started = time.monotonic()
+        futures = [conn.submit(protocol.COMMANDS['mode'].encode(counter)) for counter in (1, 2, 3)]
+        replies = [conn.wait(future) for future in futures]
+        assert [reply[1] for reply in replies] == [1, 2, 3]
+        assert time.monotonic() - started < RESPONSE_TIMEOUT / 5
+    finally:
+        conn.close()
+    assert simulator.connections == 0
+
+
+def test_template_frames_carry_the_counter(simulator, reactor):
+    conn = _connect(simulator, reactor)
+    try:
+        _auth(conn)
+        template = protocol.COMMANDS['mode'].template()
+        assert conn.send(template, counter=0x33, timeout=2)[1] == 0x33
+        assert conn.send(template, counter=0x34, timeout=2)[1] == 0x34
+    finally:
+        conn.close()
+
+
+def test_pipeline_with_a_dropped_reply():
+    seed = 1
+    simulator = KettleSimulator(latency=0.005, seed=seed)
+    # the simulator rolls one number per write for the drop
+    draws = random.Random(seed)
+    dropped = [draws.random() < 0.5 for _ in range(3)]
+    assert dropped == [True, False, False]
+
+    with RedmondKettleController(MAC, KEY, peripheral=simulator.Peripheral) as controller:
+        assert controller.auth()
+        simulator.drop_rate = 0.5
+        results = controller.pipeline([('mode', {}), ('statEnergy', {}), ('statCount', {})],
+                                      abortOnFailure=False, timeout=0.3)
+        assert [result['status'] for result in results] == ['timeout', 'ok', 'ok']
+        assert isinstance(results[0]['response'], RedmondKettleConnectException)
+        assert results[2]['response'].count == 0
+        # a lost reply does not break the link
+        simulator.drop_rate = 0.0
+        assert controller.mode()['status'] == 'off'
+
+
+def test_pipeline_stops_after_a_refused_command(simulator):
+    written = []
+
+    def peripheral(*args, **kwargs):
+        device = simulator.Peripheral(*args, **kwargs)
+        write = device.writeCharacteristic
+
+        def record(handle, val, withResponse=False):
+            if handle == RX_HANDLE:
+                written.append(bytes(val))
+            return write(handle, val, withResponse)
+        device.writeCharacteristic = record
+        return device
+
+    simulator.kettle(MAC).refused.add(protocol.OP_SEND_MODE)
+    with RedmondKettleController(MAC, KEY, peripheral=peripheral) as controller:
+        assert controller.auth()
+        results = controller.pipeline([('sendMode', {'mode': 'heat', 'temperature': 70, 'howMuchBoil': 80}),
+                                       ('onMode', {}), ('mode', {})])
+        assert [result['status'] for result in results] == ['fail', 'cancelled', 'cancelled']
+        # the kettle must not start in the mode it was left in
+        assert protocol.OP_ON not in [frame[2] for frame in written]
+    assert simulator.kettle(MAC).status == 0x00
+
+
+def test_breaker_opens_after_failures():
+    breaker = CircuitBreaker(threshold=3, reset_timeout=0.1, name=MAC)
+    for _ in range(2):
+        assert breaker.allow() == CLOSED
+        breaker.failure()
+    assert breaker.available
+    breaker.failure()
+    assert breaker.state == OPEN
+    assert not breaker.available
+    assert not breaker.allow()
+    time.sleep(0.15)
+    assert breaker.allow() == HALF_OPEN
+    # one probe at a time
+    assert not breaker.allow()
+    breaker.success()
+    assert breaker.allow() == CLOSED
+
+
+def test_kettle_fails_fast_once_the_breaker_is_open(simulator):
+    pytest.importorskip('homeassistant')
+    from lib.kettle import RedmondKettle
+    from lib.retry import RetryPolicy
+    from lib.exception import RedmondKettleUnavailableException
+
+    opened = []
+
+    def peripheral(*args, **kwargs):
+        opened.append(args)
+        return simulator.Peripheral(*args, **kwargs)
+
+    simulator.unreachable(MAC)
+    kettle = RedmondKettle(MAC, KEY, peripheral=peripheral, pool=ConnectionPool(), retry=RetryPolicy(attempts=1),
+                           breaker=CircuitBreaker(threshold=2, reset_timeout=60, name=MAC))
+    try:
+        for _ in range(2):
+            with pytest.raises(Exception):
+                kettle.mode()
+        assert not kettle.available
+        attempts = len(opened)
+        with pytest.raises(RedmondKettleUnavailableException):
+            kettle.mode()
+        assert len(opened) == attempts
+    finally:
+        kettle.close()
+
+
+def test_busy_adapter_does_not_open_the_breaker(simulator, reactor, watchdog):
+    pytest.importorskip('homeassistant')
+    from lib.kettle import RedmondKettle
+    from lib.retry import RetryPolicy
+    from lib.exception import RedmondKettleTimeoutException
+    from lib.deadline import after
+
+    other = '11:22:33:44:55:66'
+    pool = ConnectionPool(limit=1, reactor=reactor, watchdog=watchdog)
+    # another kettle holds the only link of the adapter
+    busy = pool.acquire(other, None, lambda: RedmondKettleController(other, KEY, peripheral=simulator.Peripheral))
+    kettle = RedmondKettle(MAC, KEY, peripheral=simulator.Peripheral, pool=pool, retry=RetryPolicy(attempts=1),
+                           breaker=CircuitBreaker(threshold=1, reset_timeout=60, name=MAC))
+    try:
+        for _ in range(2):
+            with pytest.raises(RedmondKettleTimeoutException):
+                kettle.mode(deadline=after(0.2))
+            assert kettle.available
+        pool.release(other, busy)
+        pool.discard(other)
+        assert kettle.mode()['status'] == 'off'
+    finally:
+        kettle.close()
+
+
+def test_watchdog_kills_a_hung_link_once(simulator, reactor, watchdog):
+    conn = _connect(simulator, reactor, watchdog)
+    assert _auth(conn).ok
+    simulator.hang(MAC)
+    future = conn.submit(protocol.COMMANDS['mode'].encode(1))
+    with pytest.raises(RedmondKettleConnectException):
+        conn.wait(future, timeout=5)
+    # more checks pass while the link is torn down, it is still one hang
+    time.sleep(0.3)
+    assert watchdog.stats()['hung_links'] == 1
+    assert not conn.connected
+
+    simulator.hang(MAC, False)
+    conn = _connect(simulator, reactor, watchdog)
+    try:
+        assert _auth(conn).ok
+    finally:
+        conn.close()
+    assert simulator.connections == 0
+
+
+def test_watchdog_kills_a_hung_connect(simulator, reactor, watchdog):
+    simulator.hang(MAC)
+    started = time.monotonic()
+    with pytest.raises(BTLEException):
+        _connect(simulator, reactor, watchdog)
+    assert time.monotonic() - started < 2
+    assert watchdog.stats()['hung_connects'] == 1
+    assert simulator.connections == 0
+
+
+def test_pool_recovers_from_a_hung_connect(simulator, reactor, watchdog):
+    pool = ConnectionPool(reactor=reactor, watchdog=watchdog)
+
+    def factory():
+        return _connect(simulator, reactor, watchdog)
+
+    simulator.hang(MAC)
+    with pytest.raises(BTLEDisconnectError):
+        pool.acquire(MAC, None, factory, timeout=5)
+    simulator.hang(MAC, False)
+    # nobody is left connecting the MAC, the next caller opens the link at once
+    started = time.monotonic()
+    conn = pool.acquire(MAC, None, factory, timeout=1)
+    assert time.monotonic() - started < 1
+    assert _auth(conn).ok
+    pool.release(MAC, conn)
+    pool.discard(MAC)
+    assert pool.stats()['hci0']['links'] == 0